@@ -0,0 +1,146 @@
+"""
+Overload behaviour of the threaded server with and without admission control.
+
+Starts a stub Gemini upstream that answers UPSTREAM_CAPACITY requests at
+a time in DELAY seconds each, so it serves UPSTREAM_CAPACITY / DELAY
+requests a second, and sends it REQUESTS commands with CONCURRENCY in
+flight, well past that capacity. Without a concurrency cap every request
+holds a server thread and an upstream connection while it waits its turn
+at the upstream; with the cap (MAX_CONCURRENT slots, QUEUE_SIZE waiting)
+the excess is answered 503 straight away and the requests that are served
+stay fast. Rate limits are off in both runs since every request comes
+from one address. Needs aiohttp. Run from the repository root:
+
+    python benchmarks/bench_admission.py
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DELAY = 0.2
+UPSTREAM_CAPACITY = 8
+REQUESTS = 400
+CONCURRENCY = 200
+MAX_CONCURRENT = 16
+QUEUE_SIZE = 32
+QUEUE_TIMEOUT = 1
+
+SERVER = "import server; server.app.run(host='127.0.0.1', port={port}, threaded=True)"
+
+
+class BusyGemini(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    capacity = threading.Semaphore(UPSTREAM_CAPACITY)
+    body = json.dumps({'candidates': [{'content': {'parts': [{'text': 'stub answer'}]}}]}).encode()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.capacity:
+            time.sleep(DELAY)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def drive(base_url):
+    served = []
+    statuses = {}
+    limit = asyncio.Semaphore(CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=CONCURRENCY)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120)) as session:
+        async def one(i):
+            async with limit:
+                started = time.perf_counter()
+                try:
+                    async with session.post(f'{base_url}/api/command',
+                                            json={'command': f'explain overload question number {i} please'}) as response:
+                        await response.read()
+                        status = response.status
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    status = 'error'
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    served.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(REQUESTS)))
+        return time.perf_counter() - started, sorted(served), statuses
+
+
+def wait_until_up(base_url):
+    for _ in range(100):
+        try:
+            with urllib.request.urlopen(f'{base_url}/api/test', timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+
+
+def run(capped, upstream_url):
+    port = free_port()
+    env = dict(os.environ, GEMINI_API_KEY='bench', ENABLE_GEMINI='true', GEMINI_API_URL=upstream_url,
+               KAEL_HTTP_POOL_SIZE=str(CONCURRENCY), KAEL_RATE_LIMITS='off',
+               KAEL_MAX_CONCURRENT=str(MAX_CONCURRENT if capped else 0),
+               KAEL_QUEUE_SIZE=str(QUEUE_SIZE), KAEL_QUEUE_TIMEOUT=str(QUEUE_TIMEOUT))
+    process = subprocess.Popen([sys.executable, '-c', SERVER.format(port=port)], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_up(base_url)
+        elapsed, served, statuses = asyncio.run(drive(base_url))
+
+        def pct(p):
+            return round(served[min(len(served) - 1, int(p * len(served)))] * 1000, 1) if served else None
+
+        return {
+            'admission': f'{MAX_CONCURRENT} slots, {QUEUE_SIZE} queued' if capped else 'off',
+            'elapsed_s': round(elapsed, 2),
+            'statuses': statuses,
+            'served_p50_ms': pct(0.50),
+            'served_p99_ms': pct(0.99),
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    upstream = StubServer(('127.0.0.1', 0), BusyGemini)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    upstream_url = f'http://127.0.0.1:{upstream.server_address[1]}/generate'
+
+    for capped in (False, True):
+        print(json.dumps(run(capped, upstream_url)))
+    upstream.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Wall time of a session of search commands, one POST each versus batched.
+
+Starts a stub DuckDuckGo upstream that takes DELAY seconds per query,
+runs server.py in each serving mode against it, and sends COMMANDS
+distinct search commands first as sequential POST /api/command requests,
+then as POST /api/command/batch with several max_parallel caps. Needs
+uvicorn and aiohttp for the async mode. Run from the repository root:
+
+    python benchmarks/bench_batch.py
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DELAY = 0.2
+COMMANDS = 16
+PARALLEL = (1, 4, 8)
+
+# Every request comes from one address; switch off the rate limits and
+# concurrency cap so the benchmark measures the serving path itself
+NO_ADMISSION = {'KAEL_RATE_LIMITS': 'off', 'KAEL_MAX_CONCURRENT': '0'}
+
+MODES = {
+    'threaded': "import server; server.app.run(host='127.0.0.1', port={port}, threaded=True)",
+    'async': "import server; from kael_api.asgi import serve_asgi; "
+             "serve_asgi(server, host='127.0.0.1', port={port}, log_level='warning')",
+}
+
+
+class SlowSearch(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    body = json.dumps({'Abstract': 'stub abstract'}).encode()
+
+    def do_GET(self):
+        time.sleep(DELAY)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(base_url):
+    for _ in range(100):
+        try:
+            with urllib.request.urlopen(f'{base_url}/api/test', timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+
+
+def post(url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.loads(response.read())
+
+
+def run_mode(mode, upstream_url):
+    port = free_port()
+    env = dict(os.environ, SEARCH_API_URL=upstream_url, ENABLE_GEMINI='false', **NO_ADMISSION)
+    process = subprocess.Popen([sys.executable, '-c', MODES[mode].format(port=port)], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_up(base_url)
+        results = []
+        round_number = 0
+
+        def commands():
+            # Fresh queries every round so the search cache never answers
+            return [f'search for batch topic {round_number} {i}' for i in range(COMMANDS)]
+
+        started = time.perf_counter()
+        for command in commands():
+            post(f'{base_url}/api/command', {'command': command})
+        results.append({'mode': mode, 'how': 'sequential', 'commands': COMMANDS,
+                        'wall_ms': round((time.perf_counter() - started) * 1000, 1)})
+
+        for parallel in PARALLEL:
+            round_number += 1
+            started = time.perf_counter()
+            payload = post(f'{base_url}/api/command/batch', {'commands': commands(), 'max_parallel': parallel})
+            results.append({'mode': mode, 'how': f'batch max_parallel={parallel}', 'commands': COMMANDS,
+                            'wall_ms': round((time.perf_counter() - started) * 1000, 1),
+                            'errors': payload['errors']})
+        return results
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    upstream = StubServer(('127.0.0.1', 0), SlowSearch)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    upstream_url = f'http://127.0.0.1:{upstream.server_address[1]}/'
+
+    for mode in MODES:
+        for result in run_mode(mode, upstream_url):
+            print(json.dumps(result))
+    upstream.shutdown()
+
+
+if __name__ == '__main__':
+    main()
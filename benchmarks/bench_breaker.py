@@ -0,0 +1,75 @@
+"""
+Search latency during an upstream outage, with and without the circuit breaker.
+
+Points server.py's DuckDuckGo URL at a local stub that accepts
+connections and never answers, the way a hung upstream behaves, and
+sends REQUESTS distinct searches through the Flask test client. Without
+the breaker every search waits out the read timeout; with it, the first
+few do and the rest get the fallback answer straight away. Run from the
+repository root:
+
+    python benchmarks/bench_breaker.py
+"""
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REQUESTS = 40
+READ_TIMEOUT = 0.5
+
+
+def hung_upstream():
+    """A listening socket whose connections are accepted and left unanswered."""
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(128)
+    held = []
+
+    def accept():
+        while True:
+            held.append(listener.accept()[0])
+
+    threading.Thread(target=accept, daemon=True).start()
+    return listener.getsockname()[1]
+
+
+def run(client, label):
+    timings = []
+    for i in range(REQUESTS):
+        started = time.perf_counter()
+        client.get(f'/api/search?q={label}+outage+{i}')
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return sum(timings), timings[len(timings) // 2]
+
+
+def main():
+    port = hung_upstream()
+    os.environ.update({
+        'SEARCH_API_URL': f'http://127.0.0.1:{port}/',
+        'KAEL_HTTP_READ_TIMEOUT': str(READ_TIMEOUT),
+        'KAEL_HTTP_RETRIES': '0',
+        'KAEL_LOG_LEVEL': 'CRITICAL',
+        # One client sending as fast as it can would only measure the rate limiter
+        'KAEL_RATE_LIMITS': 'off',
+    })
+    import server
+    from kael_api.breaker import breaker_for
+
+    client = server.app.test_client()
+    breaker = breaker_for('duckduckgo')
+    for enabled in (False, True):
+        breaker.enabled = enabled
+        breaker.reset()
+        total, median = run(client, 'on' if enabled else 'off')
+        label = 'breaker' if enabled else 'no breaker'
+        print(f"{label:>10}: {REQUESTS} searches in {total:6.2f}s, median {median * 1e3:8.2f} ms, "
+              f"short-circuited {breaker.stats()['short_circuited']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Connection reuse check for the shared outbound HTTP client.
+
+Starts a keep-alive stub HTTP server on localhost, then sends the same
+number of requests with bare requests.get and with HttpClient, counting
+the TCP connections the stub accepted for each. Run from the repository
+root:
+
+    python benchmarks/bench_http_pool.py
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kael_api.http_client import HttpClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    body = json.dumps({'Abstract': 'stub answer'}).encode()
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(label, send, server, count):
+    before = server.connections
+    started = time.perf_counter()
+    for _ in range(count):
+        send().json()
+    elapsed = time.perf_counter() - started
+    opened = server.connections - before
+    print(f"{label:<12} requests={count} connections={opened} "
+          f"handshakes_avoided={count - opened} ms/request={elapsed * 1000 / count:.3f}")
+
+
+def main(count=200):
+    server = start_stub()
+    url = f"http://127.0.0.1:{server.server_address[1]}/?q=kael&format=json"
+    client = HttpClient(pool_size=4)
+
+    run('bare', lambda: requests.get(url, timeout=5), server, count)
+    run('pooled', lambda: client.get(url), server, count)
+    print('client stats:', json.dumps(client.stats()))
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
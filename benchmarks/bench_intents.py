@@ -0,0 +1,63 @@
+"""
+Micro-benchmark for KAEL command dispatch.
+
+Compares the compiled IntentRouter against a linear scan of substring
+checks (the shape of the old if/elif chain) as the number of registered
+intents grows. Run from the repository root:
+
+    python benchmarks/bench_intents.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kael_api.intents import INTENTS, Intent, IntentRouter
+
+COMMANDS = [
+    "hello there",
+    "what's the weather in new york",
+    "tell me about quantum computing",
+    "what time is it",
+    "explain how a transformer model handles long context windows",
+]
+
+
+def synthetic_intents(count):
+    """Built-in intents padded with generated ones up to count."""
+    extra = [Intent(f"synthetic_{i}", [f"synthetic phrase {i}", f"custom trigger {i}"])
+             for i in range(max(0, count - len(INTENTS)))]
+    return list(INTENTS) + extra
+
+
+def linear_match(intents, command):
+    for intent in intents:
+        for trigger in intent.triggers:
+            if trigger in command:
+                return intent.name
+    return None
+
+
+def main(repeat=5, number=2000):
+    print(f"{'intents':>8} {'router us/cmd':>14} {'linear us/cmd':>14}")
+    for count in (len(INTENTS), 50, 100, 250, 500):
+        intents = synthetic_intents(count)
+        router = IntentRouter(intents)
+
+        def run_router():
+            for command in COMMANDS:
+                router.match(command)
+
+        def run_linear():
+            for command in COMMANDS:
+                linear_match(intents, command)
+
+        per_call = number * len(COMMANDS) / 1e6
+        router_us = min(timeit.repeat(run_router, repeat=repeat, number=number)) / per_call
+        linear_us = min(timeit.repeat(run_linear, repeat=repeat, number=number)) / per_call
+        print(f"{count:>8} {router_us:>14.2f} {linear_us:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Offline answers from the knowledge base: index build and query cost.
+
+Queries the shipped data/knowledge.jsonl, then a synthetic file of
+SYNTHETIC_ENTRIES entries (the shipped ones plus generated text with a
+Zipf word distribution). Reports the time to index each file, which
+happens once and off the request path, and the time per answer.
+For comparison it also times the old offline lookup: a keyword dict built
+on every call and scanned linearly. Run from the repository root:
+
+    python benchmarks/bench_knowledge.py
+"""
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from kael_api.knowledge import KnowledgeBase
+
+SHIPPED = os.path.join(ROOT, 'data', 'knowledge.jsonl')
+SYNTHETIC_ENTRIES = 20000
+VOCABULARY = 50000
+QUERIES = ['what is a black hole', 'capital of france', 'tell me about quantum computing',
+           'how far is the moon', 'best pizza in town', 'who invented the web']
+ROUNDS = 2000
+
+
+def old_lookup(query):
+    offline_responses = {
+        "weather": "I'm in offline mode and can't check the weather right now.",
+        "news": "I'm in offline mode and can't fetch the latest news.",
+        "joke": "Why did the AI go to art school? To improve its neural network!",
+        "quantum computing": "Quantum computing uses quantum bits or qubits.",
+        "artificial intelligence": "Artificial Intelligence (AI) refers to systems designed to mimic human intelligence.",
+        "jarvis": "JARVIS (Just A Rather Very Intelligent System) is a fictional AI assistant.",
+        "kael": "I am KAEL (Knowledge and Artificially Enhanced Logic), your AI assistant.",
+    }
+    for keyword, response in offline_responses.items():
+        if keyword in query.lower():
+            return response
+    return None
+
+
+def synthetic(path):
+    """The shipped entries plus generated ones, SYNTHETIC_ENTRIES in all."""
+    with open(SHIPPED, encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    # Word frequencies in text follow Zipf's law: a few words are everywhere,
+    # most are rare. The shipped entries' words get random ranks among them.
+    rng = random.Random(7)
+    shipped_words = sorted({word for entry in entries for word in entry['text'].lower().split()})
+    vocabulary = shipped_words + [f"term{rank}" for rank in range(VOCABULARY - len(shipped_words))]
+    rng.shuffle(vocabulary)
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, VOCABULARY + 1)))
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(SYNTHETIC_ENTRIES):
+            entry = dict(entries[i % len(entries)])
+            if i >= len(entries):
+                words = rng.choices(vocabulary, cum_weights=cum_weights, k=60)
+                entry = {'title': ' '.join(words[:3]), 'text': ' '.join(words[3:])}
+            f.write(json.dumps(entry) + '\n')
+
+
+def measure(label, answer):
+    answered = sum(1 for query in QUERIES if answer(query))
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        for query in QUERIES:
+            answer(query)
+    per_query = (time.perf_counter() - started) / (ROUNDS * len(QUERIES)) * 1e6
+    print(f"{label:>28}: {per_query:7.1f} us per query, {answered}/{len(QUERIES)} answered")
+
+
+def main():
+    measure('old keyword dict', old_lookup)
+    knowledge = KnowledgeBase(SHIPPED)
+    len(knowledge)
+    print(f"{'shipped file indexed in':>28}: {knowledge.load_ms:7.1f} ms ({len(knowledge)} entries)")
+    measure('knowledge base', knowledge.answer)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'knowledge.jsonl')
+        synthetic(path)
+        large = KnowledgeBase(path)
+        len(large)
+        print(f"{'synthetic file indexed in':>28}: {large.load_ms:7.1f} ms ({len(large)} entries)")
+        measure(f'{len(large)} entries', large.answer)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Caller-side cost of logging a command and its response.
+
+Compares the old setup (basicConfig at DEBUG, f-string messages, the
+full response written synchronously) with kael_api.logs: %-style
+arguments, truncation and a queue drained by a background thread. Each
+case logs CALLS INFO records carrying a RESPONSE_CHARS response and
+CALLS DEBUG records that the new setup filters out. Records go to a pipe
+read by a deliberately slow consumer, the way a busy terminal or log
+shipper would. Run from the repository root:
+
+    python benchmarks/bench_logging.py
+"""
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kael_api.logs import configure_logging, logging_stats, stop_logging
+
+CALLS = 2000
+RESPONSE_CHARS = 20000
+READ_DELAY = 0.0005  # seconds the consumer takes per read
+
+
+def slow_pipe():
+    read_fd, write_fd = os.pipe()
+
+    def consume():
+        while os.read(read_fd, 65536):
+            time.sleep(READ_DELAY)
+
+    threading.Thread(target=consume, daemon=True).start()
+    return os.fdopen(write_fd, 'w', buffering=1)
+
+
+def run(logger, lazy):
+    response = 'x' * RESPONSE_CHARS
+    started = time.perf_counter()
+    for i in range(CALLS):
+        if lazy:
+            logger.info("Command processed, response: %s", response)
+            logger.debug("Command %s routed to %s", i, 'greeting')
+        else:
+            logger.info(f"Command processed, response: {response}")
+            logger.debug(f"Command {i} routed to {'greeting'}")
+    return (time.perf_counter() - started) / CALLS * 1e6
+
+
+def main():
+    root = logging.getLogger()
+    logger = logging.getLogger('bench')
+
+    stream = slow_pipe()
+    handler = logging.StreamHandler(stream)
+    root.addHandler(handler)
+    root.setLevel(logging.DEBUG)
+    print(f"sync, f-strings, DEBUG:  {run(logger, lazy=False):8.1f} us per command")
+    root.removeHandler(handler)
+
+    configure_logging(level='INFO', fmt='json', max_chars=2000, rate=0, stream=slow_pipe())
+    print(f"queued, lazy, INFO:      {run(logger, lazy=True):8.1f} us per command")
+    stats = logging_stats()
+    started = time.perf_counter()
+    stop_logging()
+    print(f"  records dropped on a full queue: {stats['dropped']}, "
+          f"background flush took {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Time per news question: fetching the feed on every call against the index.
+
+A synthetic source holds SIZES headlines over TOPICS topics. A news API
+or feed would add FETCH_MS of latency per fetch; that is reported beside
+the local cost rather than slept.
+"fetch per call" is the naive integration: fetch, sort and pick the
+newest three for the topic on every question. "index" asks a NewsFeed
+refreshed once in the background. The index is timed at several sizes
+to show its cost does not grow with the number of headlines held. It
+ends with the time one refresh of the largest source takes, off the
+request path. Run from the repository root:
+
+    python benchmarks/bench_news.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kael_api.http_client import HttpClient
+from kael_api.news import NewsFeed, NewsItem, NewsSource
+
+SIZES = (100, 1000, 10000)
+TOPICS = 20
+FETCH_MS = 150
+CALLS = 100000
+NAIVE_CALLS = 200
+
+
+class SyntheticSource(NewsSource):
+    """Headlines with random publication times, many of them repeated."""
+
+    name = 'synthetic'
+
+    def __init__(self, items):
+        rng = random.Random(3)
+        now = time.time()
+        self.items = [NewsItem(f"Headline {rng.randrange(items * 9 // 10)}", f"topic{i % TOPICS}",
+                               now - rng.uniform(0, 86400)) for i in range(items)]
+        self.fetches = 0
+
+    def fetch(self):
+        self.fetches += 1
+        return self.items
+
+
+def naive(source, topic):
+    """What a synchronous integration does per question, less the wait."""
+    items = [item for item in source.fetch() if item.topic == topic]
+    items.sort(key=lambda item: item.published, reverse=True)
+    return items[:3]
+
+
+def main():
+    client = HttpClient(retries=0, pool_size=1)
+    topics = [f"topic{i}" for i in range(TOPICS)]
+    print(f"{'headlines':>9} {'fetch per call us':>18} {'+ upstream ms':>14} {'index us':>9}")
+    for size in SIZES:
+        source = SyntheticSource(size)
+
+        started = time.perf_counter()
+        for i in range(NAIVE_CALLS):
+            naive(source, topics[i % TOPICS])
+        naive_us = (time.perf_counter() - started) / NAIVE_CALLS * 1e6
+
+        feed = NewsFeed(source, client, per_topic=20)
+        feed.refresh()
+        started = time.perf_counter()
+        for i in range(CALLS):
+            feed.headlines(topics[i % TOPICS], 3)
+        index_us = (time.perf_counter() - started) / CALLS * 1e6
+
+        print(f"{size:>9} {naive_us:>18.1f} {FETCH_MS:>14} {index_us:>9.2f}")
+
+    source = SyntheticSource(SIZES[-1])
+    feed = NewsFeed(source, client, max_items=SIZES[-1])
+    started = time.perf_counter()
+    feed.refresh()
+    print(f"\none refresh of {SIZES[-1]} headlines in the background: "
+          f"{(time.perf_counter() - started) * 1e3:.1f} ms "
+          f"({feed.duplicates} duplicates dropped, {feed.index.count} held)")
+
+
+if __name__ == '__main__':
+    main()
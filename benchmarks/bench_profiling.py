@@ -0,0 +1,59 @@
+"""
+Overhead of the sampled profiling hooks on POST /api/command.
+
+Runs offline commands (no upstream calls) through server.py's Flask app
+in-process, with profiling disabled, sampling 10% and sampling every
+request, and reports the mean time per request in each case (best of
+ROUNDS runs). The last run writes a collapsed-stack file; render it with
+flamegraph.pl or open it in speedscope. Run from the repository root:
+
+    python benchmarks/bench_profiling.py
+"""
+import contextlib
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# One client sending as fast as it can would only measure the rate limiter
+os.environ.setdefault('KAEL_RATE_LIMITS', 'off')
+
+import server
+from kael_api.profiling import PROFILER
+
+REQUESTS = 2000
+ROUNDS = 3
+COMMANDS = ['what time is it', 'hello', 'tell me a joke', "what's the date today"]
+
+
+def run(client):
+    started = time.perf_counter()
+    for i in range(REQUESTS):
+        client.post('/api/command', json={'command': COMMANDS[i % len(COMMANDS)]})
+    return (time.perf_counter() - started) / REQUESTS * 1e6
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    results = []
+    client = server.app.test_client()
+    PROFILER.output_dir = tempfile.mkdtemp(prefix='kael-profile-')
+    # speak() prints every response
+    with contextlib.redirect_stdout(io.StringIO()):
+        run(client)  # warm up
+        for label, enabled, rate in (('disabled', False, 0.0), ('sampled 10%', True, 0.1),
+                                     ('sampled 100%', True, 1.0)):
+            PROFILER.configure(enabled=enabled, sample_rate=rate)
+            results.append((label, min(run(client) for _ in range(ROUNDS))))
+
+    for label, micros in results:
+        print(f"{label:>13}: {micros:7.1f} us/request")
+
+    print(f"profile written to {PROFILER.dump()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+Allocations and time per canned command, before and after the response catalogue.
+
+The "inline" handlers are the ones the servers used to have, building
+their lists of variants (and for news, three headline lists and a
+string grown with +=) on every call. The "catalogue" handlers are the
+server's own, picking from data/responses.json. For each command the
+script reports the time per call and the memory a call allocates while
+answering, as the tracemalloc peak above the memory held before a run of
+calls, less the peak an empty call shows. It ends with the time a hot reload of the catalogue takes. Run
+from the repository root:
+
+    python benchmarks/bench_responses.py
+"""
+import datetime
+import itertools
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('KAEL_LOG_LEVEL', 'CRITICAL')
+os.environ.setdefault('KAEL_HEALTH_INTERVAL', '0')
+
+import server
+
+CALLS = 200000
+TRACED_CALLS = 2000
+
+
+def inline_greeting(command, slots):
+    greetings = [
+        "Hello, sir. How may I assist you today?",
+        "Greetings. I am at your service.",
+        "Hello. All systems are operational and ready for your commands.",
+        "Good day, sir. How can I be of assistance?"
+    ]
+    return random.choice(greetings)
+
+
+def inline_joke(command, slots):
+    jokes = [
+        "Why did the AI go to art school? To improve its neural network!",
+        "I would tell you a joke about artificial intelligence, but I'm afraid you wouldn't get it.",
+        "Why don't scientists trust atoms? Because they make up everything!",
+        "What do you call an AI that sings? Artificial Harmonies!",
+        "Why was the computer cold? It left its Windows open.",
+        "What's a computer's favorite snack? Microchips.",
+        "Why did the computer go to the doctor? Because it had a virus!",
+        "How many programmers does it take to change a light bulb? None, that's a hardware problem."
+    ]
+    return random.choice(jokes)
+
+
+def inline_thanks(command, slots):
+    thanks_responses = [
+        "You're welcome, sir. Always a pleasure to be of service.",
+        "Happy to assist, sir. That's what I'm here for.",
+        "No need for thanks, sir. Serving you is my primary function.",
+        "Of course, sir. Is there anything else you require?"
+    ]
+    return random.choice(thanks_responses)
+
+
+def inline_exit(command, slots):
+    exit_responses = [
+        "Goodbye, sir. I'll be here when you need me.",
+        "Entering standby mode. Call me when you need assistance.",
+        "I'll be here monitoring systems while you're away, sir.",
+        "Until next time, sir."
+    ]
+    return random.choice(exit_responses)
+
+
+def inline_time(command, slots):
+    now = datetime.datetime.now().strftime("%I:%M %p")
+    return f"The current time is {now}, sir."
+
+
+def inline_news(topic=""):
+    general_news = [
+        "Scientists discover new renewable energy source that could revolutionize power generation.",
+        "Global tech companies announce collaboration on AI safety standards.",
+        "New study suggests regular exercise may improve cognitive function more than previously thought.",
+        "Space agency announces plans for the next lunar mission with international partners.",
+        "Breakthrough in quantum computing achieved by university researchers."
+    ]
+    tech_news = [
+        "New smartphone with revolutionary battery technology unveiled today.",
+        "Major software company releases significant update to its operating system.",
+        "Artificial intelligence system beats human experts in complex problem-solving competition.",
+        "Tech startup receives record funding for innovative augmented reality platform.",
+        "New cybersecurity threat identified, experts recommend immediate system updates."
+    ]
+    science_news = [
+        "Researchers identify potential new treatment for common neurological disorder.",
+        "New species of deep-sea creatures discovered in ocean exploration mission.",
+        "Climate scientists report unexpected changes in global weather patterns.",
+        "Astronomers observe unusual stellar phenomenon never before documented.",
+        "Breakthrough in renewable materials could reduce plastic waste significantly."
+    ]
+    if "tech" in topic.lower():
+        news_items, topic_name = tech_news, "technology"
+    elif "science" in topic.lower():
+        news_items, topic_name = science_news, "science"
+    else:
+        news_items, topic_name = general_news, "general"
+    selected_news = random.sample(news_items, min(3, len(news_items)))
+    news_text = f"Here are the latest {topic_name} headlines:\n\n"
+    for i, item in enumerate(selected_news, 1):
+        news_text += f"{i}. {item}\n"
+    news_text += "\nThis is simulated news. To get real news updates, you would need to integrate with a news API."
+    return news_text
+
+
+# Handlers are called the way command_exchange calls them
+SLOTS = {}
+
+
+def handler(function):
+    return lambda: function('', SLOTS)
+
+
+COMMANDS = [
+    ('greeting', handler(inline_greeting), handler(server.COMMAND_HANDLERS['greeting'])),
+    ('joke', handler(inline_joke), handler(server.COMMAND_HANDLERS['joke'])),
+    ('thanks', handler(inline_thanks), handler(server.COMMAND_HANDLERS['thanks'])),
+    ('exit', handler(inline_exit), handler(server.COMMAND_HANDLERS['exit'])),
+    ('time', handler(inline_time), handler(server.COMMAND_HANDLERS['time'])),
+    ('news', lambda: inline_news(''), lambda: server.get_news('')),
+]
+
+
+def per_call_seconds(function):
+    started = time.perf_counter()
+    for _ in range(CALLS):
+        function()
+    return (time.perf_counter() - started) / CALLS
+
+
+def per_call_bytes(function):
+    """Most memory a call allocated on top of what was held before, over many calls."""
+    function()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    # repeat() allocates nothing per iteration, unlike range() past small ints
+    for _ in itertools.repeat(None, TRACED_CALLS):
+        function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - before
+
+
+def main():
+    # What the measurement itself shows for a call that allocates nothing
+    baseline = per_call_bytes(lambda: None)
+    print(f"{'command':<10} {'inline ns':>10} {'catalogue ns':>13} {'inline peak B':>14} {'catalogue peak B':>17}")
+    for name, inline, catalogue in COMMANDS:
+        print(f"{name:<10} {per_call_seconds(inline) * 1e9:>10.0f} {per_call_seconds(catalogue) * 1e9:>13.0f} "
+              f"{per_call_bytes(inline) - baseline:>14} {per_call_bytes(catalogue) - baseline:>17}")
+
+    started = time.perf_counter()
+    reloads = 200
+    for _ in range(reloads):
+        server.responses.reload()
+    print(f"\nhot reload of {server.responses.stats()['entries']} entries: "
+          f"{(time.perf_counter() - started) / reloads * 1e3:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Load comparison of the threaded Flask mode and the async (ASGI) mode.
+
+Starts a stub Gemini upstream that takes DELAY seconds per answer, runs
+server.py in each serving mode against it, and fires REQUESTS commands
+that all go to Gemini with CONCURRENCY in flight at once. Reports
+throughput, latency percentiles and the peak thread count of the server
+process. Needs aiohttp and uvicorn. Run from the repository root:
+
+    python benchmarks/bench_serving_modes.py
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DELAY = 0.5
+REQUESTS = 600
+CONCURRENCY = 200
+
+# Every request comes from one address; switch off the rate limits and
+# concurrency cap so the benchmark measures the serving path itself
+NO_ADMISSION = {'KAEL_RATE_LIMITS': 'off', 'KAEL_MAX_CONCURRENT': '0'}
+
+MODES = {
+    'threaded': "import server; server.app.run(host='127.0.0.1', port={port}, threaded=True)",
+    'async': "import server; from kael_api.asgi import serve_asgi; "
+             "serve_asgi(server, host='127.0.0.1', port={port}, log_level='warning')",
+}
+
+
+class SlowGemini(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    body = json.dumps({'candidates': [{'content': {'parts': [{'text': 'stub answer'}]}}]}).encode()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(DELAY)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def thread_count(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+async def drive(base_url):
+    latencies = []
+    errors = 0
+    limit = asyncio.Semaphore(CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=CONCURRENCY)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60)) as session:
+        async def one(i):
+            nonlocal errors
+            async with limit:
+                started = time.perf_counter()
+                try:
+                    async with session.post(f'{base_url}/api/command',
+                                            json={'command': f'explain benchmark question number {i} please'}) as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors += 1
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(REQUESTS)))
+        return time.perf_counter() - started, sorted(latencies), errors
+
+
+def wait_until_up(base_url):
+    for _ in range(100):
+        try:
+            with urllib.request.urlopen(f'{base_url}/api/test', timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+
+
+def run_mode(mode, upstream_url):
+    port = free_port()
+    env = dict(os.environ, GEMINI_API_KEY='bench', ENABLE_GEMINI='true', GEMINI_API_URL=upstream_url,
+               KAEL_HTTP_POOL_SIZE=str(CONCURRENCY), **NO_ADMISSION)
+    process = subprocess.Popen([sys.executable, '-c', MODES[mode].format(port=port)], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_up(base_url)
+
+        peak = [0]
+        done = threading.Event()
+
+        def sample():
+            while not done.is_set():
+                peak[0] = max(peak[0], thread_count(process.pid))
+                time.sleep(0.02)
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        elapsed, latencies, errors = asyncio.run(drive(base_url))
+        done.set()
+        sampler.join()
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+        return {
+            'mode': mode,
+            'requests': REQUESTS,
+            'concurrency': CONCURRENCY,
+            'throughput_rps': round(REQUESTS / elapsed, 1),
+            'p50_ms': round(pct(0.50), 1),
+            'p95_ms': round(pct(0.95), 1),
+            'p99_ms': round(pct(0.99), 1),
+            'errors': errors,
+            'peak_threads': peak[0],
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    upstream = StubServer(('127.0.0.1', 0), SlowGemini)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    upstream_url = f'http://127.0.0.1:{upstream.server_address[1]}/generate'
+
+    for mode in MODES:
+        print(json.dumps(run_mode(mode, upstream_url)))
+    upstream.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Prompt size and memory of conversation sessions.
+
+Plays TURNS-turn conversations with replies of REPLY_WORDS words. For one
+conversation it prints the estimated prompt history size at each tenth
+turn, with naive unbounded history and with the session store's token
+budget. Then it spreads SESSIONS conversations over the store, as many
+clients would, and reports the time per turn, the sessions kept and the
+memory they hold (accounted and measured with tracemalloc) against the
+store's budget. Run from the repository root:
+
+    python benchmarks/bench_sessions.py
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kael_api.sessions import SessionStore, estimate_tokens
+
+TURNS = 40
+REPLY_WORDS = 120
+SESSIONS = 20000
+MAX_SESSIONS = 5000
+MAX_BYTES = 8 * 1024 * 1024
+
+WORDS = ('galaxy star orbit light year distance telescope planet mass energy gravity '
+         'spectrum nebula quasar cluster radius matter photon system observation').split()
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def main():
+    rng = random.Random(3)
+    store = SessionStore(max_sessions=MAX_SESSIONS, max_bytes=MAX_BYTES)
+    naive = []
+    print("turn  naive history tokens  session history tokens")
+    for turn in range(1, TURNS + 1):
+        question = f"question {turn} about the {sentence(rng, 6)}"
+        reply = sentence(rng, REPLY_WORDS)
+        naive.append(f"User: {question}\nKAEL: {reply}")
+        store.record('conversation', question, reply)
+        if turn % 10 == 0:
+            print(f"{turn:>4}  {estimate_tokens(chr(10).join(naive)):>20}  "
+                  f"{estimate_tokens(store.context('conversation')):>22}")
+
+    replies = [sentence(rng, REPLY_WORDS) for _ in range(100)]
+    elapsed, _ = many_clients(replies)
+    # The same run again with allocations traced, holding on to its store
+    tracemalloc.start()
+    _, traced = many_clients(replies)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = traced.stats()
+    print(f"\n{SESSIONS * 5} turns from {SESSIONS} clients: {elapsed / (SESSIONS * 5) * 1e6:.1f} us per turn "
+          f"(context + record)")
+    print(f"sessions kept {stats['sessions']} (cap {MAX_SESSIONS}), evicted {stats['evictions']}")
+    print(f"memory accounted {stats['bytes'] / 1e6:.1f} MB, traced {current / 1e6:.1f} MB, "
+          f"budget {MAX_BYTES / 1e6:.1f} MB")
+
+
+def many_clients(replies):
+    """Five turns per client in random order; returns the time taken and the store."""
+    rng = random.Random(5)
+    store = SessionStore(max_sessions=MAX_SESSIONS, max_bytes=MAX_BYTES)
+    started = time.perf_counter()
+    for turn in range(SESSIONS * 5):
+        session = f"client-{rng.randrange(SESSIONS):06d}"
+        store.context(session)
+        store.record(session, f"question {turn} about the {rng.choice(WORDS)}", replies[turn % len(replies)])
+    return time.perf_counter() - started, store
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Concurrency check for single-flight coalescing of upstream calls.
+
+Starts a stub upstream that counts its hits and takes DELAY seconds per
+answer, runs server.py in each serving mode against it, and releases
+CLIENTS simultaneous identical requests (the same search in varying case,
+then the same Gemini prompt). Each burst must reach the upstream exactly
+once; the script reports the hit counts and the server's coalescing
+counters and exits non-zero otherwise. Needs uvicorn and aiohttp for the
+async mode. Run from the repository root:
+
+    python benchmarks/bench_singleflight.py
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DELAY = 0.3
+CLIENTS = 50
+
+# Every request comes from one address; switch off the rate limits and
+# concurrency cap so the benchmark measures the serving path itself
+NO_ADMISSION = {'KAEL_RATE_LIMITS': 'off', 'KAEL_MAX_CONCURRENT': '0'}
+
+MODES = {
+    'threaded': "import server; server.app.run(host='127.0.0.1', port={port}, threaded=True)",
+    'async': "import server; from kael_api.asgi import serve_asgi; "
+             "serve_asgi(server, host='127.0.0.1', port={port}, log_level='warning')",
+}
+
+hits = Counter()
+hits_lock = threading.Lock()
+
+
+class CountingUpstream(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def _answer(self, kind, payload):
+        with hits_lock:
+            hits[kind] += 1
+        time.sleep(DELAY)
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._answer('search', {'Abstract': 'stub abstract'})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._answer('gemini', {'candidates': [{'content': {'parts': [{'text': 'stub answer'}]}}]})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(base_url):
+    for _ in range(100):
+        try:
+            with urllib.request.urlopen(f'{base_url}/api/test', timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+
+
+def burst(requests):
+    """Send all requests at the same moment, one thread each."""
+    gate = threading.Barrier(len(requests))
+
+    def send(request):
+        gate.wait()
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.loads(response.read())
+
+    with ThreadPoolExecutor(max_workers=len(requests)) as pool:
+        return list(pool.map(send, requests))
+
+
+def run_mode(mode, upstream_base):
+    port = free_port()
+    env = dict(os.environ, GEMINI_API_KEY='bench', ENABLE_GEMINI='true',
+               GEMINI_API_URL=f'{upstream_base}/gemini', SEARCH_API_URL=f'{upstream_base}/search',
+               KAEL_HTTP_POOL_SIZE=str(CLIENTS), **NO_ADMISSION,
+               # Health probes would add to the stub's hit counts
+               KAEL_HEALTH_INTERVAL='0')
+    process = subprocess.Popen([sys.executable, '-c', MODES[mode].format(port=port)], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_up(base_url)
+        hits.clear()
+
+        queries = ['trending tech news', 'Trending Tech News', 'trending  tech news?']
+        burst([f'{base_url}/api/search?q={urllib.request.quote(queries[i % len(queries)])}'
+               for i in range(CLIENTS)])
+        burst([urllib.request.Request(f'{base_url}/api/gemini',
+                                      data=json.dumps({'prompt': 'Respond with GEMINI_ONLINE'}).encode(),
+                                      headers={'Content-Type': 'application/json'})
+               for _ in range(CLIENTS)])
+
+        with urllib.request.urlopen(f'{base_url}/api/status', timeout=5) as response:
+            status = json.loads(response.read())
+        coalescing = status.get('async_coalescing') or status['upstream_coalescing']
+        return {
+            'mode': mode,
+            'clients': CLIENTS,
+            'search_upstream_hits': hits['search'],
+            'gemini_upstream_hits': hits['gemini'],
+            'coalescing': coalescing,
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    upstream = StubServer(('127.0.0.1', 0), CountingUpstream)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    upstream_base = f'http://127.0.0.1:{upstream.server_address[1]}'
+
+    ok = True
+    for mode in MODES:
+        result = run_mode(mode, upstream_base)
+        print(json.dumps(result))
+        ok = ok and result['search_upstream_hits'] == 1 and result['gemini_upstream_hits'] == 1
+    upstream.shutdown()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
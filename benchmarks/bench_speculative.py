@@ -0,0 +1,98 @@
+"""
+Question latency with one answer source at a time versus a speculative race.
+
+Runs server.py in this process against a stub upstream where DuckDuckGo
+answers in SEARCH_DELAY seconds and Gemini usually answers in
+GEMINI_FAST seconds but takes GEMINI_SLOW seconds for one question in
+GEMINI_SLOW_EVERY, the long tail of a busy model. QUESTIONS distinct
+questions are sent through the Flask test client first with
+SPECULATIVE_ANSWERS off (Gemini only) and then on (knowledge base, search
+and Gemini raced). Run from the repository root:
+
+    python benchmarks/bench_speculative.py
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUESTIONS = 30
+SEARCH_DELAY = 0.4
+GEMINI_FAST = 0.15
+GEMINI_SLOW = 2.5
+GEMINI_SLOW_EVERY = 5
+
+
+class StubUpstream(BaseHTTPRequestHandler):
+    gemini_calls = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(SEARCH_DELAY)
+        self._reply({'Abstract': 'An answer from the web.'})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        StubUpstream.gemini_calls += 1
+        slow = StubUpstream.gemini_calls % GEMINI_SLOW_EVERY == 0
+        time.sleep(GEMINI_SLOW if slow else GEMINI_FAST)
+        self._reply({'candidates': [{'content': {'parts': [{'text': 'An answer from Gemini.'}]}}]})
+
+
+def run(client, label):
+    timings = []
+    for i in range(QUESTIONS):
+        started = time.perf_counter()
+        client.post('/api/command', json={'command': f'what is benchmark question {label} {i}'})
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return (timings[len(timings) // 2] * 1000, timings[int(len(timings) * 0.95)] * 1000,
+            timings[-1] * 1000, sum(timings))
+
+
+def main():
+    upstream = ThreadingHTTPServer(('127.0.0.1', 0), StubUpstream)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{upstream.server_address[1]}'
+    os.environ.update({
+        'SEARCH_API_URL': f'{base}/',
+        'GEMINI_API_URL': f'{base}/v1beta/models/stub:generateContent',
+        'GEMINI_API_KEY': 'benchmark',
+        'KAEL_LOG_LEVEL': 'CRITICAL',
+        # One client sending as fast as it can would only measure the rate limiter
+        'KAEL_RATE_LIMITS': 'off',
+        # Health probes would add to the stub's call counts
+        'KAEL_HEALTH_INTERVAL': '0',
+    })
+    import server
+
+    client = server.app.test_client()
+    for speculative in (False, True):
+        server.SPECULATIVE_ANSWERS = speculative
+        StubUpstream.gemini_calls = 0
+        # Without text-to-speech, responses are printed; keep them out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            p50, p95, worst, total = run(client, 'race' if speculative else 'serial')
+        label = 'speculative race' if speculative else 'gemini only'
+        print(f"{label:>16}: p50 {p50:7.1f} ms, p95 {p95:7.1f} ms, max {worst:7.1f} ms, "
+              f"{QUESTIONS} questions in {total:5.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Request latency with inline speech versus the background speech worker.
+
+Uses a fake engine that "speaks" at roughly 170 words per minute scaled
+down by SPEED so the run finishes quickly, then times how long speak()
+holds the caller for a short reply and a 150-word Gemini-sized reply.
+Run from the repository root:
+
+    python benchmarks/bench_speech.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kael_api.speech import SpeechWorker
+
+# Fraction of real speaking time the fake engine sleeps for
+SPEED = 0.01
+WORDS_PER_SECOND = 170 / 60
+
+
+class FakeEngine:
+    def __init__(self):
+        self._text = ''
+        self._callbacks = []
+
+    def connect(self, name, callback):
+        self._callbacks.append(callback)
+
+    def say(self, text):
+        self._text = text
+
+    def runAndWait(self):
+        time.sleep(len(self._text.split()) / WORDS_PER_SECOND * SPEED)
+
+    def stop(self):
+        pass
+
+
+def inline_speak(engine, text):
+    engine.say(text)
+    engine.runAndWait()
+    return text
+
+
+def main(rounds=5):
+    replies = {
+        'short': "The current time is 10:21 PM, sir.",
+        '150 words': " ".join(["word"] * 150),
+    }
+    worker = SpeechWorker(FakeEngine)
+    engine = FakeEngine()
+
+    print(f"{'reply':<10} {'inline ms':>10} {'queued ms':>10}   (real speech = inline / {SPEED})")
+    for label, text in replies.items():
+        started = time.perf_counter()
+        for _ in range(rounds):
+            inline_speak(engine, text)
+        inline_ms = (time.perf_counter() - started) * 1000 / rounds
+
+        started = time.perf_counter()
+        for _ in range(rounds):
+            worker.say(text)
+        queued_ms = (time.perf_counter() - started) * 1000 / rounds
+        print(f"{label:<10} {inline_ms:>10.3f} {queued_ms:>10.3f}")
+
+    worker.close()
+    print('worker stats:', worker.stats())
+
+
+if __name__ == '__main__':
+    main()
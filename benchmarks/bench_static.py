@@ -0,0 +1,85 @@
+"""
+Static file serving: per-request disk lookups versus the asset manifest.
+
+Builds a dist/-like directory (index.html and a hashed JS bundle) in a
+temporary folder and serves it with two Flask apps: the old catch-all
+route (os.path.exists plus send_from_directory on every hit) and
+kael_api.assets. Reports the time per request and the bytes sent for a
+first load (gzip accepted) and a revalidation with If-None-Match. Run from
+the repository root:
+
+    python benchmarks/bench_static.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, request, send_from_directory
+
+from kael_api.assets import AssetManifest, flask_response
+
+REQUESTS = 2000
+BUNDLE = 'assets/index-Bq3xZ9_a.js'
+
+
+def build_dist(root):
+    os.makedirs(os.path.join(root, 'assets'))
+    with open(os.path.join(root, 'index.html'), 'w') as f:
+        f.write(f'<!doctype html><html><body><div id="root"></div><script src="/{BUNDLE}"></script></body></html>')
+    with open(os.path.join(root, BUNDLE), 'w') as f:
+        # Minified-looking JavaScript, about 400 KB
+        f.write(''.join(f'function c{i}(a,b){{return a.map(x=>x*{i}+b)}};' for i in range(12000)))
+
+
+def disk_app(root):
+    app = Flask(__name__, static_folder=root)
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        if path != "" and os.path.exists(app.static_folder + '/' + path):
+            return send_from_directory(app.static_folder, path)
+        return send_from_directory(app.static_folder, 'index.html')
+
+    return app
+
+
+def manifest_app(root):
+    app = Flask(__name__)
+    manifest = AssetManifest(root)
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        return flask_response(manifest.get(path) or manifest.get('index.html'), request)
+
+    return app
+
+
+def measure(client, headers):
+    sent = 0
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        response = client.get(f'/{BUNDLE}', headers=headers)
+        sent += len(response.get_data())
+        response.close()
+    return (time.perf_counter() - started) / REQUESTS * 1e6, sent // REQUESTS
+
+
+def main():
+    with tempfile.TemporaryDirectory() as root:
+        build_dist(root)
+        for label, app in (('disk lookups', disk_app(root)), ('asset manifest', manifest_app(root))):
+            client = app.test_client()
+            etag = client.get(f'/{BUNDLE}', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+            first, first_bytes = measure(client, {'Accept-Encoding': 'gzip'})
+            again, again_bytes = measure(client, {'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+            print(f"{label:>15}: first load {first:7.1f} us, {first_bytes:7d} bytes; "
+                  f"revalidation {again:7.1f} us, {again_bytes:7d} bytes")
+
+
+if __name__ == '__main__':
+    main()
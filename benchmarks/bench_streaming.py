@@ -0,0 +1,160 @@
+"""
+Time to first byte of a Gemini answer, buffered versus streamed.
+
+Starts a stub Gemini upstream that generates CHUNKS pieces of text,
+CHUNK_DELAY seconds apart, on both generateContent (one JSON body once
+everything is generated) and streamGenerateContent?alt=sse. Runs
+server.py in each serving mode against it and times POST /api/command
+and POST /api/gemini as plain JSON and as SSE: the time until the first
+byte of the body reaches the client, and until the response is complete.
+Needs uvicorn and aiohttp for the async mode. Run from the repository root:
+
+    python benchmarks/bench_streaming.py
+"""
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHUNKS = 10
+CHUNK_DELAY = 0.08
+ROUNDS = 5
+
+# Every request comes from one address; switch off the rate limits and
+# concurrency cap so the benchmark measures the serving path itself
+NO_ADMISSION = {'KAEL_RATE_LIMITS': 'off', 'KAEL_MAX_CONCURRENT': '0'}
+
+MODES = {
+    'threaded': "import server; server.app.run(host='127.0.0.1', port={port}, threaded=True)",
+    'async': "import server; from kael_api.asgi import serve_asgi; "
+             "serve_asgi(server, host='127.0.0.1', port={port}, log_level='warning')",
+}
+
+
+def piece(i):
+    return {'candidates': [{'content': {'parts': [{'text': f'part {i} of the answer. '}]}}]}
+
+
+class StubGemini(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if ':streamGenerateContent' in self.path:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            # One HTTP chunk per event, as Gemini sends them
+            for i in range(CHUNKS):
+                time.sleep(CHUNK_DELAY)
+                event = f"data: {json.dumps(piece(i))}\r\n\r\n".encode()
+                self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+            return
+
+        time.sleep(CHUNK_DELAY * CHUNKS)
+        text = ''.join(piece(i)['candidates'][0]['content']['parts'][0]['text'] for i in range(CHUNKS))
+        body = json.dumps({'candidates': [{'content': {'parts': [{'text': text}]}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(base_url):
+    for _ in range(100):
+        try:
+            with urllib.request.urlopen(f'{base_url}/api/test', timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+
+
+def timed_post(port, path, body):
+    """Return (seconds to first body byte, seconds to complete body)."""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    started = time.perf_counter()
+    conn.request('POST', path, body=json.dumps(body), headers={'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    first = response.read1(1)
+    first_at = time.perf_counter()
+    rest = response.read()
+    done_at = time.perf_counter()
+    conn.close()
+    if response.status != 200 or not (first + rest):
+        raise RuntimeError(f"{path} returned {response.status}")
+    return first_at - started, done_at - started
+
+
+def run_mode(mode, upstream_url):
+    port = free_port()
+    env = dict(os.environ, GEMINI_API_KEY='bench', ENABLE_GEMINI='true', GEMINI_API_URL=upstream_url,
+               **NO_ADMISSION)
+    process = subprocess.Popen([sys.executable, '-c', MODES[mode].format(port=port)], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(f'http://127.0.0.1:{port}')
+        results = []
+        for route in ('/api/command', '/api/gemini'):
+            for stream in (False, True):
+                first, total = [], []
+                for i in range(ROUNDS):
+                    # A new question each round so the prompt cache never answers
+                    question = f'explain streaming benchmark question number {i} {stream} please'
+                    body = {'command': question} if route == '/api/command' else \
+                        {'prompt': question, 'fresh': True}
+                    body['stream'] = stream
+                    ttfb, elapsed = timed_post(port, route, body)
+                    first.append(ttfb)
+                    total.append(elapsed)
+                results.append({
+                    'mode': mode,
+                    'route': route,
+                    'stream': stream,
+                    'ttfb_ms': round(sorted(first)[len(first) // 2] * 1000, 1),
+                    'total_ms': round(sorted(total)[len(total) // 2] * 1000, 1),
+                })
+        return results
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    upstream = StubServer(('127.0.0.1', 0), StubGemini)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    upstream_url = f'http://127.0.0.1:{upstream.server_address[1]}/v1beta/models/stub:generateContent'
+
+    for mode in MODES:
+        for result in run_mode(mode, upstream_url):
+            print(json.dumps(result))
+    upstream.shutdown()
+
+
+if __name__ == '__main__':
+    main()
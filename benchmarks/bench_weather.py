@@ -0,0 +1,131 @@
+"""
+Upstream calls per weather question, with and without the weather caches.
+
+Asks about ASKS places drawn with Zipf weights from the stub provider's
+cities (several of which share a grid cell with a neighbour) and from
+OTHER_PLACES made-up names, through a provider that charges GEOCODE_MS
+and FORECAST_MS of simulated latency per call. "uncached" calls the
+provider for every question, as a weather lookup without the service
+would; "cached" goes through WeatherService. Then, with a forecast TTL of
+a fraction of a second, it asks about a few places for a while and
+counts the questions that had to wait for a forecast, with and without
+the background prefetch. Run from the repository root:
+
+    python benchmarks/bench_weather.py
+"""
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kael_api.http_client import HttpClient
+from kael_api.upstream import run_sync
+from kael_api.weather import StubProvider, WeatherService
+
+ASKS = 5000
+OTHER_PLACES = 40
+GEOCODE_MS = 80
+FORECAST_MS = 120
+
+SHORT_TTL = 0.3
+PREFETCH_INTERVAL = 0.1
+RUN_SECONDS = 3.0
+
+
+class MeteredProvider(StubProvider):
+    """The stub provider, counting calls and the latency a real one would add."""
+
+    def __init__(self, forecast_ttl=StubProvider.forecast_ttl):
+        self.forecast_ttl = forecast_ttl
+        self.calls = 0
+        self.waited_ms = 0
+
+    def geocode(self, location):
+        self.calls += 1
+        self.waited_ms += GEOCODE_MS
+        return super().geocode(location)
+
+    def forecast(self, latitude, longitude):
+        self.calls += 1
+        self.waited_ms += FORECAST_MS
+        return super().forecast(latitude, longitude)
+
+
+def workload():
+    rng = random.Random(7)
+    places = [name.title() for name in StubProvider.PLACES] + [f"Town {i}" for i in range(OTHER_PLACES)]
+    weights = [1 / rank for rank in range(1, len(places) + 1)]
+    return rng.choices(places, weights, k=ASKS)
+
+
+def uncached(asks):
+    provider = MeteredProvider()
+    for location in asks:
+        latitude, longitude, _ = provider.geocode(location)
+        provider.forecast(latitude, longitude)
+    return provider
+
+
+def cached(asks, client):
+    provider = MeteredProvider()
+    service = WeatherService(provider)
+    for location in asks:
+        run_sync(service.lookup(location), client)
+    return provider, service
+
+
+def waits(client, prefetch):
+    """Questions about a few places over RUN_SECONDS that waited for a forecast."""
+    provider = MeteredProvider(forecast_ttl=SHORT_TTL)
+    service = WeatherService(provider)
+    if prefetch:
+        service.start_prefetch(client, PREFETCH_INTERVAL)
+    places = ['London', 'Paris', 'Tokyo', 'Seattle']
+    deadline = time.monotonic() + RUN_SECONDS
+    asked = 0
+    for location in itertools.cycle(places):
+        if time.monotonic() > deadline:
+            break
+        run_sync(service.lookup(location), client)
+        asked += 1
+        time.sleep(0.005)
+    stats = service.forecast_cache.stats()
+    # The first question about each place always waits
+    return asked, stats['misses'], service.prefetched
+
+
+def main():
+    client = HttpClient(retries=0, pool_size=1)
+    asks = workload()
+    print(f"{ASKS} questions about {len(set(asks))} places, "
+          f"{GEOCODE_MS} ms per geocode and {FORECAST_MS} ms per forecast upstream\n")
+
+    started = time.perf_counter()
+    provider = uncached(asks)
+    elapsed = time.perf_counter() - started
+    print(f"{'uncached':<10} {provider.calls:>6} upstream calls  "
+          f"{provider.waited_ms / ASKS:>7.1f} ms upstream per question  {elapsed / ASKS * 1e6:>6.1f} us local")
+
+    started = time.perf_counter()
+    provider, service = cached(asks, client)
+    elapsed = time.perf_counter() - started
+    stats = service.stats()
+    print(f"{'cached':<10} {provider.calls:>6} upstream calls  "
+          f"{provider.waited_ms / ASKS:>7.1f} ms upstream per question  {elapsed / ASKS * 1e6:>6.1f} us local")
+    print(f"           geocode hit ratio {stats['geocode_cache']['hit_ratio']}, "
+          f"forecast hit ratio {stats['forecast_cache']['hit_ratio']} "
+          f"({stats['forecast_cache']['entries']} cells for {len(set(asks))} places)\n")
+
+    print(f"forecast TTL {SHORT_TTL} s, asking about 4 places for {RUN_SECONDS} s:")
+    for prefetch in (False, True):
+        asked, missed, prefetched = waits(client, prefetch)
+        label = f"prefetch every {PREFETCH_INTERVAL} s" if prefetch else "no prefetch"
+        print(f"  {label:<22} {missed:>4} of {asked} questions waited for a forecast"
+              f" ({prefetched} fetched in the background)")
+
+
+if __name__ == '__main__':
+    main()
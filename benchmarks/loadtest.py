@@ -0,0 +1,501 @@
+"""
+Reproducible load test for the KAEL API.
+
+Starts stub Gemini and DuckDuckGo upstreams on localhost, runs server.py
+against them (as a subprocess by default, or in this process), and drives
+POST /api/command with a weighted mix of command intents. Each scenario is
+either closed-loop (a fixed number of clients sending back to back) or
+open-loop (requests arriving at a fixed rate whether or not earlier ones
+have finished, with latency measured from the scheduled arrival so a
+stalled server is not hidden). For every scenario it reports throughput,
+latency percentiles overall and per intent, errors by kind, upstream hits,
+and the server's CPU time and resident memory growth, taken from
+/api/status.
+
+The report is JSON, so runs on two commits can be compared:
+
+    python benchmarks/loadtest.py --output before.json
+    python benchmarks/loadtest.py --compare before.json
+
+--compare exits non-zero when a scenario's throughput drops, or its p95
+latency or error rate rises, by more than --threshold percent.
+
+Other examples:
+
+    python benchmarks/loadtest.py --mode async --concurrency 1,16,64 --duration 10
+    python benchmarks/loadtest.py --rate 50,200 --mix time=2,search=1,gemini=1
+    python benchmarks/loadtest.py --url http://localhost:5000 --requests 1
+
+The last form checks a server that is already running, against its real
+upstreams. Commands are drawn from a seeded generator, so every run sends
+the same sequence. Needs aiohttp (and uvicorn for --mode async). Run from
+the repository root.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Every request comes from one address; switch off the rate limits and
+# concurrency cap so the benchmark measures the serving path itself
+NO_ADMISSION = {'KAEL_RATE_LIMITS': 'off', 'KAEL_MAX_CONCURRENT': '0'}
+
+MODES = {
+    'threaded': "import server; server.app.run(host='127.0.0.1', port={port}, threaded=True)",
+    'async': "import server; from kael_api.asgi import serve_asgi; "
+             "serve_asgi(server, host='127.0.0.1', port={port}, log_level='warning')",
+}
+
+# Command templates per intent; {n} is drawn from the key space, so
+# repeated keys exercise the caches the way repeated questions do
+INTENT_COMMANDS = {
+    'greeting': 'hello',
+    'time': 'what time is it',
+    'date': "what's the date today",
+    'joke': 'tell me a joke',
+    'weather': 'weather in city {n}',
+    'news': 'news about technology',
+    'search': 'search for benchmark topic {n}',
+    'gemini': 'explain benchmark question number {n} please',
+}
+
+DEFAULT_MIX = 'greeting=2,time=2,weather=1,news=1,search=2,gemini=2'
+
+upstream_hits = Counter()
+upstream_lock = threading.Lock()
+
+
+class StubUpstream(BaseHTTPRequestHandler):
+    """Answers Gemini POSTs and DuckDuckGo GETs after a fixed delay."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    gemini_delay = 0.2
+    search_delay = 0.1
+
+    def _answer(self, kind, delay, payload):
+        with upstream_lock:
+            upstream_hits[kind] += 1
+        time.sleep(delay)
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._answer('search', self.search_delay, {'Abstract': 'Stub abstract for the benchmark query.'})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._answer('gemini', self.gemini_delay,
+                     {'candidates': [{'content': {'parts': [{'text': 'Stub answer from the benchmark.'}]}}]})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(base_url, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'{base_url}/api/test', timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f"Server at {base_url} did not come up within {timeout}s")
+
+
+def parse_list(text, kind):
+    return [kind(value) for value in text.split(',') if value.strip()] if text else []
+
+
+def parse_mix(text):
+    """Parse "intent=weight,..." into a list of (intent, weight)."""
+    mix = []
+    for part in text.split(','):
+        intent, _, weight = part.strip().partition('=')
+        if intent not in INTENT_COMMANDS:
+            raise SystemExit(f"Unknown intent {intent!r}; choose from {', '.join(INTENT_COMMANDS)}")
+        mix.append((intent, float(weight or 1)))
+    return mix
+
+
+def workload(mix, keyspace, seed):
+    """Endless, seeded sequence of (intent, command) pairs following the mix."""
+    rng = random.Random(seed)
+    intents = [intent for intent, _ in mix]
+    weights = [weight for _, weight in mix]
+    while True:
+        intent = rng.choices(intents, weights)[0]
+        yield intent, INTENT_COMMANDS[intent].format(n=rng.randrange(keyspace))
+
+
+@contextlib.contextmanager
+def start_target(args, upstream_base):
+    """Run the server under test, yielding its base URL."""
+    if args.url:
+        yield args.url.rstrip('/')
+        return
+
+    env = {'GEMINI_API_KEY': 'bench', 'ENABLE_GEMINI': 'true',
+           'GEMINI_API_URL': f'{upstream_base}/gemini', 'SEARCH_API_URL': f'{upstream_base}/search',
+           'KAEL_HTTP_POOL_SIZE': str(max(parse_list(args.concurrency, int) + [64])), **NO_ADMISSION}
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+
+    if args.target == 'subprocess':
+        process = subprocess.Popen([sys.executable, '-c', MODES[args.mode].format(port=port)], cwd=ROOT,
+                                   env=dict(os.environ, **env),
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_up(base_url)
+            yield base_url
+        finally:
+            process.terminate()
+            process.wait()
+        return
+
+    # In-process: the report shares the process with the server, whose
+    # INFO and DEBUG logging is switched off and spoken responses discarded
+    os.environ.update(env)
+    logging.disable(logging.INFO)
+    import server
+    sys.stdout = open(os.devnull, 'w')
+    if args.mode == 'async':
+        import uvicorn
+        from kael_api.asgi import create_asgi_app
+        httpd = uvicorn.Server(uvicorn.Config(create_asgi_app(server), host='127.0.0.1', port=port,
+                                              log_level='warning'))
+        thread = threading.Thread(target=httpd.run, daemon=True)
+        stop = lambda: setattr(httpd, 'should_exit', True)
+    else:
+        from werkzeug.serving import make_server
+        httpd = make_server('127.0.0.1', port, server.app, threaded=True)
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        stop = httpd.shutdown
+    thread.start()
+    try:
+        wait_until_up(base_url)
+        yield base_url
+    finally:
+        stop()
+        thread.join(5)
+        sys.stdout = sys.__stdout__
+
+
+async def server_sample(session, base_url):
+    """CPU seconds and resident bytes reported by the server, or None."""
+    try:
+        async with session.get(f'{base_url}/api/status') as response:
+            return (await response.json()).get('process')
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        return None
+
+
+class Recorder:
+    """Outcome of every request in a scenario."""
+
+    def __init__(self):
+        self.latencies = []
+        self.by_intent = {}
+        self.errors = Counter()
+        self.intent_errors = Counter()
+
+    def add(self, intent, seconds, error=None):
+        self.latencies.append(seconds)
+        self.by_intent.setdefault(intent, []).append(seconds)
+        if error:
+            self.errors[error] += 1
+            self.intent_errors[intent] += 1
+
+
+async def send_command(session, base_url, intent, command, recorder, started):
+    loop = asyncio.get_running_loop()
+    error = None
+    try:
+        async with session.post(f'{base_url}/api/command', json={'command': command}) as response:
+            await response.read()
+            if response.status != 200:
+                error = f'http_{response.status}'
+    except asyncio.TimeoutError:
+        error = 'timeout'
+    except aiohttp.ClientError as e:
+        error = type(e).__name__
+    recorder.add(intent, loop.time() - started, error)
+
+
+async def closed_loop(session, base_url, commands, recorder, concurrency, duration, requests):
+    """concurrency clients, each sending its next command as soon as the last one is answered."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+    sent = 0
+
+    async def client():
+        nonlocal sent
+        while loop.time() < deadline and (not requests or sent < requests):
+            sent += 1
+            intent, command = next(commands)
+            await send_command(session, base_url, intent, command, recorder, loop.time())
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+
+
+async def open_loop(session, base_url, commands, recorder, rate, duration, poisson, seed):
+    """Commands arriving at rate per second for duration seconds, regardless of responses."""
+    loop = asyncio.get_running_loop()
+    rng = random.Random(seed)
+    start = loop.time()
+    tasks = set()
+    offset = 0.0
+    while offset < duration:
+        delay = start + offset - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        intent, command = next(commands)
+        task = asyncio.create_task(send_command(session, base_url, intent, command, recorder, start + offset))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        offset += rng.expovariate(rate) if poisson else 1.0 / rate
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+def percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def at(p):
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 2)
+
+    return {
+        'mean': round(sum(ordered) / len(ordered) * 1000, 2),
+        'p50': at(0.50),
+        'p90': at(0.90),
+        'p95': at(0.95),
+        'p99': at(0.99),
+        'max': round(ordered[-1] * 1000, 2),
+    }
+
+
+async def run_scenario(session, base_url, args, scenario, commands):
+    recorder = Recorder()
+    before = await server_sample(session, base_url)
+    hits_before = Counter(upstream_hits)
+    peak = [before['resident_bytes'] if before else None]
+    done = asyncio.Event()
+
+    async def sample_memory():
+        while not done.is_set():
+            sample = await server_sample(session, base_url)
+            if sample and sample.get('resident_bytes'):
+                peak[0] = max(peak[0] or 0, sample['resident_bytes'])
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(done.wait(), args.sample_interval)
+
+    sampler = asyncio.create_task(sample_memory())
+    started = time.perf_counter()
+    if scenario['model'] == 'closed':
+        await closed_loop(session, base_url, commands, recorder, scenario['concurrency'],
+                          args.duration, args.requests)
+    else:
+        await open_loop(session, base_url, commands, recorder, scenario['rate'], args.duration,
+                        args.arrivals == 'poisson', args.seed)
+    elapsed = time.perf_counter() - started
+    done.set()
+    await sampler
+    after = await server_sample(session, base_url)
+
+    total = len(recorder.latencies)
+    errors = sum(recorder.errors.values())
+    result = dict(scenario)
+    result.update({
+        'duration_s': round(elapsed, 3),
+        'requests': total,
+        'errors': errors,
+        'error_rate': round(errors / total, 4) if total else 0.0,
+        'errors_by_kind': dict(recorder.errors),
+        'throughput_rps': round((total - errors) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': percentiles(recorder.latencies),
+        'intents': {
+            intent: {
+                'requests': len(values),
+                'errors': recorder.intent_errors[intent],
+                'latency_ms': percentiles(values),
+            }
+            for intent, values in sorted(recorder.by_intent.items())
+        },
+        'upstream_hits': None if args.url else {kind: upstream_hits[kind] - hits_before[kind]
+                                                for kind in ('gemini', 'search')},
+        'server': None,
+    })
+    if before and after:
+        cpu = after['cpu_seconds'] - before['cpu_seconds']
+        result['server'] = {
+            'cpu_seconds': round(cpu, 3),
+            'cpu_ms_per_request': round(cpu * 1000 / total, 3) if total else None,
+            'rss_start_bytes': before['resident_bytes'],
+            'rss_end_bytes': after['resident_bytes'],
+            'rss_peak_bytes': max(peak[0] or 0, after['resident_bytes'] or 0),
+            'rss_growth_bytes': (after['resident_bytes'] or 0) - (before['resident_bytes'] or 0),
+        }
+    return result
+
+
+def scenarios(args):
+    result = [{'name': f'closed c={c}', 'model': 'closed', 'concurrency': c}
+              for c in parse_list(args.concurrency, int)]
+    result += [{'name': f'open rate={r:g}/s', 'model': 'open', 'rate': r}
+               for r in parse_list(args.rate, float)]
+    return result
+
+
+async def drive(base_url, args):
+    mix = parse_mix(args.mix)
+    commands = workload(mix, args.keyspace, args.seed)
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        if args.warmup > 0:
+            await closed_loop(session, base_url, commands, Recorder(), 4, args.warmup, 0)
+        return [await run_scenario(session, base_url, args, scenario, commands) for scenario in scenarios(args)]
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return f'{revision}-dirty' if dirty else revision
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, report, threshold):
+    """Print per-scenario changes against a baseline report; True if any regressed."""
+    previous = {scenario['name']: scenario for scenario in baseline['scenarios']}
+    regressed = False
+    for scenario in report['scenarios']:
+        old = previous.get(scenario['name'])
+        if not old or not old['latency_ms'] or not scenario['latency_ms']:
+            continue
+        changes = {
+            'throughput_rps': (old['throughput_rps'], scenario['throughput_rps'], -1),
+            'p95_ms': (old['latency_ms']['p95'], scenario['latency_ms']['p95'], 1),
+            'error_rate': (old['error_rate'], scenario['error_rate'], 1),
+        }
+        notes = []
+        for label, (before, after, worse) in changes.items():
+            change = (after - before) / before * 100 if before else (100.0 if after else 0.0)
+            flag = ''
+            if change * worse > threshold:
+                flag = ' REGRESSION'
+                regressed = True
+            notes.append(f"{label} {before:g} -> {after:g} ({change:+.1f}%){flag}")
+        print(f"{scenario['name']}: " + ', '.join(notes), file=sys.stderr)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the KAEL API")
+    parser.add_argument('--mode', choices=MODES, default='threaded', help="serving mode of server.py")
+    parser.add_argument('--target', choices=('subprocess', 'inprocess'), default='subprocess',
+                        help="run the server as a child process or inside this one")
+    parser.add_argument('--url', help="test an already running server instead (no stub upstreams)")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="weighted intents, e.g. time=2,gemini=1")
+    parser.add_argument('--concurrency', default=None, help="closed-loop client counts, e.g. 1,8,32")
+    parser.add_argument('--rate', default='', help="open-loop arrival rates per second, e.g. 50,200")
+    parser.add_argument('--arrivals', choices=('uniform', 'poisson'), default='poisson',
+                        help="spacing of open-loop arrivals")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument('--requests', type=int, default=0, help="stop closed-loop scenarios after this many")
+    parser.add_argument('--warmup', type=float, default=1.0, help="seconds of untimed load first")
+    parser.add_argument('--keyspace', type=int, default=1000, help="distinct {n} values in commands")
+    parser.add_argument('--seed', type=int, default=1, help="seed of the command sequence")
+    parser.add_argument('--timeout', type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument('--gemini-delay', type=float, default=0.2, help="stub Gemini latency in seconds")
+    parser.add_argument('--search-delay', type=float, default=0.1, help="stub search latency in seconds")
+    parser.add_argument('--sample-interval', type=float, default=0.5, help="seconds between memory samples")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--compare', help="baseline JSON report to compare against")
+    parser.add_argument('--threshold', type=float, default=10.0, help="regression threshold in percent")
+    args = parser.parse_args()
+    if args.concurrency is None:
+        args.concurrency = '' if args.rate else '1,8,32'
+
+    StubUpstream.gemini_delay = args.gemini_delay
+    StubUpstream.search_delay = args.search_delay
+    upstream = StubServer(('127.0.0.1', 0), StubUpstream)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    upstream_base = f'http://127.0.0.1:{upstream.server_address[1]}'
+
+    with start_target(args, upstream_base) as base_url:
+        results = asyncio.run(drive(base_url, args))
+    upstream.shutdown()
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'target': 'url' if args.url else args.target,
+            'mode': None if args.url else args.mode,
+            'mix': args.mix,
+            'arrivals': args.arrivals,
+            'duration_s': args.duration,
+            'requests_per_scenario': args.requests or None,
+            'keyspace': args.keyspace,
+            'seed': args.seed,
+            'stub_delays_s': None if args.url else {'gemini': args.gemini_delay, 'search': args.search_delay},
+        },
+        'scenarios': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    failed = any(scenario['requests'] == 0 or scenario['errors'] for scenario in results) if args.url else False
+    if args.compare:
+        with open(args.compare) as f:
+            failed = compare(json.load(f), report, args.threshold) or failed
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -21,6 +21,10 @@ if not exist "portable\dist" mkdir portable\dist
 echo Copying files...
 xcopy /E /Y dist portable\dist\
 copy standalone_server.py portable\
+if not exist "portable\kael_api" mkdir portable\kael_api
+xcopy /E /Y kael_api portable\kael_api\
+if not exist "portable\data" mkdir portable\data
+xcopy /E /Y data portable\data\
 copy DEPLOYMENT.md portable\README.md
 
 echo Creating launcher...
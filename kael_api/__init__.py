@@ -0,0 +1,6 @@
+"""
+Shared building blocks for the KAEL API servers.
+
+Both server.py and standalone_server.py import from this package so that
+command routing and the other request-path helpers live in one place.
+"""
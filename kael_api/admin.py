@@ -0,0 +1,29 @@
+"""
+Access control for the /api/admin routes.
+
+Admin routes change how the server runs, so they are only served to
+loopback clients, or, when KAEL_ADMIN_TOKEN is set, to clients sending
+that token in an X-Admin-Token header.
+"""
+import hmac
+import os
+
+ADMIN_TOKEN = os.getenv('KAEL_ADMIN_TOKEN', '')
+
+LOOPBACK_ADDRESSES = {'127.0.0.1', '::1', '::ffff:127.0.0.1'}
+
+
+def admin_allowed(remote_addr, token):
+    """
+    Whether a client may use the admin routes.
+
+    Args:
+        remote_addr (str): Client address
+        token (str): Value of the X-Admin-Token header, if any
+
+    Returns:
+        bool: True if the client may proceed
+    """
+    if ADMIN_TOKEN:
+        return hmac.compare_digest((token or '').encode(), ADMIN_TOKEN.encode())
+    return remote_addr in LOOPBACK_ADDRESSES
@@ -0,0 +1,350 @@
+"""
+Admission control for the expensive API routes.
+
+Two checks run before a command, search or Gemini request is handled:
+
+- A token bucket per client address and route. A client may send `burst`
+  requests at once and `rate` per second after that; past the limit it
+  gets 429 Too Many Requests with a Retry-After header saying when a
+  token will be back.
+- A cap on how many of these requests are handled at once across all
+  clients. Requests over the cap wait in a bounded queue for up to
+  queue_timeout seconds; when the queue is full or the wait runs out the
+  request gets 503 Service Unavailable with a Retry-After estimate,
+  instead of tying up another thread or upstream connection.
+
+Both keep their state in memory with constant work per request. Buckets
+for the least recently seen clients are dropped past max_clients.
+Settings come from the environment:
+
+    KAEL_RATE_LIMITS      'METHOD /path=rate/burst' pairs, comma separated, or 'off'
+    KAEL_RATE_CLIENTS     client buckets kept (default 10000)
+    KAEL_MAX_CONCURRENT   requests handled at once, 0 for no cap (default 16)
+    KAEL_QUEUE_SIZE       requests waiting for a slot before shedding (default 32)
+    KAEL_QUEUE_TIMEOUT    seconds a request may wait for a slot (default 5)
+"""
+import asyncio
+import collections
+import math
+import os
+import threading
+import time
+
+DEFAULT_LIMITS = {
+    'POST /api/command': (5.0, 20),
+    'POST /api/command/batch': (1.0, 5),
+    'POST /api/gemini': (2.0, 10),
+    'GET /api/search': (5.0, 20),
+}
+
+
+def parse_limits(spec):
+    """
+    Route limits from a KAEL_RATE_LIMITS value.
+
+    Returns:
+        dict: 'METHOD /path' -> (rate, burst); empty for 'off'
+
+    Raises:
+        ValueError: If an entry is not 'METHOD /path=rate/burst'
+    """
+    if spec.strip().lower() in ('off', 'false', 'none', '0'):
+        return {}
+    limits = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        route, _, value = item.partition('=')
+        rate, _, burst = value.partition('/')
+        if not route.strip() or not rate:
+            raise ValueError(f"Bad rate limit {item.strip()!r}, expected 'METHOD /path=rate/burst'")
+        rate = float(rate)
+        limits[' '.join(route.split())] = (rate, int(burst) if burst else max(1, math.ceil(rate)))
+    return limits
+
+
+class RateLimiter:
+    """
+    Token buckets per (client, route).
+
+    Args:
+        limits (dict): 'METHOD /path' -> (requests per second, burst)
+        max_clients (int): Buckets kept; the least recently used go first
+    """
+
+    def __init__(self, limits, max_clients=10000):
+        self.limits = dict(limits)
+        self.max_clients = max_clients
+        self.allowed = collections.Counter()
+        self.limited = collections.Counter()
+        self.evicted = 0
+        self._buckets = collections.OrderedDict()  # (client, route) -> [tokens, updated]
+        self._lock = threading.Lock()
+
+    def check(self, client, route):
+        """
+        Take a token for a request.
+
+        Returns:
+            float: 0 if the request may go ahead, else seconds until it could
+        """
+        limit = self.limits.get(route)
+        if limit is None:
+            return 0.0
+        rate, burst = limit
+        key = (client, route)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(burst), now]
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                self.allowed[route] += 1
+                return 0.0
+            self.limited[route] += 1
+            return (1 - bucket[0]) / rate if rate > 0 else 60.0
+
+    def stats(self):
+        return {
+            'clients': len(self._buckets),
+            'evicted': self.evicted,
+            'routes': {route: {'rate': rate, 'burst': burst,
+                               'allowed': self.allowed[route], 'limited': self.limited[route]}
+                       for route, (rate, burst) in self.limits.items()},
+        }
+
+
+class _Slots:
+    """Counters shared by the thread and asyncio concurrency limiters."""
+
+    def __init__(self, max_active, max_queue, timeout):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self.admitted = 0
+        self.queued = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self.hold_seconds = 0.5  # moving average of how long a slot is held
+
+    def retry_after(self):
+        """Estimated seconds until a slot is free for a new request."""
+        if not self.max_active:
+            return 1.0
+        return max(1.0, self.hold_seconds * (self.waiting + 1) / self.max_active)
+
+    def _released(self, held):
+        self.hold_seconds += 0.1 * (held - self.hold_seconds)
+
+    def stats(self):
+        return {
+            'max_concurrent': self.max_active,
+            'active': self.active,
+            'waiting': self.waiting,
+            'admitted': self.admitted,
+            'queued': self.queued,
+            'shed_queue_full': self.shed_queue_full,
+            'shed_timeout': self.shed_timeout,
+        }
+
+
+class ConcurrencyLimiter(_Slots):
+    """
+    At most max_active holders across threads, with a bounded wait.
+
+    Args:
+        max_active (int): Slots, 0 for no cap
+        max_queue (int): Callers that may wait for a slot
+        timeout (float): Seconds a caller waits before giving up
+    """
+
+    def __init__(self, max_active=16, max_queue=32, timeout=5.0):
+        super().__init__(max_active, max_queue, timeout)
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Take a slot, waiting if need be; False if the request should be shed."""
+        if not self.max_active:
+            return True
+        with self._cond:
+            if self.active < self.max_active and not self.waiting:
+                self.active += 1
+                self.admitted += 1
+                return True
+            if self.waiting >= self.max_queue:
+                self.shed_queue_full += 1
+                return False
+            self.waiting += 1
+            self.queued += 1
+            deadline = time.monotonic() + self.timeout
+            try:
+                while self.active >= self.max_active:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed_timeout += 1
+                        return False
+                    self._cond.wait(remaining)
+                self.active += 1
+                self.admitted += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self, held):
+        """Give back a slot held for `held` seconds."""
+        if not self.max_active:
+            return
+        with self._cond:
+            self.active -= 1
+            self._released(held)
+            self._cond.notify()
+
+
+class AsyncConcurrencyLimiter(_Slots):
+    """ConcurrencyLimiter for coroutines on one event loop; waiters are served in order."""
+
+    def __init__(self, max_active=16, max_queue=32, timeout=5.0):
+        super().__init__(max_active, max_queue, timeout)
+        self._waiters = collections.deque()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    async def acquire(self):
+        if not self.max_active:
+            return True
+        if self.active < self.max_active and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.shed_queue_full += 1
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            # release() hands its slot straight to the waiter
+            await asyncio.wait_for(asyncio.shield(waiter), self.timeout)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # Granted just as the wait ran out; keep it
+                self.admitted += 1
+                return True
+            waiter.cancel()
+            self._waiters.remove(waiter)
+            self.shed_timeout += 1
+            return False
+        except asyncio.CancelledError:
+            if waiter.done():
+                self._hand_on()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            raise
+        self.admitted += 1
+        return True
+
+    def release(self, held):
+        if not self.max_active:
+            return
+        self._released(held)
+        self._hand_on()
+
+    def _hand_on(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionControl:
+    """
+    Rate limits and the concurrency cap for a server's expensive routes.
+
+    Args:
+        limits (dict): 'METHOD /path' -> (rate, burst) for the rate limiter
+        max_concurrent (int): Controlled requests handled at once, 0 for no cap
+        queue_size (int): Requests that may wait for a slot
+        queue_timeout (float): Seconds a request may wait
+        max_clients (int): Client buckets kept by the rate limiter
+    """
+
+    def __init__(self, limits=None, max_concurrent=16, queue_size=32, queue_timeout=5.0, max_clients=10000):
+        limits = DEFAULT_LIMITS if limits is None else limits
+        self.rate = RateLimiter(limits, max_clients)
+        # The concurrency cap covers the expensive routes even with rate limits off
+        self.routes = frozenset(DEFAULT_LIMITS) | frozenset(limits)
+        self.slots = ConcurrencyLimiter(max_concurrent, queue_size, queue_timeout)
+        self.async_slots = AsyncConcurrencyLimiter(max_concurrent, queue_size, queue_timeout)
+
+    @classmethod
+    def from_env(cls):
+        """Build admission control from the KAEL_RATE_* and KAEL_*QUEUE* environment variables."""
+        spec = os.getenv('KAEL_RATE_LIMITS')
+        return cls(
+            limits=parse_limits(spec) if spec is not None else None,
+            max_concurrent=int(os.getenv('KAEL_MAX_CONCURRENT', '16')),
+            queue_size=int(os.getenv('KAEL_QUEUE_SIZE', '32')),
+            queue_timeout=float(os.getenv('KAEL_QUEUE_TIMEOUT', '5')),
+            max_clients=int(os.getenv('KAEL_RATE_CLIENTS', '10000')),
+        )
+
+    def stats(self):
+        """Counters for /api/status."""
+        slots = self.slots.stats()
+        async_slots = self.async_slots.stats()
+        for key in ('active', 'waiting', 'admitted', 'queued', 'shed_queue_full', 'shed_timeout'):
+            slots[key] += async_slots[key]
+        return {'rate_limits': self.rate.stats(), 'concurrency': slots}
+
+
+def refusal(status, retry_after):
+    """Body and Retry-After header value for a 429 or 503."""
+    seconds = max(1, math.ceil(retry_after))
+    message = 'Too many requests' if status == 429 else 'Server busy'
+    return {'error': f'{message}, retry in {seconds}s', 'retry_after': seconds}, str(seconds)
+
+
+def install_admission(app, admission):
+    """Apply admission control to a Flask app's controlled routes."""
+    from flask import g, jsonify, request
+
+    @app.before_request
+    def _admit():
+        route = f"{request.method} {request.url_rule.rule}" if request.url_rule else None
+        if route not in admission.routes:
+            return None
+        retry_after = admission.rate.check(request.remote_addr or '-', route)
+        if retry_after:
+            return _refuse(429, retry_after)
+        if not admission.slots.acquire():
+            return _refuse(503, admission.slots.retry_after())
+        g.kael_admitted = time.perf_counter()
+        return None
+
+    def _refuse(status, retry_after):
+        body, header = refusal(status, retry_after)
+        response = jsonify(body)
+        response.status_code = status
+        response.headers['Retry-After'] = header
+        return response
+
+    @app.teardown_request
+    def _release(exc):
+        admitted = g.pop('kael_admitted', None)
+        if admitted is not None:
+            admission.slots.release(time.perf_counter() - admitted)
@@ -0,0 +1,555 @@
+"""
+Asyncio (ASGI) serving mode for the KAEL API.
+
+create_asgi_app() wraps a server module (server.py or standalone_server.py)
+in a small ASGI application exposing the same /api routes as its Flask app.
+Command routing, caches and response shapes are the server module's own;
+only the transport changes: upstream exchanges are driven by an
+AsyncHttpClient on the event loop, so one process can hold hundreds of
+slow Gemini calls in flight without a thread per request.
+
+It also serves the WebSocket command channel (kael_api.channel) at
+/api/ws.
+
+Start it with `python server.py --async` (needs uvicorn and aiohttp).
+"""
+import asyncio
+import datetime
+import json
+import logging
+import mimetypes
+import os
+import time
+from urllib.parse import parse_qs
+
+from kael_api.admin import admin_allowed
+from kael_api.admission import refusal
+from kael_api.batch import BatchError, batch_payload, parse_batch, run_batch_async
+from kael_api.channel import (CHANNEL, COMMAND_ROUTE, IDLE_TIMEOUT, MAX_PENDING, PATH as CHANNEL_PATH,
+                              STATUS_INTERVAL, ChannelError, encode, hello_message, parse_message, refused)
+from kael_api.http_client import AsyncHttpClient
+from kael_api.logs import current_request_id, new_request_id, reset_request_id
+from kael_api.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, IN_FLIGHT, REGISTRY, observe_request
+from kael_api.profiling import NULL_SPAN, PROFILER, span
+from kael_api.sessions import session_id
+from kael_api.singleflight import AsyncSingleFlight
+from kael_api.streaming import STREAM_HEADERS, STREAM_MIMETYPES, aiter_text, astream_events, stream_format
+from kael_api.upstream import run_async
+
+logger = logging.getLogger(__name__)
+
+CORS_HEADERS = [
+    (b'access-control-allow-origin', b'*'),
+    (b'access-control-allow-headers', b'Content-Type'),
+    (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+]
+
+
+class Request:
+    """The parts of an ASGI HTTP request the API handlers need."""
+
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.remote_addr = (scope.get('client') or ('',))[0]
+        self.args = {key: values[0] for key, values in
+                     parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+        self.headers = {key.decode('latin-1').lower(): value.decode('latin-1')
+                        for key, value in scope.get('headers', [])}
+        self.body = body
+
+    @property
+    def json(self):
+        """Parsed JSON body, or None if it is missing or malformed."""
+        if not self.body:
+            return None
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return None
+
+
+class StreamingBody:
+    """Handler result sent as a streaming response instead of JSON."""
+
+    def __init__(self, events, fmt):
+        self.events = events
+        self.fmt = fmt
+
+
+class TextBody:
+    """Handler result sent as plain text instead of JSON."""
+
+    def __init__(self, text, content_type):
+        self.text = text
+        self.content_type = content_type
+
+
+async def _single(text):
+    yield text
+
+
+class KaelAsgiApp:
+    """
+    ASGI application serving the KAEL API routes of a server module.
+
+    Args:
+        server: The imported server module providing command_exchange,
+            search_exchange, gemini_exchange, weather_exchange, news_payload, speak
+            and status_payload, plus command_stream, gemini_stream and
+            command_done for streaming responses and the BATCH_MAX_COMMANDS
+            and BATCH_MAX_PARALLEL limits
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.client = None
+        self.flight = AsyncSingleFlight()
+        self.routes = {
+            ('POST', '/api/command'): self.command,
+            ('POST', '/api/command/batch'): self.command_batch,
+            ('GET', '/api/status'): self.status,
+            ('GET', '/api/test'): self.test,
+            ('GET', '/api/health'): self.health,
+            ('GET', '/api/search'): self.search,
+            ('GET', '/api/weather'): self.weather,
+            ('GET', '/api/news'): self.news,
+            ('POST', '/api/gemini'): self.gemini,
+            ('GET', '/api/metrics'): self.metrics,
+            ('GET', '/api/admin/profile'): self.admin_profile,
+            ('POST', '/api/admin/profile'): self.admin_profile,
+        }
+        REGISTRY.register_collector(self._collect_metrics)
+        static_folder = getattr(getattr(server, 'app', None), 'static_folder', None)
+        self.static_folder = static_folder if static_folder and os.path.isdir(static_folder) else None
+        # Servers that index their static files up front (kael_api.assets)
+        self.assets = getattr(server, 'asset_manifest', None)
+        # Rate limits and concurrency cap (kael_api.admission), shared with the Flask app
+        self.admission = getattr(server, 'admission', None)
+        # Gemini prompt cache lookups must not query SQLite on the event loop
+        prompt_cache = getattr(server, 'prompt_cache', None)
+        if prompt_cache is not None:
+            prompt_cache.load()
+
+    def _client(self):
+        # Created on first use when the server does not send lifespan events
+        if self.client is None:
+            self.client = AsyncHttpClient.from_env()
+        return self.client
+
+    async def _run(self, exchange):
+        # Identical upstream calls in flight at once are made only once
+        return await run_async(exchange, self._client(), self.flight)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] == 'websocket':
+            await self._channel(scope, receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        method = scope['method']
+        if method == 'OPTIONS':
+            await self._send(send, 204, b'', [])
+            return
+
+        handler = self.routes.get((method, scope['path']))
+        static = handler is None and method == 'GET' and self.static_folder \
+            and not scope['path'].startswith('/api/')
+        route = scope['path'] if handler is not None else 'static' if static else 'unmatched'
+        started = time.perf_counter()
+        status = 500
+        admitted = None
+        IN_FLIGHT.labels(route).inc()
+        incoming_id = dict(scope.get('headers', [])).get(b'x-request-id', b'').decode('latin-1')
+        _, request_id_token = new_request_id(incoming_id)
+        try:
+            if handler is None:
+                if static:
+                    status = await self._serve_static(send, scope['path'], scope.get('headers', []))
+                else:
+                    status = 404
+                    await self._send_json(send, 404, {'error': 'Not found'})
+                return
+
+            request = Request(scope, await self._read_body(receive))
+            if self.admission is not None and f"{method} {scope['path']}" in self.admission.routes:
+                refused = await self._admit(send, request)
+                if refused:
+                    status = refused
+                    return
+                admitted = time.perf_counter()
+            # Sampled profiling covers commands, as process_command does under Flask
+            with PROFILER.request('process_command') if handler == self.command else NULL_SPAN:
+                try:
+                    payload, status = await handler(request)
+                except Exception as e:
+                    logger.error("Error handling %s %s: %s", method, scope['path'], e, exc_info=True)
+                    payload, status = {'error': f'Server error: {str(e)}'}, 500
+                if isinstance(payload, StreamingBody):
+                    await self._send_stream(send, status, payload)
+                elif isinstance(payload, TextBody):
+                    await self._send(send, status, payload.text.encode('utf-8'),
+                                     [(b'content-type', payload.content_type.encode())])
+                else:
+                    await self._send_json(send, status, payload)
+        finally:
+            if admitted is not None:
+                self.admission.async_slots.release(time.perf_counter() - admitted)
+            reset_request_id(request_id_token)
+            IN_FLIGHT.labels(route).dec()
+            observe_request(route, method, status, time.perf_counter() - started)
+
+    async def _admit(self, send, request):
+        """Take a rate limit token and a concurrency slot; the refusal status if either is denied."""
+        route = f"{request.method} {request.path}"
+        retry_after = self.admission.rate.check(request.remote_addr or '-', route)
+        status = 429 if retry_after else 0
+        if not status and not await self.admission.async_slots.acquire():
+            status, retry_after = 503, self.admission.async_slots.retry_after()
+        if status:
+            payload, header = refusal(status, retry_after)
+            await self._send_json(send, status, payload, [(b'retry-after', header.encode())])
+        return status
+
+    async def _channel(self, scope, receive, send):
+        """One connection of the WebSocket command channel, see kael_api.channel."""
+        if (await receive())['type'] != 'websocket.connect':
+            return
+        if scope['path'] != CHANNEL_PATH:
+            await send({'type': 'websocket.close', 'code': 1008})
+            return
+        await send({'type': 'websocket.accept'})
+        client = (scope.get('client') or ('',))[0]
+        lock = asyncio.Lock()
+        pending = set()
+        closed = False
+
+        async def send_text(text):
+            nonlocal closed
+            if closed:
+                return
+            async with lock:
+                try:
+                    await send({'type': 'websocket.send', 'text': text})
+                except Exception:
+                    # The client has gone; the receive loop will notice too
+                    closed = True
+
+        CHANNEL.connected()
+        await send_text(hello_message())
+        pusher = asyncio.ensure_future(self._push_status(send_text))
+        try:
+            while not closed:
+                try:
+                    event = await asyncio.wait_for(receive(), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    logger.info("Closing idle WebSocket channel from %s", client)
+                    await send({'type': 'websocket.close', 'code': 1001})
+                    break
+                if event['type'] == 'websocket.disconnect':
+                    break
+                text = event.get('text')
+                if text is None:
+                    text = (event.get('bytes') or b'').decode('utf-8', errors='replace')
+                try:
+                    message = parse_message(text)
+                except ChannelError as e:
+                    CHANNEL.errors += 1
+                    await send_text(encode('error', status=400, error=str(e)))
+                    continue
+                if message['type'] == 'ping':
+                    await send_text(encode('pong', ts=message.get('ts')))
+                elif len(pending) >= MAX_PENDING:
+                    await send_text(encode('error', id=message.get('id'), status=429,
+                                           error=f'At most {MAX_PENDING} commands may be in flight on one connection'))
+                else:
+                    task = asyncio.ensure_future(self._channel_command(send_text, message, client))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+        finally:
+            closed = True
+            pusher.cancel()
+            for task in pending:
+                task.cancel()
+            CHANNEL.disconnected()
+
+    async def _push_status(self, send_text):
+        while True:
+            payload, _ = await self.status(None)
+            await send_text(encode('status', **payload))
+            await asyncio.sleep(STATUS_INTERVAL)
+
+    async def _channel_command(self, send_text, message, client):
+        """Answer one command message, as kael_api.channel.run_command does for flask-sock."""
+        CHANNEL.commands += 1
+        started = time.perf_counter()
+        command_id = message.get('id')
+        command = message['command'].lower()
+        session = session_id(message, {})
+        admitted = None
+        status = 500
+        _, request_id_token = new_request_id()
+        try:
+            if self.admission is not None:
+                retry_after = self.admission.rate.check(client or '-', COMMAND_ROUTE)
+                if retry_after:
+                    status = 429
+                    await send_text(refused(command_id, status, retry_after))
+                    return
+                if not await self.admission.async_slots.acquire():
+                    status = 503
+                    await send_text(refused(command_id, status, self.admission.async_slots.retry_after()))
+                    return
+                admitted = time.perf_counter()
+            logger.info("Processing command: %s", command)
+            stream = self.server.command_stream(command, session)
+            if stream:
+                chunks = aiter_text(stream, self._client())
+            else:
+                chunks = _single(await self._run(self.server.command_exchange(command, session)))
+            async for event in astream_events(chunks, 'ndjson', lambda text: self.server.command_done(command, text),
+                                              started, {'id': command_id}):
+                await send_text(event.decode('utf-8').rstrip('\n'))
+            status = 200
+        except Exception as e:
+            logger.error("Error processing WebSocket command: %s", e, exc_info=True)
+            await send_text(encode('error', id=command_id, status=500, error=f'Server error: {str(e)}'))
+        finally:
+            if admitted is not None:
+                self.admission.async_slots.release(time.perf_counter() - admitted)
+            reset_request_id(request_id_token)
+            observe_request('/api/command', 'WS', status, time.perf_counter() - started)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._client()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.client is not None:
+                    await self.client.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    def _common_headers(self):
+        request_id = current_request_id()
+        return CORS_HEADERS + [(b'x-request-id', request_id.encode())] if request_id else CORS_HEADERS
+
+    async def _send(self, send, status, body, headers):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': headers + self._common_headers() + [(b'content-length', str(len(body)).encode())]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _send_json(self, send, status, payload, headers=()):
+        with span('json_encode'):
+            body = json.dumps(payload).encode('utf-8')
+        await self._send(send, status, body, [(b'content-type', b'application/json'), *headers])
+
+    async def _send_stream(self, send, status, body):
+        headers = [(b'content-type', STREAM_MIMETYPES[body.fmt].encode())]
+        headers += [(key.lower().encode(), value.encode()) for key, value in STREAM_HEADERS.items()]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers + self._common_headers()})
+        try:
+            async for event in body.events:
+                await send({'type': 'http.response.body', 'body': event, 'more_body': True})
+        except Exception as e:
+            logger.error("Error while streaming response: %s", e, exc_info=True)
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def _serve_static(self, send, path, headers):
+        if self.assets is not None:
+            return await self._serve_asset(send, path, dict(headers))
+        root = os.path.realpath(self.static_folder)
+        target = os.path.realpath(os.path.join(root, path.lstrip('/')))
+        if not target.startswith(root + os.sep) or not os.path.isfile(target):
+            target = os.path.join(root, 'index.html')
+        try:
+            body = await asyncio.to_thread(_read_file, target)
+        except OSError:
+            await self._send_json(send, 404, {'error': 'Not found'})
+            return 404
+        content_type = mimetypes.guess_type(target)[0] or 'application/octet-stream'
+        await self._send(send, 200, body, [(b'content-type', content_type.encode())])
+        return 200
+
+    async def _serve_asset(self, send, path, headers):
+        asset = self.assets.get(path) or self.assets.get('index.html')
+        if asset is None:
+            await self._send_json(send, 404, {'error': 'Not found'})
+            return 404
+        status, body, asset_headers = asset.select(headers.get(b'accept-encoding', b'').decode('latin-1'),
+                                                   headers.get(b'if-none-match', b'').decode('latin-1'))
+        response_headers = [(key.lower().encode(), value.encode()) for key, value in asset_headers.items()]
+        if status == 304:
+            await send({'type': 'http.response.start', 'status': 304,
+                        'headers': response_headers + self._common_headers()})
+            await send({'type': 'http.response.body', 'body': b''})
+            return 304
+        if body is None:
+            body = await asyncio.to_thread(_read_file, asset.filename)
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': response_headers + self._common_headers()})
+        await send({'type': 'http.response.body', 'body': body})
+        return status
+
+    # API routes, mirroring the Flask handlers in the server module
+
+    async def command(self, request):
+        started = time.perf_counter()
+        with span('parse_json'):
+            data = request.json
+        if not data:
+            logger.warning("No JSON data in request")
+            return {'error': 'No JSON data provided'}, 400
+
+        command = data.get('command', '').lower()
+        if not command:
+            logger.warning("Empty command received")
+            return {'error': 'No command provided'}, 400
+
+        with span('logging'):
+            logger.info("Processing command: %s", command)
+        session = session_id(data, request.headers)
+        fmt = stream_format(data, request.headers.get('accept', ''))
+        if fmt:
+            # Only Gemini answers arrive in pieces; anything else is one chunk
+            stream = self.server.command_stream(command, session)
+            if stream:
+                chunks = aiter_text(stream, self._client())
+            else:
+                chunks = _single(await self._run(self.server.command_exchange(command, session)))
+            events = astream_events(chunks, fmt, lambda text: self.server.command_done(command, text), started)
+            return StreamingBody(events, fmt), 200
+
+        with span('execute_command'):
+            response = await self._run(self.server.command_exchange(command, session))
+            with span('tts'):
+                response = self.server.speak(response)
+        return {
+            'command': command,
+            'response': response,
+            'timestamp': datetime.datetime.now().isoformat()
+        }, 200
+
+    async def command_batch(self, request):
+        started = time.perf_counter()
+        try:
+            commands, parallelism = parse_batch(request.json, self.server.BATCH_MAX_COMMANDS,
+                                                self.server.BATCH_MAX_PARALLEL)
+        except BatchError as e:
+            logger.warning("Rejected batch request: %s", e)
+            return {'error': str(e)}, 400
+
+        logger.info("Processing batch of %s commands, %s at a time", len(commands), parallelism)
+
+        async def execute(command):
+            return await self._run(self.server.command_exchange(command))
+
+        results = await run_batch_async(commands, execute, parallelism)
+        return batch_payload(results, started), 200
+
+    async def status(self, request):
+        payload = self.server.status_payload()
+        payload['async_upstream'] = self._client().stats()
+        payload['async_coalescing'] = self.flight.stats()
+        return payload, 200
+
+    async def metrics(self, request):
+        return TextBody(REGISTRY.render(), METRICS_CONTENT_TYPE), 200
+
+    def _collect_metrics(self):
+        if self.client is None:
+            return
+        stats = self.client.stats()
+        yield 'kael_async_upstream_in_flight', 'gauge', 'Async upstream requests in flight', {}, stats['in_flight']
+        yield 'kael_async_upstream_idle_connections', 'gauge', 'Idle pooled async connections', \
+            {}, stats['idle_connections']
+        stats = self.flight.stats()
+        yield 'kael_async_upstream_coalesced_total', 'counter', \
+            'Async calls that shared an identical in-flight call', {}, stats['coalesced_waiters']
+
+    async def admin_profile(self, request):
+        if not admin_allowed(request.remote_addr, request.headers.get('x-admin-token')):
+            return {'error': 'Forbidden'}, 403
+        if request.method == 'GET':
+            return PROFILER.state(), 200
+        try:
+            return PROFILER.apply(request.json), 200
+        except ValueError as e:
+            return {'error': str(e)}, 400
+
+    async def test(self, request):
+        return {'status': 'ok', 'message': 'KAEL API is working'}, 200
+
+    async def health(self, request):
+        return self.server.health.payload(), 200
+
+    async def search(self, request):
+        query = request.args.get('q', '')
+        if not query:
+            return {'error': 'No search query provided'}, 400
+        result = await self._run(self.server.search_exchange(query))
+        return {'query': query, 'result': result, 'timestamp': datetime.datetime.now().isoformat()}, 200
+
+    async def weather(self, request):
+        location = request.args.get('location', '')
+        result = await self._run(self.server.weather_exchange(location))
+        return {'location': location, 'result': result, 'timestamp': datetime.datetime.now().isoformat()}, 200
+
+    async def news(self, request):
+        return self.server.news_payload(request.args.get('topic', '')), 200
+
+    async def gemini(self, request):
+        started = time.perf_counter()
+        if not self.server.GEMINI_ENABLED:
+            return {'error': 'Gemini API is not enabled'}, 400
+
+        data = request.json or {}
+        prompt = data.get('prompt', '')
+        temperature = data.get('temperature', 0.7)
+        fresh = bool(data.get('fresh', False))
+        if not prompt:
+            return {'error': 'No prompt provided'}, 400
+
+        fmt = stream_format(data, request.headers.get('accept', ''))
+        if fmt:
+            chunks = aiter_text(self.server.gemini_stream(prompt, temperature, fresh), self._client())
+            events = astream_events(chunks, fmt, lambda text: {
+                'prompt': prompt, 'result': text, 'timestamp': datetime.datetime.now().isoformat()
+            }, started)
+            return StreamingBody(events, fmt), 200
+
+        result = await self._run(self.server.gemini_exchange(prompt, temperature, fresh))
+        return {'prompt': prompt, 'result': result, 'timestamp': datetime.datetime.now().isoformat()}, 200
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def create_asgi_app(server):
+    """Build the ASGI application for a server module."""
+    return KaelAsgiApp(server)
+
+
+def serve_asgi(server, host='0.0.0.0', port=5000, log_level='info'):
+    """Run the ASGI application for a server module under uvicorn."""
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("The async serving mode needs uvicorn and aiohttp: pip install uvicorn aiohttp")
+    uvicorn.run(create_asgi_app(server), host=host, port=port, log_level=log_level)
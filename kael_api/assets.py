@@ -0,0 +1,228 @@
+"""
+In-memory manifest of the built dashboard for static file serving.
+
+AssetManifest indexes a directory (the Vite dist/ bundle) once, at
+startup. For every file it records the size, a content hash used as the
+ETag, the MIME type and, for compressible types, gzip and (when the
+optional brotli package is installed) brotli variants compressed ahead of
+time. Requests are then answered from memory without touching the disk:
+
+- If-None-Match matching the ETag gets a 304 with no body
+- Accept-Encoding picks the smallest precompressed variant
+- Files Vite named with a content hash (assets/name-Hash.js) are cached by browsers for a year as immutable; everything else, such
+  as index.html, is revalidated on each load
+
+Files larger than max_file_bytes are not held in memory; they are served
+uncompressed from disk, through the server's sendfile support where it
+has one. The manifest does not notice a rebuild of dist/; restart the
+server after building.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+# Vite writes build output to assets/ named like index-4f3a9c1b.js or
+# index-BxK3_aZ9.css; files copied from public/ keep their own names
+HASHED_NAME = re.compile(r'^assets/.+-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$')
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/xml',
+                      'image/svg+xml', 'application/manifest+json', 'application/wasm')
+
+# Smaller files gain too little from compression to be worth a variant
+MIN_COMPRESS_BYTES = 512
+
+
+class Asset:
+    """One file in the manifest and its precompressed variants."""
+
+    __slots__ = ('path', 'filename', 'size', 'tag', 'content_type', 'cache_control', 'body', 'variants')
+
+    def __init__(self, path, filename, data, content_type, immutable, keep_body):
+        self.path = path
+        self.filename = filename
+        self.size = len(data)
+        self.tag = hashlib.sha256(data).hexdigest()[:20]
+        self.content_type = content_type
+        self.cache_control = IMMUTABLE if immutable else REVALIDATE
+        self.body = data if keep_body else None
+        self.variants = {}  # encoding -> compressed body
+
+    @property
+    def etag(self):
+        return f'"{self.tag}"'
+
+    def compress(self):
+        """Add gzip and brotli variants that are meaningfully smaller."""
+        if self.body is None or self.size < MIN_COMPRESS_BYTES:
+            return
+        if not self.content_type.startswith(COMPRESSIBLE_TYPES):
+            return
+        candidates = {'gzip': gzip.compress(self.body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            candidates['br'] = brotli.compress(self.body, quality=11)
+        for encoding, data in candidates.items():
+            if len(data) < self.size * 0.9:
+                self.variants[encoding] = data
+
+    def matches(self, if_none_match):
+        """Whether an If-None-Match header names this asset's current content."""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        for candidate in if_none_match.split(','):
+            candidate = candidate.strip()
+            if candidate.startswith('W/'):
+                candidate = candidate[2:]
+            candidate = candidate.strip('"')
+            # Variant ETags carry an encoding suffix
+            if candidate == self.tag or candidate.split('-', 1)[0] == self.tag:
+                return True
+        return False
+
+    def select(self, accept_encoding, if_none_match):
+        """
+        Choose the response for a request.
+
+        Args:
+            accept_encoding (str): Accept-Encoding request header
+            if_none_match (str): If-None-Match request header
+
+        Returns:
+            tuple: (status, body, headers); body is the bytes to send, or
+            None for a 304 or an asset that must be read from disk
+        """
+        headers = {'Cache-Control': self.cache_control}
+        if self.variants:
+            headers['Vary'] = 'Accept-Encoding'
+        if self.matches(if_none_match):
+            headers['ETag'] = self.etag
+            return 304, b'', headers
+
+        encoding = self._encoding(accept_encoding)
+        headers['Content-Type'] = self.content_type
+        if encoding:
+            body = self.variants[encoding]
+            headers['Content-Encoding'] = encoding
+            headers['ETag'] = f'"{self.tag}-{encoding}"'
+        else:
+            body = self.body
+            headers['ETag'] = self.etag
+        headers['Content-Length'] = str(len(body) if body is not None else self.size)
+        return 200, body, headers
+
+    def _encoding(self, accept_encoding):
+        if not self.variants or not accept_encoding:
+            return None
+        accepted = set()
+        for item in accept_encoding.lower().split(','):
+            name, _, params = item.strip().partition(';')
+            if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                continue
+            accepted.add(name.strip())
+        usable = [encoding for encoding in self.variants if encoding in accepted or '*' in accepted]
+        if not usable:
+            return None
+        return min(usable, key=lambda encoding: len(self.variants[encoding]))
+
+
+class AssetManifest:
+    """
+    Index of a static directory, built once.
+
+    Args:
+        root (str): Directory to serve, e.g. the Vite dist/ folder
+        max_file_bytes (int): Larger files are served from disk, uncompressed
+    """
+
+    def __init__(self, root, max_file_bytes=8 * 1024 * 1024):
+        self.root = os.path.realpath(root) if root else None
+        self.max_file_bytes = max_file_bytes
+        self.assets = {}
+        self.total_bytes = 0
+        self.compressed_bytes = 0
+        if self.root and os.path.isdir(self.root):
+            self._index()
+
+    def _index(self):
+        for directory, _, filenames in os.walk(self.root):
+            for name in filenames:
+                filename = os.path.join(directory, name)
+                path = os.path.relpath(filename, self.root).replace(os.sep, '/')
+                try:
+                    size = os.path.getsize(filename)
+                    keep = size <= self.max_file_bytes
+                    if keep:
+                        with open(filename, 'rb') as f:
+                            data = f.read()
+                    else:
+                        data = _hash_source(filename)
+                except OSError as e:
+                    logger.warning("Skipping static file %s: %s", path, e)
+                    continue
+                content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                if content_type.startswith('text/') or content_type == 'application/javascript':
+                    content_type += '; charset=utf-8'
+                asset = Asset(path, filename, data, content_type, HASHED_NAME.match(path) is not None, keep)
+                if not keep:
+                    asset.size = size
+                asset.compress()
+                self.assets[path] = asset
+                self.total_bytes += asset.size if keep else 0
+                self.compressed_bytes += sum(len(data) for data in asset.variants.values())
+        logger.info("Indexed %s static files from %s (%s bytes, %s bytes precompressed)",
+                    len(self.assets), self.root, self.total_bytes, self.compressed_bytes)
+
+    def get(self, path):
+        """The asset at a URL path relative to the root, or None."""
+        return self.assets.get(path.lstrip('/'))
+
+    def __len__(self):
+        return len(self.assets)
+
+    def stats(self):
+        """Counters for /api/status."""
+        return {
+            'files': len(self.assets),
+            'memory_bytes': self.total_bytes + self.compressed_bytes,
+            'precompressed_files': sum(1 for asset in self.assets.values() if asset.variants),
+            'brotli': brotli is not None,
+        }
+
+
+def _hash_source(filename):
+    """Content of a large file for hashing only, read in blocks."""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.digest()
+
+
+def flask_response(asset, request):
+    """Flask response for an asset, honouring conditional and encoding headers."""
+    from flask import Response
+    from werkzeug.wsgi import wrap_file
+
+    status, body, headers = asset.select(request.headers.get('Accept-Encoding', ''),
+                                         request.headers.get('If-None-Match', ''))
+    if status == 304:
+        return Response(status=304, headers=headers)
+    if body is None:
+        # Too large to hold in memory: let the server sendfile it
+        return Response(wrap_file(request.environ, open(asset.filename, 'rb')), status=200,
+                        headers=headers, direct_passthrough=True)
+    return Response(body, status=200, headers=headers)
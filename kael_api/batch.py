@@ -0,0 +1,142 @@
+"""
+Batched command execution for POST /api/command/batch.
+
+A batch is a list of commands routed through the same intent logic as
+/api/command. Each command's upstream calls (search_web, ask_gemini) run
+concurrently, at most max_parallel at a time: on a shared thread pool in
+the threaded mode, or as tasks on the event loop in the async mode.
+Results come back in input order, each with its own timing and either a
+response or an error, so one failing command does not fail the batch.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+logger = logging.getLogger(__name__)
+
+
+class BatchError(ValueError):
+    """The batch request itself is malformed."""
+
+
+def parse_batch(data, max_commands, max_parallel):
+    """
+    Validate a batch request body.
+
+    Args:
+        data (dict): Parsed JSON body with 'commands' and optional 'max_parallel'
+        max_commands (int): Largest batch accepted
+        max_parallel (int): Server-side cap on concurrency per batch
+
+    Returns:
+        tuple: (commands, parallelism)
+
+    Raises:
+        BatchError: If the body is not a usable batch
+    """
+    if not data:
+        raise BatchError('No JSON data provided')
+    commands = data.get('commands')
+    if not isinstance(commands, list) or not commands:
+        raise BatchError('No commands provided')
+    if len(commands) > max_commands:
+        raise BatchError(f'Too many commands: {len(commands)} (limit {max_commands})')
+
+    requested = data.get('max_parallel', max_parallel)
+    if isinstance(requested, bool) or not isinstance(requested, int) or requested < 1:
+        raise BatchError('max_parallel must be a positive integer')
+    return commands, min(requested, max_parallel)
+
+
+def _normalize(command):
+    if not isinstance(command, str) or not command.strip():
+        raise BatchError('No command provided')
+    return command.lower()
+
+
+def _result(index, command, started, response=None, error=None):
+    result = {
+        'index': index,
+        'command': command,
+        'status': 'error' if error is not None else 'ok',
+        'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
+    if error is not None:
+        result['error'] = error
+    else:
+        result['response'] = response
+    return result
+
+
+def _run_one(index, command, execute):
+    started = time.perf_counter()
+    try:
+        command = _normalize(command)
+        return _result(index, command, started, response=execute(command))
+    except BatchError as e:
+        return _result(index, command, started, error=str(e))
+    except Exception as e:
+        logger.error("Error in batch command %s: %s", index, e, exc_info=True)
+        return _result(index, command, started, error=f'Server error: {str(e)}')
+
+
+def run_batch(commands, execute, executor, max_parallel):
+    """
+    Run commands on a thread pool with at most max_parallel in flight.
+
+    Args:
+        commands (list): Commands in input order
+        execute: Callable taking a normalized command, returning its response
+        executor (concurrent.futures.Executor): Shared pool to run on
+        max_parallel (int): Concurrency cap for this batch
+
+    Returns:
+        list: One result dict per command, in input order
+    """
+    results = [None] * len(commands)
+    pending = {}
+    queued = iter(enumerate(commands))
+
+    def submit_next():
+        for index, command in queued:
+            pending[executor.submit(_run_one, index, command, execute)] = index
+            return
+
+    for _ in range(max_parallel):
+        submit_next()
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[pending.pop(future)] = future.result()
+            submit_next()
+    return results
+
+
+async def run_batch_async(commands, execute, max_parallel):
+    """Async counterpart of run_batch; execute is a coroutine function."""
+    limit = asyncio.Semaphore(max_parallel)
+
+    async def one(index, command):
+        async with limit:
+            started = time.perf_counter()
+            try:
+                command = _normalize(command)
+                return _result(index, command, started, response=await execute(command))
+            except BatchError as e:
+                return _result(index, command, started, error=str(e))
+            except Exception as e:
+                logger.error("Error in batch command %s: %s", index, e, exc_info=True)
+                return _result(index, command, started, error=f'Server error: {str(e)}')
+
+    return list(await asyncio.gather(*(one(i, c) for i, c in enumerate(commands))))
+
+
+def batch_payload(results, started):
+    """Response body for a finished batch."""
+    return {
+        'results': results,
+        'count': len(results),
+        'errors': sum(1 for result in results if result['status'] == 'error'),
+        'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
@@ -0,0 +1,276 @@
+"""
+Circuit breakers for the upstream APIs.
+
+Each upstream (gemini, duckduckgo) has a CircuitBreaker that watches the
+outcome and latency of its calls over a rolling window. A call fails if
+it raises, returns a 5xx or 429, or takes longer than slow_call_seconds
+where the upstream has one (see SLOW_CALL_SECONDS).
+
+    closed     calls go through; once at least min_calls were made in the
+               window and failure_rate of them failed, the breaker opens
+    open       calls are refused with BreakerOpenError before any network
+               I/O, so exchanges take their offline path at once
+    half_open  after open_seconds, a few probe calls are let through; a
+               successful probe closes the breaker, a failed one reopens it
+
+The drivers in kael_api.upstream and kael_api.streaming consult the
+breaker named after the UpstreamRequest, so no exchange has to know about
+it. Settings come from the environment:
+
+    KAEL_BREAKER_FAILURE_RATE   fraction of failed calls that opens it (default 0.5)
+    KAEL_BREAKER_MIN_CALLS      calls in the window before it may open (default 5)
+    KAEL_BREAKER_WINDOW         rolling window in seconds (default 30)
+    KAEL_BREAKER_OPEN_SECONDS   time open before probing (default 15)
+    KAEL_BREAKER_SLOW_CALL      seconds after which a call to any upstream counts as
+                                failed, 0 to disable (default: SLOW_CALL_SECONDS)
+    KAEL_BREAKER_SLOW_CALL_<UPSTREAM>  the same for one upstream, e.g.
+                                KAEL_BREAKER_SLOW_CALL_GEMINI
+    KAEL_BREAKER_PROBES         concurrent probe calls while half-open (default 1)
+    KAEL_BREAKER_ENABLED        'false' to never open
+"""
+import collections
+import logging
+import math
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class BreakerOpenError(Exception):
+    """An upstream call was refused because its circuit breaker is open."""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"{name} circuit open, next probe in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+# Seconds after which a successful call still counts as failed, by upstream.
+# Gemini is exempt: a long prompt can take tens of seconds to answer well,
+# and the client's read timeout already bounds a hung call. DuckDuckGo and
+# Open-Meteo answer lookups in well under a second, so 5 s means trouble.
+# Upstreams not listed are exempt too.
+SLOW_CALL_SECONDS = {
+    'gemini': 0.0,
+    'duckduckgo': 5.0,
+    'open-meteo': 5.0,
+}
+
+
+def failed_status(status):
+    """Whether an HTTP status counts against the upstream's health."""
+    return status >= 500 or status == 429
+
+
+class CircuitBreaker:
+    """
+    Rolling failure-rate breaker for one upstream.
+
+    Args:
+        name (str): Upstream label, as in UpstreamRequest.name
+        failure_rate (float): Fraction of failed calls in the window that opens the breaker
+        min_calls (int): Calls the window must hold before the rate is trusted
+        window (float): Seconds of history kept, in one-second buckets
+        open_seconds (float): Time spent open before probing again
+        slow_call_seconds (float): Calls at least this slow count as failures; 0 disables
+        probes (int): Probe calls allowed at once while half-open
+        enabled (bool): False to record statistics but never open
+    """
+
+    def __init__(self, name, failure_rate=0.5, min_calls=5, window=30.0, open_seconds=15.0,
+                 slow_call_seconds=0.0, probes=1, enabled=True):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.probes = probes
+        self.enabled = enabled
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.short_circuited = 0
+        self._probes_in_flight = 0
+        self._probe_started = 0.0
+        self._buckets = collections.deque()  # [second, calls, failures, total seconds]
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go out now; a refused call is counted."""
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if now < self.opened_at + self.open_seconds:
+                    self.short_circuited += 1
+                    return False
+                self._set_state(HALF_OPEN)
+                self._probes_in_flight = 0
+            # A probe whose caller went away without recording an outcome
+            # must not keep the breaker half-open forever
+            if self._probes_in_flight < self.probes or now - self._probe_started > self.open_seconds:
+                if self._probes_in_flight >= self.probes:
+                    self._probes_in_flight = 0
+                self._probes_in_flight += 1
+                self._probe_started = now
+                return True
+            self.short_circuited += 1
+            return False
+
+    def check(self):
+        """Raise BreakerOpenError unless a call may go out now."""
+        if not self.allow():
+            raise BreakerOpenError(self.name, self.retry_in())
+
+    def release(self):
+        """Forget a call that allow() let through but that ended without an outcome."""
+        if self.state == HALF_OPEN:
+            with self._lock:
+                if self.state == HALF_OPEN:
+                    self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def record(self, ok, seconds):
+        """
+        Record the outcome of a call that allow() let through.
+
+        Args:
+            ok (bool): The upstream answered without a transport error or failing status
+            seconds (float): How long the call took
+        """
+        failed = not ok or (self.slow_call_seconds > 0 and seconds >= self.slow_call_seconds)
+        now = time.monotonic()
+        with self._lock:
+            self._add(now, failed, seconds)
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failed:
+                    self._open(now)
+                else:
+                    self._close()
+            elif self.state == CLOSED and failed and self.enabled:
+                calls, failures, _ = self._totals(now)
+                if calls >= self.min_calls and failures >= calls * self.failure_rate:
+                    self._open(now)
+            # Calls that were already out when the breaker opened only add to the window
+
+    def retry_in(self):
+        """Seconds until the next probe is allowed, 0 unless open."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def reset(self):
+        """Close the breaker and forget its history."""
+        with self._lock:
+            self._close()
+
+    def stats(self):
+        """State and rolling counters for /api/status."""
+        with self._lock:
+            calls, failures, seconds = self._totals(time.monotonic())
+            state = self.state
+        return {
+            'state': state,
+            'calls': calls,
+            'failures': failures,
+            'failure_rate': round(failures / calls, 3) if calls else 0.0,
+            'avg_latency_ms': round(seconds / calls * 1000, 1) if calls else None,
+            'slow_call_seconds': self.slow_call_seconds,
+            'times_opened': self.times_opened,
+            'short_circuited': self.short_circuited,
+            'retry_in_s': round(self.retry_in(), 1),
+        }
+
+    def _add(self, now, failed, seconds):
+        second = math.floor(now)
+        if self._buckets and self._buckets[-1][0] == second:
+            bucket = self._buckets[-1]
+        else:
+            bucket = [second, 0, 0, 0.0]
+            self._buckets.append(bucket)
+        bucket[1] += 1
+        bucket[2] += failed
+        bucket[3] += seconds
+
+    def _totals(self, now):
+        horizon = now - self.window
+        while self._buckets and self._buckets[0][0] < horizon:
+            self._buckets.popleft()
+        calls = failures = 0
+        seconds = 0.0
+        for _, bucket_calls, bucket_failures, bucket_seconds in self._buckets:
+            calls += bucket_calls
+            failures += bucket_failures
+            seconds += bucket_seconds
+        return calls, failures, seconds
+
+    def _open(self, now):
+        self.opened_at = now
+        self.times_opened += 1
+        self._set_state(OPEN)
+
+    def _close(self):
+        self._buckets.clear()
+        self._probes_in_flight = 0
+        self._set_state(CLOSED)
+
+    def _set_state(self, state):
+        if state != self.state:
+            level = logging.INFO if state == CLOSED else logging.WARNING
+            logger.log(level, "Circuit breaker for %s: %s -> %s", self.name, self.state, state)
+            self.state = state
+
+
+def _slow_call_seconds(name):
+    specific = os.getenv('KAEL_BREAKER_SLOW_CALL_' + name.upper().replace('-', '_'))
+    if specific is not None:
+        return float(specific)
+    return float(os.getenv('KAEL_BREAKER_SLOW_CALL', str(SLOW_CALL_SECONDS.get(name, 0.0))))
+
+
+def _settings(name):
+    return {
+        'failure_rate': float(os.getenv('KAEL_BREAKER_FAILURE_RATE', '0.5')),
+        'min_calls': int(os.getenv('KAEL_BREAKER_MIN_CALLS', '5')),
+        'window': float(os.getenv('KAEL_BREAKER_WINDOW', '30')),
+        'open_seconds': float(os.getenv('KAEL_BREAKER_OPEN_SECONDS', '15')),
+        'slow_call_seconds': _slow_call_seconds(name),
+        'probes': int(os.getenv('KAEL_BREAKER_PROBES', '1')),
+        'enabled': os.getenv('KAEL_BREAKER_ENABLED', 'true').lower() not in ('0', 'false', 'no'),
+    }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(name):
+    """The process-wide breaker for an upstream, created on first use."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(name, **_settings(name))
+    return breaker
+
+
+def breaker_stats():
+    """Stats of every breaker created so far, by upstream name."""
+    return {name: breaker.stats() for name, breaker in sorted(_breakers.items())}
+
+
+def degraded():
+    """Whether any upstream is currently being skipped or probed."""
+    return any(breaker.state != CLOSED for breaker in _breakers.values())
@@ -0,0 +1,126 @@
+"""
+In-process TTL + LRU cache used in front of slow upstream lookups.
+
+Entries expire after a per-entry time-to-live and the least recently used
+entries are evicted once the cache grows past its byte budget. Lookups and
+inserts are O(1) and the cache is safe to share between request threads.
+"""
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_key(text):
+    """Normalize free text so trivially different queries share an entry."""
+    return _WHITESPACE.sub(' ', text.lower()).strip(' ?!.,;:')
+
+
+def _sizeof(value):
+    """Approximate the memory held by a cached key or value in bytes."""
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(_sizeof(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class TTLCache:
+    """
+    Byte-bounded LRU cache with per-entry expiry.
+
+    Args:
+        max_bytes (int): Budget for keys plus values; LRU entries are
+            evicted once it is exceeded
+        ttl (float): Default time-to-live in seconds
+        clock: Monotonic time source, replaceable for benchmarks
+    """
+
+    def __init__(self, max_bytes=1024 * 1024, ttl=300.0, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, size, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Store a value.
+
+        Args:
+            key: Hashable cache key
+            value: Value to cache
+            ttl (float): Lifetime in seconds, defaulting to the cache TTL
+        """
+        size = _sizeof(key) + _sizeof(value)
+        if size > self.max_bytes:
+            # Never let one oversized entry flush the whole cache
+            return
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (expires_at, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Counters for /api/status."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,278 @@
+"""
+WebSocket command channel for the dashboard.
+
+A client opens one WebSocket to /api/ws and keeps it, instead of making
+an HTTP request (and a connectivity check before it) for every command.
+Messages are JSON text frames.
+
+From the client:
+
+    {"type": "command", "id": "c1", "command": "...", "session": "..."}
+    {"type": "ping", "ts": 1700000000000}
+
+From the server, each with an "event" key:
+
+    hello   sent on connect, with status_interval and idle_timeout in seconds
+    chunk   {"id", "text"}: part of a command's response, as for streamed HTTP
+    done    {"id", "command", "response", ...}: the command's final payload
+    error   {"id", "status", "error"}: a refused or failed command (or a bad
+            message, without an id); 429 and 503 carry retry_after
+    pong    {"ts"}: the reply to a ping, echoing its ts
+    status  the /api/status payload, pushed every STATUS_INTERVAL seconds
+
+Commands are answered like POST /api/command with streaming on: they
+count against the same rate limit and concurrency cap, and several may
+be in flight on one connection (up to MAX_PENDING). The client pings
+every few seconds; a connection the server has heard nothing on for
+IDLE_TIMEOUT seconds is closed.
+
+The async serving mode always serves the channel (uvicorn needs its
+websockets extra: pip install "uvicorn[standard]"). The threaded Flask
+mode serves it when flask-sock is installed; otherwise the dashboard
+keeps using plain HTTP.
+"""
+import json
+import logging
+import threading
+import time
+
+from kael_api.admission import refusal
+from kael_api.logs import new_request_id, reset_request_id
+from kael_api.metrics import REGISTRY, observe_request
+from kael_api.sessions import session_id
+from kael_api.streaming import iter_text, stream_events
+from kael_api.upstream import run_sync
+
+logger = logging.getLogger(__name__)
+
+PATH = '/api/ws'
+
+# Rate limit and concurrency cap key shared with POST /api/command
+COMMAND_ROUTE = 'POST /api/command'
+
+STATUS_INTERVAL = 5.0
+IDLE_TIMEOUT = 45.0
+MAX_PENDING = 4
+MAX_MESSAGE_CHARS = 8192
+
+
+class ChannelError(ValueError):
+    """A client message that cannot be handled."""
+
+
+def parse_message(text):
+    """
+    Validate a client message.
+
+    Returns:
+        dict: The message, whose "type" is "command" or "ping"
+
+    Raises:
+        ChannelError: If the message is malformed
+    """
+    if text is None or len(text) > MAX_MESSAGE_CHARS:
+        raise ChannelError('Messages must be JSON text of at most %s characters' % MAX_MESSAGE_CHARS)
+    try:
+        message = json.loads(text)
+    except ValueError:
+        raise ChannelError('Messages must be JSON objects')
+    if not isinstance(message, dict):
+        raise ChannelError('Messages must be JSON objects')
+    kind = message.get('type')
+    if kind == 'command':
+        command = message.get('command')
+        if not isinstance(command, str) or not command.strip():
+            raise ChannelError('No command provided')
+    elif kind != 'ping':
+        raise ChannelError(f"Unknown message type {kind!r}")
+    return message
+
+
+def encode(event, **payload):
+    """A server message as JSON text."""
+    payload['event'] = event
+    return json.dumps(payload)
+
+
+def status_message(server):
+    return encode('status', **server.status_payload())
+
+
+def hello_message():
+    return encode('hello', status_interval=STATUS_INTERVAL, idle_timeout=IDLE_TIMEOUT, max_pending=MAX_PENDING)
+
+
+def refused(command_id, status, retry_after):
+    """Error message for a command refused by admission control."""
+    payload, _ = refusal(status, retry_after)
+    return encode('error', id=command_id, status=status, **payload)
+
+
+class ChannelStats:
+    """Connection and message counters for /api/status and /api/metrics."""
+
+    def __init__(self):
+        self.open = 0
+        self.opened = 0
+        self.commands = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def connected(self):
+        with self._lock:
+            self.open += 1
+            self.opened += 1
+
+    def disconnected(self):
+        with self._lock:
+            self.open -= 1
+
+    def stats(self):
+        return {'open': self.open, 'opened': self.opened, 'commands': self.commands, 'errors': self.errors}
+
+    def collect(self):
+        yield 'kael_ws_connections', 'gauge', 'Open WebSocket command channels', {}, self.open
+        yield 'kael_ws_connections_opened_total', 'counter', 'WebSocket command channels opened', {}, self.opened
+        yield 'kael_ws_commands_total', 'counter', 'Commands received over WebSocket', {}, self.commands
+
+
+CHANNEL = ChannelStats()
+REGISTRY.register_collector(CHANNEL.collect)
+
+
+def serve_channel(ws, server, client):
+    """
+    Run one connection of the channel with a blocking WebSocket (flask-sock).
+
+    Commands are handled on threads of their own so pings and status
+    pushes are answered while a slow Gemini call is in flight.
+
+    Args:
+        ws: flask-sock WebSocket with send() and receive(timeout)
+        server: The server module, as for kael_api.asgi.create_asgi_app
+        client (str): The client's address, for the rate limiter
+    """
+    lock = threading.Lock()
+    closed = threading.Event()
+    pending = []
+
+    def send(text):
+        if closed.is_set():
+            return
+        with lock:
+            try:
+                ws.send(text)
+            except Exception:
+                # The client has gone; the receive loop will notice too
+                closed.set()
+
+    CHANNEL.connected()
+    try:
+        send(hello_message())
+        send(status_message(server))
+        last_heard = last_status = time.monotonic()
+        while not closed.is_set():
+            text = ws.receive(timeout=STATUS_INTERVAL)
+            now = time.monotonic()
+            if text is not None:
+                last_heard = now
+                _dispatch(server, send, text, client, pending)
+            elif now - last_heard > IDLE_TIMEOUT:
+                logger.info("Closing idle WebSocket channel from %s", client)
+                break
+            if now - last_status >= STATUS_INTERVAL:
+                send(status_message(server))
+                last_status = now
+    finally:
+        # flask-sock closes the socket once the handler returns
+        closed.set()
+        CHANNEL.disconnected()
+
+
+def _dispatch(server, send, text, client, pending):
+    if isinstance(text, bytes):
+        text = text.decode('utf-8', errors='replace')
+    try:
+        message = parse_message(text)
+    except ChannelError as e:
+        CHANNEL.errors += 1
+        send(encode('error', status=400, error=str(e)))
+        return
+    if message['type'] == 'ping':
+        send(encode('pong', ts=message.get('ts')))
+        return
+    pending[:] = [thread for thread in pending if thread.is_alive()]
+    if len(pending) >= MAX_PENDING:
+        send(encode('error', id=message.get('id'), status=429,
+                    error=f'At most {MAX_PENDING} commands may be in flight on one connection'))
+        return
+    thread = threading.Thread(target=run_command, args=(server, send, message, client),
+                              name='kael-ws-command', daemon=True)
+    pending.append(thread)
+    thread.start()
+
+
+def run_command(server, send, message, client):
+    """Answer one command message, sending its chunk and done (or error) events."""
+    CHANNEL.commands += 1
+    started = time.perf_counter()
+    command_id = message.get('id')
+    command = message['command'].lower()
+    session = session_id(message, {})
+    admission = getattr(server, 'admission', None)
+    admitted = None
+    status = 500
+    _, request_id_token = new_request_id()
+    try:
+        if admission is not None:
+            retry_after = admission.rate.check(client or '-', COMMAND_ROUTE)
+            if retry_after:
+                status = 429
+                send(refused(command_id, status, retry_after))
+                return
+            if not admission.slots.acquire():
+                status = 503
+                send(refused(command_id, status, admission.slots.retry_after()))
+                return
+            admitted = time.perf_counter()
+        logger.info("Processing command: %s", command)
+        stream = server.command_stream(command, session)
+        chunks = iter_text(stream, server.http_client) if stream else \
+            [run_sync(server.command_exchange(command, session), server.http_client)]
+        for event in stream_events(chunks, 'ndjson', lambda text: server.command_done(command, text),
+                                   started, {'id': command_id}):
+            send(event.decode('utf-8').rstrip('\n'))
+        status = 200
+    except Exception as e:
+        logger.error("Error processing WebSocket command: %s", e, exc_info=True)
+        send(encode('error', id=command_id, status=500, error=f'Server error: {str(e)}'))
+    finally:
+        if admitted is not None:
+            admission.slots.release(time.perf_counter() - admitted)
+        reset_request_id(request_id_token)
+        observe_request('/api/command', 'WS', status, time.perf_counter() - started)
+
+
+def install_channel(app, server):
+    """
+    Serve the channel from a Flask app if flask-sock is installed.
+
+    Returns:
+        bool: Whether the channel is served
+    """
+    try:
+        from flask_sock import Sock
+    except ImportError:
+        logger.info("flask-sock not installed; the WebSocket channel is only served in --async mode")
+        return False
+    from flask import request
+
+    sock = Sock(app)
+
+    # A client that disconnects ends the handler with ConnectionClosed,
+    # which flask-sock handles
+    @sock.route(PATH)
+    def command_channel(ws):
+        serve_channel(ws, server, request.remote_addr)
+
+    return True
@@ -0,0 +1,189 @@
+"""
+Background health checks of the upstream APIs.
+
+Asking Gemini to answer a test prompt tells a client whether Gemini works,
+but it costs a generation call, quota and seconds of latency, and every
+client that asks pays again. A HealthProber instead checks each upstream
+on a background thread every interval seconds with the cheapest request
+the upstream answers (for Gemini, the metadata of the configured model,
+which spends no tokens) and keeps the outcome. /api/health and
+/api/status read it from memory, so a liveness check costs microseconds
+and never reaches the upstream.
+
+Probes bypass the circuit breakers and request coalescing, and have a
+client of their own without retries: they report what the upstream
+answers right now, and their outcome does not open or close a breaker.
+
+Settings come from the environment:
+
+    KAEL_HEALTH_INTERVAL   seconds between rounds of probes, 0 to disable (default 30)
+    KAEL_HEALTH_TIMEOUT    seconds allowed per probe (default 5)
+"""
+import datetime
+import logging
+import os
+import threading
+import time
+
+from kael_api.http_client import HttpClient
+
+logger = logging.getLogger(__name__)
+
+UP = 'up'
+DOWN = 'down'
+DISABLED = 'disabled'
+UNKNOWN = 'unknown'
+
+# kael_upstream_up values
+UP_VALUES = {UP: 1, DOWN: 0, UNKNOWN: -1}
+
+
+def model_url(api_url):
+    """The model metadata URL for a Gemini generateContent URL."""
+    return api_url.split(':generateContent')[0]
+
+
+class Probe:
+    """
+    How to check one upstream.
+
+    Args:
+        name (str): Upstream label, as in UpstreamRequest.name
+        request (UpstreamRequest): A cheap request the upstream answers, or
+            None when the upstream is not used
+        reason (str): Why the upstream is not probed, when request is None
+    """
+
+    __slots__ = ('name', 'request', 'reason')
+
+    def __init__(self, name, request=None, reason='disabled'):
+        self.name = name
+        self.request = request
+        self.reason = reason
+
+
+class HealthProber:
+    """
+    Probe upstreams on a background thread and keep the latest outcomes.
+
+    Args:
+        probes (list): Probe for each upstream
+        interval (float): Seconds between rounds; 0 or less never starts
+            the thread, leaving check_now() to probe
+        timeout (float): Seconds allowed to connect and to read a probe's response
+    """
+
+    def __init__(self, probes, interval=30.0, timeout=5.0):
+        self.probes = list(probes)
+        self.interval = interval
+        self.timeout = timeout
+        self.rounds = 0
+        self._client = HttpClient(connect_timeout=timeout, read_timeout=timeout, retries=0, pool_size=1)
+        self._results = {}
+        for probe in self.probes:
+            state = UNKNOWN if probe.request is not None else DISABLED
+            self._results[probe.name] = {
+                'status': state, 'reason': None if probe.request is not None else probe.reason,
+                'http_status': None, 'latency_ms': None, 'error': None,
+                'checked_at': None, 'last_up': None, 'failures': 0,
+            }
+        self._checked = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, probes):
+        """Build a prober from the KAEL_HEALTH_* environment variables."""
+        return cls(probes,
+                   interval=float(os.getenv('KAEL_HEALTH_INTERVAL', '30')),
+                   timeout=float(os.getenv('KAEL_HEALTH_TIMEOUT', '5')))
+
+    def start(self):
+        """Start probing in the background, the first round at once."""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='kael-health', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.check_now()
+            self._stop.wait(self.interval)
+
+    def check_now(self):
+        """Probe every upstream once, in this thread."""
+        for probe in self.probes:
+            if probe.request is not None:
+                self._record(probe.name, *self._probe(probe.request))
+        self.rounds += 1
+
+    def _probe(self, request):
+        """Returns (HTTP status or None, seconds, error message or None)."""
+        started = time.perf_counter()
+        try:
+            response = self._client.request(request.method, request.url, headers=request.headers,
+                                            json=request.json)
+            status = response.status_code
+            response.close()
+        except Exception as e:
+            return None, time.perf_counter() - started, type(e).__name__
+        elapsed = time.perf_counter() - started
+        return status, elapsed, None if status < 400 else f"status {status}"
+
+    def _record(self, name, http_status, seconds, error):
+        now = datetime.datetime.now().isoformat()
+        with self._lock:
+            result = dict(self._results[name])
+            result.update(status=DOWN if error else UP, http_status=http_status,
+                          latency_ms=round(seconds * 1000, 2), error=error, checked_at=now)
+            if error:
+                result['failures'] += 1
+                if result['status'] != self._results[name]['status']:
+                    logger.warning("Health probe of %s failed: %s", name, error)
+            else:
+                result['failures'] = 0
+                result['last_up'] = now
+                if self._results[name]['status'] == DOWN:
+                    logger.info("Health probe of %s succeeded again", name)
+            self._results[name] = result
+            self._checked[name] = time.monotonic()
+
+    def snapshot(self):
+        """The latest outcome for each upstream, with its age in seconds."""
+        now = time.monotonic()
+        with self._lock:
+            results = {name: dict(result) for name, result in self._results.items()}
+            for name, result in results.items():
+                checked = self._checked.get(name)
+                result['age_s'] = round(now - checked, 1) if checked is not None else None
+        return results
+
+    def healthy(self):
+        """Whether no upstream failed its last probe."""
+        return all(result['status'] != DOWN for result in self._results.values())
+
+    def payload(self):
+        """Body of GET /api/health."""
+        return {
+            'status': 'ok' if self.healthy() else 'degraded',
+            'upstreams': self.snapshot(),
+            'interval': self.interval,
+            'rounds': self.rounds,
+        }
+
+    def collect(self):
+        for name, result in self.snapshot().items():
+            if result['status'] == DISABLED:
+                continue
+            labels = {'upstream': name}
+            yield 'kael_upstream_up', 'gauge', 'Whether the last health probe succeeded: 1 up, 0 down, -1 not yet probed', \
+                labels, UP_VALUES[result['status']]
+            if result['latency_ms'] is not None:
+                yield 'kael_upstream_probe_seconds', 'gauge', 'Duration of the last health probe', \
+                    labels, round(result['latency_ms'] / 1000, 5)
+            yield 'kael_upstream_probe_failures', 'gauge', 'Health probes failed in a row', \
+                labels, result['failures']
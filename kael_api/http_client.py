@@ -0,0 +1,355 @@
+"""
+Shared outbound HTTP client for calls to Gemini and DuckDuckGo.
+
+A single requests.Session with a pooled adapter keeps connections to each
+upstream host alive between commands, so only the first request to a host
+pays for the TCP and TLS handshake. Every call carries a connect/read
+timeout so a hung upstream can no longer pin a worker thread, and
+transient failures are retried a bounded number of times with jittered
+exponential backoff.
+
+AsyncHttpClient offers the same behaviour on top of aiohttp for the asyncio
+serving mode (see kael_api.asgi); aiohttp is only needed when that mode is
+used.
+
+Configuration comes from the environment:
+
+    KAEL_HTTP_CONNECT_TIMEOUT  seconds to establish a connection (default 3.05)
+    KAEL_HTTP_READ_TIMEOUT     seconds to wait for response data (default 30)
+    KAEL_HTTP_RETRIES          retries after the first attempt (default 2)
+    KAEL_HTTP_BACKOFF          base backoff in seconds (default 0.25)
+    KAEL_HTTP_POOL_SIZE        keep-alive connections per host (default 10)
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth another attempt: throttling and gateway hiccups
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+
+# Cap on a single backoff sleep, in seconds
+MAX_BACKOFF = 4.0
+
+
+class HttpClient:
+    """
+    Pooled, keep-alive HTTP client with timeouts and bounded retries.
+
+    Args:
+        connect_timeout (float): Seconds allowed to open a connection
+        read_timeout (float): Seconds allowed between bytes of the response
+        retries (int): Extra attempts after a retryable failure
+        backoff (float): Base delay for exponential backoff with full jitter
+        pool_size (int): Keep-alive connections kept per upstream host
+        user_agent (str): Optional default User-Agent header
+    """
+
+    def __init__(self, connect_timeout=3.05, read_timeout=30.0, retries=2,
+                 backoff=0.25, pool_size=10, user_agent=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.pool_size = pool_size
+
+        # Retries are handled here rather than by urllib3 so that the
+        # backoff is jittered and status-based retries are counted
+        self._adapter = HTTPAdapter(pool_connections=pool_size,
+                                    pool_maxsize=pool_size,
+                                    max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+
+        self._lock = threading.Lock()
+        self._retried = 0
+        self._failed = 0
+
+    @classmethod
+    def from_env(cls, **overrides):
+        """Build a client from the KAEL_HTTP_* environment variables."""
+        config = {
+            'connect_timeout': float(os.getenv('KAEL_HTTP_CONNECT_TIMEOUT', '3.05')),
+            'read_timeout': float(os.getenv('KAEL_HTTP_READ_TIMEOUT', '30')),
+            'retries': int(os.getenv('KAEL_HTTP_RETRIES', '2')),
+            'backoff': float(os.getenv('KAEL_HTTP_BACKOFF', '0.25')),
+            'pool_size': int(os.getenv('KAEL_HTTP_POOL_SIZE', '10')),
+        }
+        config.update(overrides)
+        return cls(**config)
+
+    def request(self, method, url, timeout=None, **kwargs):
+        """
+        Send a request through the shared pool.
+
+        Args:
+            method (str): HTTP method
+            url (str): Absolute URL
+            timeout: Optional (connect, read) override for this call
+            **kwargs: Passed through to requests.Session.request
+
+        Returns:
+            requests.Response: The final response, which may still carry a
+            retryable status if every attempt was throttled
+
+        Raises:
+            requests.RequestException: If the last attempt failed to connect
+            or timed out
+        """
+        timeout = timeout or self.timeout
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.retries or isinstance(e, requests.ReadTimeout):
+                    # A read timeout already cost the full read budget;
+                    # retrying it would multiply the time a caller hangs
+                    with self._lock:
+                        self._failed += 1
+                    raise
+                logger.warning("Retrying %s %s after error: %s", method, url.split('?')[0], e)
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return response
+                response.close()
+                logger.warning("Retrying %s %s after status %s", method, url.split('?')[0], response.status_code)
+
+            with self._lock:
+                self._retried += 1
+            time.sleep(random.uniform(0, min(MAX_BACKOFF, self.backoff * (2 ** attempt))))
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    @contextmanager
+    def stream(self, method, url, **kwargs):
+        """
+        Send a request whose body is read incrementally.
+
+        Retries apply until the response headers arrive; the read timeout
+        then applies to each gap between chunks. The connection goes back
+        to the pool when the block exits.
+
+        Yields:
+            requests.Response: Response to iterate with iter_lines()
+        """
+        response = self.request(method, url, stream=True, **kwargs)
+        try:
+            yield response
+        finally:
+            response.close()
+
+    def stats(self):
+        """
+        Pool metrics per upstream host.
+
+        Returns:
+            dict: 'hosts' maps "scheme://host:port" to the connections
+            opened, requests sent, handshakes avoided through keep-alive
+            and idle connections currently pooled; 'retries' and 'failures'
+            count retry attempts and requests that ultimately raised.
+        """
+        hosts = {}
+        pools = self._adapter.poolmanager.pools
+        with pools.lock:
+            keys = list(pools.keys())
+        for key in keys:
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened = pool.num_connections
+            sent = pool.num_requests
+            # The pool queue is pre-filled with None placeholders
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+            hosts[f"{key.key_scheme}://{key.key_host}:{key.key_port}"] = {
+                'connections_opened': opened,
+                'requests': sent,
+                'handshakes_avoided': max(0, sent - opened),
+                'idle': idle,
+                'pool_size': self.pool_size,
+            }
+        with self._lock:
+            return {'hosts': hosts, 'retries': self._retried, 'failures': self._failed}
+
+    def close(self):
+        self.session.close()
+
+
+class BufferedResponse:
+    """Fully read async response exposing the requests.Response attributes exchanges use."""
+
+    __slots__ = ('status_code', 'content', 'headers')
+
+    def __init__(self, status_code, content, headers):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncHttpClient:
+    """
+    Non-blocking counterpart of HttpClient for the ASGI serving mode.
+
+    Takes the same arguments as HttpClient. Requests are awaited on the
+    event loop through an aiohttp connection pool, so hundreds of slow
+    upstream calls can be in flight without a thread each. Responses are
+    read in full and returned as BufferedResponse objects.
+    """
+
+    def __init__(self, connect_timeout=3.05, read_timeout=30.0, retries=2,
+                 backoff=0.25, pool_size=10, user_agent=None):
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError("The async serving mode needs aiohttp: pip install aiohttp uvicorn")
+
+        self._aiohttp = aiohttp
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self._timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self._headers = {'User-Agent': user_agent} if user_agent else None
+        self._session = None
+        self._retried = 0
+        self._failed = 0
+        self._requests = 0
+        self._in_flight = 0
+
+    @classmethod
+    def from_env(cls, **overrides):
+        """Build a client from the KAEL_HTTP_* environment variables."""
+        config = {
+            'connect_timeout': float(os.getenv('KAEL_HTTP_CONNECT_TIMEOUT', '3.05')),
+            'read_timeout': float(os.getenv('KAEL_HTTP_READ_TIMEOUT', '30')),
+            'retries': int(os.getenv('KAEL_HTTP_RETRIES', '2')),
+            'backoff': float(os.getenv('KAEL_HTTP_BACKOFF', '0.25')),
+            'pool_size': int(os.getenv('KAEL_HTTP_POOL_SIZE', '10')),
+        }
+        config.update(overrides)
+        return cls(**config)
+
+    def _get_session(self):
+        # aiohttp sessions must be created inside the running event loop
+        if self._session is None or self._session.closed:
+            aiohttp = self._aiohttp
+            # Async callers need no thread per connection, so allow many
+            # more concurrent connections per host than the blocking pool
+            connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.pool_size * 10,
+                                             keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout,
+                                                  headers=self._headers)
+        return self._session
+
+    async def request(self, method, url, headers=None, json=None):
+        """Send a request; same retry rules as HttpClient.request."""
+        aiohttp = self._aiohttp
+        session = self._get_session()
+        attempt = 0
+        while True:
+            self._requests += 1
+            self._in_flight += 1
+            try:
+                async with session.request(method, url, headers=headers, json=json) as response:
+                    content = await response.read()
+                    result = BufferedResponse(response.status, content, response.headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                connect_failed = isinstance(e, aiohttp.ClientConnectorError) or \
+                    e.__class__.__name__ == 'ConnectionTimeoutError'
+                if attempt >= self.retries or not connect_failed:
+                    # Only failures to connect are retried; a read timeout
+                    # already cost the full read budget
+                    self._failed += 1
+                    raise
+                logger.warning("Retrying %s %s after error: %s", method, url.split('?')[0], e)
+            else:
+                if result.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return result
+                logger.warning("Retrying %s %s after status %s", method, url.split('?')[0], result.status_code)
+            finally:
+                self._in_flight -= 1
+
+            self._retried += 1
+            await asyncio.sleep(random.uniform(0, min(MAX_BACKOFF, self.backoff * (2 ** attempt))))
+            attempt += 1
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method, url, headers=None, json=None):
+        """
+        Send a request whose body is read incrementally.
+
+        Made in a single attempt, since a retry could not take back chunks
+        already relayed to the client.
+
+        Yields:
+            aiohttp.ClientResponse: Response whose content iterates by line
+        """
+        session = self._get_session()
+        self._requests += 1
+        self._in_flight += 1
+        try:
+            async with session.request(method, url, headers=headers, json=json) as response:
+                yield response
+        except (self._aiohttp.ClientError, asyncio.TimeoutError):
+            self._failed += 1
+            raise
+        finally:
+            self._in_flight -= 1
+
+    def stats(self):
+        """Request counters and pooled connections."""
+        connector = self._session.connector if self._session is not None else None
+        return {
+            'requests': self._requests,
+            'in_flight': self._in_flight,
+            'idle_connections': sum(len(conns) for conns in getattr(connector, '_conns', {}).values()),
+            'pool_size': self.pool_size,
+            'retries': self._retried,
+            'failures': self._failed,
+        }
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def default_client():
+    """The process-wide client shared by ask_gemini and search_web."""
+    global _default_client
+    if _default_client is None:
+        with _default_lock:
+            if _default_client is None:
+                _default_client = HttpClient.from_env()
+    return _default_client
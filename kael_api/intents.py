@@ -0,0 +1,145 @@
+"""
+Declarative intent registry and a compiled matcher for KAEL commands.
+
+Every trigger phrase of every intent is folded into a single character trie
+and compiled once into one regular expression, so routing a command is one
+regex scan whose cost depends on the command length rather than on the
+number of registered intents. Triggers only match whole words, which keeps
+short triggers like "hi" from firing inside "this".
+"""
+import re
+from collections import namedtuple
+
+# Result of a successful match: the intent name, the trigger phrase that
+# fired and the slots extracted from the command
+IntentMatch = namedtuple('IntentMatch', ['intent', 'trigger', 'slots'])
+
+
+class Intent:
+    """
+    A named command intent.
+
+    Args:
+        name (str): Unique intent name, used to look up its handler
+        triggers (iterable): Lowercase phrases that select this intent
+        slot_pattern (str): Optional regex whose named groups become slots
+    """
+
+    def __init__(self, name, triggers, slot_pattern=None):
+        self.name = name
+        self.triggers = tuple(triggers)
+        self.slot_pattern = re.compile(slot_pattern) if slot_pattern else None
+
+    def __repr__(self):
+        return f"Intent({self.name!r}, {list(self.triggers)!r})"
+
+
+# Registry of built-in intents. Order is priority: when a command contains
+# triggers of several intents, the one listed first wins.
+INTENTS = (
+    Intent('open', ['open']),
+    Intent('search', ['search for', 'search', 'look up', 'find information',
+                      'find information about', 'find information on', 'tell me about']),
+    Intent('weather', ['weather'], r"weather (?:in|for|at) (?P<location>[\w\s]+)"),
+    Intent('news', ['news'], r"news (?:about|on|regarding) (?P<topic>[\w\s]+)"),
+    Intent('type', ['type']),
+    Intent('play_music', ['play music', 'play song']),
+    Intent('volume_up', ['volume up', 'louder']),
+    Intent('volume_down', ['volume down', 'quieter']),
+    Intent('time', ['time']),
+    Intent('date', ['date', 'day']),
+    Intent('greeting', ['hello', 'hi', 'hey', 'greetings']),
+    Intent('identity', ['who are you', 'your name', 'introduce yourself']),
+    Intent('joke', ['joke', 'jokes', 'funny']),
+    Intent('help', ['help', 'what can you do']),
+    Intent('thanks', ['thank', 'thanks']),
+    Intent('exit', ['exit', 'quit', 'goodbye', 'bye']),
+    Intent('system_status', ['system', 'status']),
+)
+
+
+def _trie_regex(phrases):
+    """Compile a list of phrases into a prefix-factored regex alternation."""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        terminal = '' in node
+        branches = [re.escape(char) + build(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and not terminal:
+            return branches[0]
+        body = '(?:' + '|'.join(branches) + ')'
+        # Greedy optional suffix makes the longest registered phrase win
+        return body + '?' if terminal else body
+
+    return build(trie)
+
+
+class IntentRouter:
+    """
+    Compiled matcher over a set of intents.
+
+    The router is built once (typically at import time) and is safe to
+    share between request threads since matching keeps no state.
+    """
+
+    def __init__(self, intents):
+        self.intents = tuple(intents)
+        self._by_trigger = {}
+        for rank, intent in enumerate(self.intents):
+            for trigger in intent.triggers:
+                # First registration of a phrase keeps it
+                self._by_trigger.setdefault(trigger, (rank, intent))
+
+        if self._by_trigger:
+            self._pattern = re.compile(r'\b' + _trie_regex(self._by_trigger) + r'\b')
+        else:
+            self._pattern = None
+
+    def match(self, command):
+        """
+        Find the highest-priority intent in a command.
+
+        Args:
+            command (str): The lowercased user command
+
+        Returns:
+            IntentMatch: The matched intent and its slots, or None. Slots
+            always include 'remainder', the command with the trigger
+            phrase removed, plus any named groups of the slot pattern.
+        """
+        if self._pattern is None:
+            return None
+
+        best = None
+        for found in self._pattern.finditer(command):
+            rank, intent = self._by_trigger[found.group(0)]
+            if best is None or rank < best[0]:
+                best = (rank, intent, found)
+                if rank == 0:
+                    break
+
+        if best is None:
+            return None
+
+        _, intent, found = best
+        slots = {'remainder': (command[:found.start()] + command[found.end():]).strip()}
+        if intent.slot_pattern is not None:
+            slot_match = intent.slot_pattern.search(command)
+            if slot_match:
+                slots.update((name, value.strip())
+                             for name, value in slot_match.groupdict().items()
+                             if value is not None)
+        return IntentMatch(intent.name, found.group(0), slots)
+
+
+def build_router(handlers, intents=INTENTS):
+    """Build a router limited to the intents that have a handler."""
+    return IntentRouter(intent for intent in intents if intent.name in handlers)
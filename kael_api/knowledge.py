@@ -0,0 +1,222 @@
+"""
+Local knowledge base for answering without the network.
+
+Entries live in a JSON Lines file, one object per line:
+
+    {"title": "Quantum computing", "keywords": ["qubit"], "text": "..."}
+
+The file is memory-mapped and indexed on first use (or in the background
+with warm()), so importing a server stays fast however large the file is.
+Only the index is held in Python objects: an inverted index from each
+term to the entries containing it, and each entry's length and byte
+offset. An answer's text is decoded from the mapped file when it is
+returned.
+
+Queries are ranked with BM25. Terms in an entry's title and keywords
+count TITLE_WEIGHT times, so "what is a black hole" prefers the entry
+about black holes over one that mentions them in passing. answer() only
+returns an entry that scores at least min_score and contains at least
+half of the query's terms, counting twice any term no entry contains, so
+a query that shares one common word with an entry ("best pizza in town",
+"how do owls sleep") gets no answer rather than a wrong one.
+"""
+import heapq
+import json
+import logging
+import math
+import mmap
+import re
+import threading
+import time
+from array import array
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about an and are as at be been but by can could did do does for from had has have how i if in into is it
+its just know like me my of on or please search show so tell than that the their them then there these
+they this to up us was we were what when where which who why will with would you your find look
+""".split())
+
+# Words whose final s is not a plural ending
+SINGULAR_S = frozenset(('news', 'physics', 'series', 'species', 'mathematics', 'always', 'perhaps'))
+
+TITLE_WEIGHT = 3
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text):
+    """Lowercase index terms of a text, without stopwords and plural endings."""
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if (len(token) > 3 and token.endswith('s') and not token.endswith(('ss', 'us', 'is'))
+                and token not in SINGULAR_S):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+class KnowledgeBase:
+    """
+    BM25-ranked entries from a JSON Lines file, indexed on first use.
+
+    Args:
+        path (str): The data file; a missing file gives an empty knowledge base
+        min_score (float): Lowest BM25 score answer() accepts
+        min_coverage (float): Fraction of the query's terms the answer must contain
+    """
+
+    def __init__(self, path, min_score=4.5, min_coverage=0.5):
+        self.path = path
+        self.min_score = min_score
+        self.min_coverage = min_coverage
+        self.loaded = False
+        self.load_ms = None
+        self.queries = 0
+        self.answered = 0
+        self._lock = threading.Lock()
+        self._data = b''
+        self._offsets = array('Q')
+        self._lengths = array('I')
+        self._norms = array('d')  # BM25 length normalization per entry
+        self._postings = {}  # term -> array('I') of entry index, weighted frequency pairs
+        self._avg_length = 0.0
+
+    def warm(self):
+        """Build the index on a background thread."""
+        threading.Thread(target=self._ensure_loaded, name='kael-knowledge', daemon=True).start()
+
+    def _ensure_loaded(self):
+        if self.loaded:
+            return
+        with self._lock:
+            if not self.loaded:
+                self._load()
+                self.loaded = True
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            with open(self.path, 'rb') as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            # ValueError: an empty file cannot be mapped
+            logger.warning("Knowledge base %s not loaded: %s", self.path, e)
+            self.load_ms = 0.0
+            return
+
+        postings = {}
+        total_length = 0
+        position = 0
+        size = len(self._data)
+        while position < size:
+            end = self._data.find(b'\n', position)
+            if end < 0:
+                end = size
+            line = self._data[position:end]
+            offset, position = position, end + 1
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                counts = {}
+                for term in tokenize(f"{entry.get('title', '')} {' '.join(entry.get('keywords', ()))}"):
+                    counts[term] = counts.get(term, 0) + TITLE_WEIGHT
+                for term in tokenize(entry['text']):
+                    counts[term] = counts.get(term, 0) + 1
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning("Skipping knowledge base line at byte %s: %s", offset, e)
+                continue
+            index = len(self._offsets)
+            self._offsets.append(offset)
+            length = sum(counts.values())
+            self._lengths.append(length)
+            total_length += length
+            for term, count in counts.items():
+                entries = postings.get(term)
+                if entries is None:
+                    entries = postings[term] = array('I')
+                entries.append(index)
+                entries.append(count)
+
+        self._postings = postings
+        self._avg_length = total_length / len(self._offsets) if self._offsets else 0.0
+        self._norms = array('d', (K1 * (1 - B + B * length / self._avg_length) for length in self._lengths))
+        self.load_ms = round((time.perf_counter() - started) * 1000, 2)
+        logger.info("Indexed %s knowledge base entries (%s terms) in %s ms",
+                    len(self._offsets), len(postings), self.load_ms)
+
+    def entry(self, index):
+        """The entry at an index, decoded from the data file."""
+        offset = self._offsets[index]
+        end = self._data.find(b'\n', offset)
+        return json.loads(self._data[offset:end if end >= 0 else len(self._data)])
+
+    def search(self, query, limit=3):
+        """
+        Rank entries for a query.
+
+        Args:
+            query (str): Free text
+            limit (int): Most results returned
+
+        Returns:
+            list: (score, entry) tuples, best first
+        """
+        terms = set(tokenize(query))
+        return [(round(score, 3), self.entry(index)) for index, score in self._rank(terms, limit)]
+
+    def _rank(self, terms, limit):
+        """(entry index, score) of the best entries for a set of terms."""
+        self._ensure_loaded()
+        count = len(self._offsets)
+        if not count or not terms:
+            return []
+        scores = {}
+        norms = self._norms
+        for term in terms:
+            entries = self._postings.get(term)
+            if entries is None:
+                continue
+            matches = len(entries) // 2
+            weight = math.log(1 + (count - matches + 0.5) / (matches + 0.5)) * (K1 + 1)
+            for index, frequency in zip(entries[::2], entries[1::2]):
+                scores[index] = scores.get(index, 0.0) + weight * frequency / (frequency + norms[index])
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def answer(self, query):
+        """Text of the best entry for a query, or None if no entry is a confident match."""
+        self.queries += 1
+        terms = set(tokenize(query))
+        best = self._rank(terms, 1)
+        if not best or best[0][1] < self.min_score:
+            return None
+        entry = self.entry(best[0][0])
+        entry_terms = set(tokenize(f"{entry.get('title', '')} {' '.join(entry.get('keywords', ()))} {entry['text']}"))
+        unknown = sum(1 for term in terms if term not in self._postings)
+        if len(terms & entry_terms) < (len(terms) + unknown) * self.min_coverage:
+            return None
+        self.answered += 1
+        return entry['text']
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._offsets)
+
+    def stats(self):
+        """Counters for /api/status; does not trigger loading."""
+        return {
+            'loaded': self.loaded,
+            'entries': len(self._offsets),
+            'terms': len(self._postings),
+            'load_ms': self.load_ms,
+            'queries': self.queries,
+            'answered': self.answered,
+        }
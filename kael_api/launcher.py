@@ -0,0 +1,372 @@
+"""
+Production launcher for the KAEL API.
+
+    python -m kael_api.launcher server:app --bind 0.0.0.0:5000 --workers 4 --threads 8
+
+The master process binds the listening socket once and pre-forks worker
+processes that all accept from it. Each worker imports the application
+itself and serves it from a fixed-size thread pool, without the Flask
+reloader or debugger. The master restarts workers that exit, so a worker
+that reaches --max-requests simply finishes its in-flight requests, exits
+and is replaced by a fresh one.
+
+Signals sent to the master:
+
+    SIGHUP           graceful reload: start a new generation of workers
+                     (importing the code afresh), then let the old ones
+                     finish their in-flight requests and exit
+    SIGTERM, SIGINT  graceful shutdown
+    SIGUSR2          toggle sampled profiling in every worker
+                     (see kael_api.profiling)
+
+Pre-forking needs os.fork(), so on Windows the launcher runs a single
+worker in the foreground instead.
+"""
+import argparse
+import importlib
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from kael_api.profiling import PROFILER
+
+logger = logging.getLogger('kael.launcher')
+
+# Idle seconds before a keep-alive connection gives its thread back
+KEEPALIVE_TIMEOUT = 5
+
+
+def load_app(target):
+    """Import an application given as "module:attribute"."""
+    module_name, _, attr = target.partition(':')
+    module = importlib.import_module(module_name)
+    return getattr(module, attr or 'app')
+
+
+def debug_warnings(app=None):
+    """
+    Startup self-check for debug settings that must not reach production.
+
+    Returns:
+        list: Human-readable warnings, empty when the configuration is safe
+    """
+    warnings = []
+    if os.getenv('FLASK_DEBUG', '').lower() in ('1', 'true', 'yes'):
+        warnings.append("FLASK_DEBUG is set; unset it in production")
+    if os.getenv('FLASK_ENV', '').lower() == 'development':
+        warnings.append("FLASK_ENV=development is set; unset it in production")
+    if app is not None and getattr(app, 'debug', False):
+        warnings.append("the application has debug mode enabled; it is switched off for this worker")
+    return warnings
+
+
+class KeepAliveHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        if self.raw_requestline:
+            self.server.count_request()
+        # Let a draining worker close kept-alive connections
+        if self.server.stopping:
+            self.close_connection = True
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    WSGI server for one worker: accepts from a shared socket and handles
+    connections on a bounded thread pool.
+
+    Args:
+        app: WSGI application
+        sock (socket.socket): Listening socket inherited from the master
+        threads (int): Size of the request thread pool
+        max_requests (int): Requests to serve before recycling, 0 for never
+    """
+
+    multithread = True
+
+    def __init__(self, app, sock, threads=8, max_requests=0):
+        host, port = sock.getsockname()[:2]
+        super().__init__(host, port, app, handler=KeepAliveHandler, fd=sock.fileno())
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='kael-worker')
+        self._slots = threading.BoundedSemaphore(threads)
+        self.max_requests = max_requests
+        self.served = 0
+        self._served_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    @property
+    def stopping(self):
+        return self._stopping.is_set()
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._handle, request, client_address)
+
+    def _handle_request_noblock(self):
+        # Only accept as many connections as there are free threads so
+        # that the rest stay queued in the shared socket for other workers
+        if not self._slots.acquire(timeout=0.5):
+            return
+        try:
+            request, client_address = self.get_request()
+        except OSError:
+            # Another worker accepted this connection first
+            self._slots.release()
+            return
+        try:
+            self.process_request(request, client_address)
+        except Exception:
+            self._slots.release()
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def count_request(self):
+        with self._served_lock:
+            self.served += 1
+            recycle = self.max_requests and self.served >= self.max_requests
+        if recycle and not self._stopping.is_set():
+            logger.info("Worker %s served %s requests, recycling", os.getpid(), self.served)
+            self.stop()
+
+    def stop(self):
+        """Stop accepting; serve_forever returns once the loop notices."""
+        if not self._stopping.is_set():
+            self._stopping.set()
+            threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def drain(self, timeout):
+        """Wait up to timeout seconds for in-flight requests to finish."""
+        waiter = threading.Thread(target=self._pool.shutdown, kwargs={'wait': True}, daemon=True)
+        waiter.start()
+        waiter.join(timeout)
+        return not waiter.is_alive()
+
+
+def run_worker(target, sock, threads, max_requests, graceful_timeout):
+    """Body of a worker process."""
+    app = load_app(target)
+    for warning in debug_warnings(app):
+        logger.warning("Worker %s: %s", os.getpid(), warning)
+    if getattr(app, 'debug', False):
+        app.debug = False
+
+    server = PooledWSGIServer(app, sock, threads=threads, max_requests=max_requests)
+
+    def handle_stop(signum, frame):
+        server.stop()
+
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    PROFILER.install_signal()
+
+    logger.info("Worker %s serving %s with %s threads", os.getpid(), target, threads)
+    try:
+        server.serve_forever()
+    finally:
+        if not server.drain(graceful_timeout):
+            logger.warning("Worker %s exiting with requests still in flight", os.getpid())
+
+
+class Master:
+    """
+    Pre-fork master process.
+
+    Args:
+        target (str): Application as "module:attribute"
+        sock (socket.socket): Bound, listening socket shared with workers
+        workers (int): Number of worker processes
+        threads (int): Request threads per worker
+        max_requests (int): Recycle a worker after this many requests
+        max_requests_jitter (int): Random extra requests per worker, so
+            workers do not all recycle at the same moment
+        graceful_timeout (float): Seconds workers get to finish in-flight
+            requests on reload or shutdown
+    """
+
+    def __init__(self, target, sock, workers=2, threads=8, max_requests=0,
+                 max_requests_jitter=0, graceful_timeout=30.0):
+        self.target = target
+        self.sock = sock
+        self.workers = workers
+        self.threads = threads
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.children = {}  # pid -> generation
+        self.generation = 0
+        self._reload = False
+        self._stopping = False
+
+    def spawn(self):
+        max_requests = self.max_requests
+        if max_requests and self.max_requests_jitter:
+            max_requests += random.randint(0, self.max_requests_jitter)
+
+        pid = os.fork()
+        if pid:
+            self.children[pid] = self.generation
+            return pid
+
+        # Child: restore default signal handling before serving
+        code = 0
+        try:
+            for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD, signal.SIGUSR2):
+                signal.signal(sig, signal.SIG_DFL)
+            random.seed()
+            run_worker(self.target, self.sock, self.threads, max_requests, self.graceful_timeout)
+        except Exception:
+            logger.exception("Worker %s crashed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+
+    def run(self):
+        signal.signal(signal.SIGHUP, self._on_reload)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGUSR2, self._on_profile)
+
+        for _ in range(self.workers):
+            self.spawn()
+        logger.info("Master %s started %s workers", os.getpid(), self.workers)
+
+        while not self._stopping:
+            if self._reload:
+                self._reload = False
+                self._do_reload()
+            self._reap()
+            current = sum(1 for gen in self.children.values() if gen == self.generation)
+            for _ in range(self.workers - current):
+                self.spawn()
+            time.sleep(0.2)
+
+        self._shutdown()
+
+    def _on_reload(self, signum, frame):
+        self._reload = True
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_profile(self, signum, frame):
+        for pid in list(self.children):
+            self._signal(pid, signal.SIGUSR2)
+
+    def _do_reload(self):
+        logger.info("Reloading: starting a new generation of workers")
+        old = [pid for pid, gen in self.children.items() if gen == self.generation]
+        self.generation += 1
+        for _ in range(self.workers):
+            self.spawn()
+        # New workers accept alongside the old ones; old ones now drain
+        for pid in old:
+            self._signal(pid, signal.SIGTERM)
+
+    def _reap(self):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            generation = self.children.pop(pid, None)
+            if generation == self.generation and not self._stopping:
+                code = os.waitstatus_to_exitcode(status) if hasattr(os, 'waitstatus_to_exitcode') else status
+                logger.info("Worker %s exited with status %s, replacing it", pid, code)
+
+    def _shutdown(self):
+        logger.info("Shutting down workers")
+        for pid in list(self.children):
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self.children):
+            self._signal(pid, signal.SIGKILL)
+        self.sock.close()
+
+    def _signal(self, pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            self.children.pop(pid, None)
+
+
+def bind_socket(bind, backlog=2048):
+    """Create the shared listening socket for "host:port"."""
+    host, _, port = bind.rpartition(':')
+    host = host.strip('[]') or '0.0.0.0'
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, int(port)))
+    sock.listen(backlog)
+    # Workers race to accept; the losers must not block in accept()
+    sock.setblocking(False)
+    sock.set_inheritable(True)
+    return sock
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the KAEL API with pre-forked worker processes")
+    parser.add_argument('app', nargs='?', default='server:app',
+                        help='application as module:attribute (default: server:app)')
+    parser.add_argument('--bind', default=os.getenv('KAEL_BIND', '0.0.0.0:5000'),
+                        help='host:port to listen on (default: 0.0.0.0:5000)')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('KAEL_WORKERS', '2')),
+                        help='worker processes (default: 2)')
+    parser.add_argument('--threads', type=int, default=int(os.getenv('KAEL_THREADS', '8')),
+                        help='request threads per worker (default: 8)')
+    parser.add_argument('--max-requests', type=int, default=int(os.getenv('KAEL_MAX_REQUESTS', '0')),
+                        help='recycle a worker after this many requests, 0 to disable')
+    parser.add_argument('--max-requests-jitter', type=int, default=int(os.getenv('KAEL_MAX_REQUESTS_JITTER', '0')),
+                        help='random extra requests added per worker to stagger recycling')
+    parser.add_argument('--graceful-timeout', type=float, default=float(os.getenv('KAEL_GRACEFUL_TIMEOUT', '30')),
+                        help='seconds workers get to finish in-flight requests (default: 30)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(process)d] %(levelname)s %(name)s: %(message)s')
+    sys.path.insert(0, os.getcwd())
+
+    for warning in debug_warnings():
+        logger.warning("Startup check: %s", warning)
+
+    sock = bind_socket(args.bind)
+    logger.info("Listening on http://%s", args.bind)
+
+    if not hasattr(os, 'fork'):
+        logger.warning("os.fork() is unavailable on this platform; running a single worker")
+        run_worker(args.app, sock, args.threads, 0, args.graceful_timeout)
+        return
+
+    Master(args.app, sock, workers=args.workers, threads=args.threads,
+           max_requests=args.max_requests, max_requests_jitter=args.max_requests_jitter,
+           graceful_timeout=args.graceful_timeout).run()
+
+
+if __name__ == '__main__':
+    main()
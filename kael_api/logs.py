@@ -0,0 +1,261 @@
+"""
+Structured, non-blocking logging for the KAEL servers.
+
+configure_logging() replaces logging.basicConfig in the server modules:
+
+- Records go onto a bounded queue and are written to stderr by a
+  background thread, so a request never waits on a slow terminal or pipe.
+  When the queue is full, records are dropped and counted instead of
+  blocking the caller.
+- Each record is written as one JSON object (or a plain text line) with
+  the ID of the request it was logged under; see install_request_ids().
+- Messages and tracebacks longer than max_chars are truncated.
+- Each logger is rate-limited by a token bucket. Records over the limit
+  are dropped, and the next record let through reports how many were
+  suppressed.
+
+Logging calls pass %-style arguments, so a record below the configured
+level or over the rate limit is never formatted.
+"""
+import atexit
+import contextvars
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+import threading
+import time
+import traceback
+import uuid
+
+_request_id = contextvars.ContextVar('kael_request_id', default=None)
+
+# Incoming X-Request-ID values are reused only if they look like IDs
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._:-]{1,64}$')
+
+
+def new_request_id(incoming=None):
+    """
+    Start a request's log context.
+
+    Args:
+        incoming (str): X-Request-ID sent by the client, reused if valid
+
+    Returns:
+        tuple: (request_id, token for reset_request_id)
+    """
+    request_id = incoming if incoming and _VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex[:16]
+    return request_id, _request_id.set(request_id)
+
+
+def reset_request_id(token):
+    _request_id.reset(token)
+
+
+def current_request_id():
+    """ID of the request being handled, or None outside a request."""
+    return _request_id.get()
+
+
+def install_request_ids(app):
+    """Give every Flask request an ID, logged with its records and returned as X-Request-ID."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_id():
+        g.kael_request_id, g.kael_request_token = new_request_id(request.headers.get('X-Request-ID'))
+
+    @app.after_request
+    def _send_request_id(response):
+        request_id = g.get('kael_request_id')
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+        return response
+
+    @app.teardown_request
+    def _end_request_id(exc):
+        token = g.pop('kael_request_token', None)
+        if token is not None:
+            reset_request_id(token)
+
+
+def truncate(text, max_chars):
+    if max_chars and len(text) > max_chars:
+        return f"{text[:max_chars]}... [{len(text) - max_chars} more chars]"
+    return text
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per logger name.
+
+    Args:
+        rate (float): Records per second each logger may sustain; 0 disables the limit
+        burst (int): Records a logger may emit at once after being quiet
+    """
+
+    def __init__(self, rate=50.0, burst=100):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.suppressed = 0
+        self._buckets = {}  # name -> [tokens, last refill, suppressed since last record]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(record.name)
+            if bucket is None:
+                bucket = self._buckets[record.name] = [float(self.burst), now, 0]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens < 1:
+                bucket[0] = tokens
+                bucket[2] += 1
+                self.suppressed += 1
+                return False
+            bucket[0] = tokens - 1
+            record.suppressed, bucket[2] = bucket[2], 0
+        return True
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks and does the minimum on the calling thread.
+
+    The message is rendered (its arguments may change once the call
+    returns), truncated and stamped with the request ID; JSON encoding and
+    the write happen on the listener thread.
+    """
+
+    def __init__(self, log_queue, max_chars=2000):
+        super().__init__(log_queue)
+        self.max_chars = max_chars
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = truncate(record.getMessage(), self.max_chars)
+        record.args = None
+        if record.exc_info:
+            # Tracebacks hold frames; render them here rather than pass them on
+            record.exc_text = truncate(''.join(traceback.format_exception(*record.exc_info)).rstrip(),
+                                       self.max_chars)
+            record.exc_info = None
+        record.request_id = _request_id.get()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'thread': record.threadName,
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain text lines with the request ID, for reading in a terminal."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        if not getattr(record, 'request_id', None):
+            record.request_id = '-'
+        line = super().format(record)
+        if getattr(record, 'suppressed', 0):
+            line += f" ({record.suppressed} earlier records suppressed)"
+        return line
+
+
+_pipeline = {}
+
+
+def configure_logging(level='INFO', fmt='json', max_chars=2000, rate=50.0, burst=100, queue_size=10000,
+                      stream=None):
+    """
+    Route all logging through the queue, rate limiter and structured formatter.
+
+    Replaces any handlers on the root logger, so it can be called again to
+    change settings.
+
+    Args:
+        level (str): Root log level name
+        fmt (str): 'json' or 'text'
+        max_chars (int): Longest message or traceback kept, 0 for no limit
+        rate (float): Records per second per logger, 0 for no limit
+        burst (int): Records a logger may emit at once
+        queue_size (int): Records buffered before new ones are dropped
+        stream: Where records are written, stderr by default
+
+    Returns:
+        AsyncQueueHandler: The handler installed on the root logger
+    """
+    stop_logging()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(TextFormatter() if fmt == 'text' else JsonFormatter())
+    log_queue = queue.Queue(maxsize=queue_size)
+    handler = AsyncQueueHandler(log_queue, max_chars=max_chars)
+    rate_limit = RateLimitFilter(rate=rate, burst=burst)
+    handler.addFilter(rate_limit)
+    listener = logging.handlers.QueueListener(log_queue, output)
+    listener.start()
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+    _pipeline.update(handler=handler, listener=listener, rate_limit=rate_limit)
+    return handler
+
+
+def stop_logging():
+    """Write out queued records and stop the listener thread."""
+    listener = _pipeline.pop('listener', None)
+    if listener is not None:
+        listener.stop()
+
+
+atexit.register(stop_logging)
+
+
+def logging_stats():
+    """Counters for /api/status, or None if configure_logging() was not called."""
+    handler = _pipeline.get('handler')
+    if handler is None:
+        return None
+    return {
+        'queued': handler.queue.qsize(),
+        'dropped': handler.dropped,
+        'suppressed': _pipeline['rate_limit'].suppressed,
+    }
@@ -0,0 +1,445 @@
+"""
+Request, intent and upstream metrics for the KAEL API.
+
+Instrumented code records into the labelled families defined at the
+bottom of this module:
+
+    kael_http_request_duration_seconds{route,method}   histogram
+    kael_http_requests_total{route,method,status}      counter
+    kael_http_requests_in_flight{route}                gauge
+    kael_intent_duration_seconds{intent}               histogram
+    kael_upstream_request_duration_seconds{upstream,status}  histogram
+
+State owned elsewhere (caches, speech queue, connection pools) is read at
+scrape time by collectors the server module registers. REGISTRY.render()
+produces the Prometheus text exposition format served at /api/metrics.
+
+Each histogram also keeps a window of its most recent observations, from
+which summary() reports p50/p95/p99 for /api/status.
+"""
+import os
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from kael_api.breaker import CLOSED, HALF_OPEN, OPEN, breaker_stats
+from kael_api.logs import logging_stats
+
+# Seconds; Gemini answers can take tens of seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Recent observations kept per series for percentiles
+WINDOW = 512
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+BREAKER_STATES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+
+class Counter:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge(Counter):
+    __slots__ = ()
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with a ring buffer of recent samples.
+
+    Args:
+        buckets (tuple): Ascending upper bounds, in seconds
+        window (int): Recent observations kept for percentiles
+    """
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_recent', '_next', '_lock')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=WINDOW):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._recent = array('d', bytes(8 * window))
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+            self._recent[self._next % len(self._recent)] = seconds
+            self._next += 1
+
+    def percentiles(self, quantiles=(0.5, 0.95, 0.99)):
+        """Percentiles in milliseconds over the recent window."""
+        with self._lock:
+            samples = sorted(self._recent[:min(self._next, len(self._recent))])
+        if not samples:
+            return {f'p{int(q * 100)}_ms': None for q in quantiles}
+        return {f'p{int(q * 100)}_ms': round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 2)
+                for q in quantiles}
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class Family:
+    """A named metric with one child per combination of label values."""
+
+    def __init__(self, name, help, kind, labels, factory):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labels)
+        self._factory = factory
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._factory())
+        return child
+
+    def children(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class Registry:
+    """The metric families and scrape-time collectors of one process."""
+
+    def __init__(self):
+        self._families = {}
+        self._collectors = []
+
+    def _add(self, family):
+        self._families[family.name] = family
+        return family
+
+    def counter(self, name, help, labels=()):
+        return self._add(Family(name, help, 'counter', labels, Counter))
+
+    def gauge(self, name, help, labels=()):
+        return self._add(Family(name, help, 'gauge', labels, Gauge))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Family(name, help, 'histogram', labels, lambda: Histogram(buckets)))
+
+    def register_collector(self, collector):
+        """
+        Add a callable run at scrape time.
+
+        The collector returns an iterable of (name, kind, help, labels,
+        value) tuples, where labels is a dict and kind is 'gauge' or
+        'counter'.
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for family in list(self._families.values()):
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for values, child in family.children():
+                labels = dict(zip(family.labelnames, values))
+                if family.kind == 'histogram':
+                    counts, total, count = child.snapshot()
+                    cumulative = 0
+                    for bound, bucket in zip(child.buckets + (float('inf'),), counts):
+                        cumulative += bucket
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(_sample(family.name + '_bucket', dict(labels, le=le), cumulative))
+                    lines.append(_sample(family.name + '_sum', labels, total))
+                    lines.append(_sample(family.name + '_count', labels, count))
+                else:
+                    lines.append(_sample(family.name, labels, child.value))
+
+        # The exposition format wants each metric's samples together
+        collected = {}
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception:
+                continue
+            for name, kind, help, labels, value in samples:
+                if value is not None:
+                    collected.setdefault(name, (kind, help, []))[2].append(_sample(name, labels, value))
+        for name, (kind, help, samples) in collected.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _sample(name, labels, value):
+    if isinstance(value, bool):
+        value = int(value)
+    if labels:
+        rendered = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+        return f"{name}{{{rendered}}} {value}"
+    return f"{name} {value}"
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    'kael_http_request_duration_seconds', 'Time to produce an API response', ('route', 'method'))
+REQUESTS = REGISTRY.counter(
+    'kael_http_requests_total', 'API responses by status code', ('route', 'method', 'status'))
+IN_FLIGHT = REGISTRY.gauge(
+    'kael_http_requests_in_flight', 'API requests currently being handled', ('route',))
+INTENT_LATENCY = REGISTRY.histogram(
+    'kael_intent_duration_seconds', 'Time to answer a command, by intent', ('intent',))
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    'kael_upstream_request_duration_seconds', 'Outbound calls by upstream and HTTP status', ('upstream', 'status'))
+RACE_LATENCY = REGISTRY.histogram(
+    'kael_race_duration_seconds', 'Speculative answers by the path that won, none if the budget ran out', ('winner',))
+
+
+def observe_request(route, method, status, seconds):
+    REQUEST_LATENCY.labels(route, method).observe(seconds)
+    REQUESTS.labels(route, method, status).inc()
+
+
+def observe_intent(intent, seconds):
+    INTENT_LATENCY.labels(intent).observe(seconds)
+
+
+def observe_upstream(upstream, status, seconds):
+    UPSTREAM_LATENCY.labels(upstream, status).observe(seconds)
+
+
+def observe_race(winner, seconds):
+    RACE_LATENCY.labels(winner or 'none').observe(seconds)
+
+
+def summary(family):
+    """Count and p50/p95/p99 per series of a histogram family, for /api/status."""
+    result = {}
+    for values, child in family.children():
+        entry = {'count': child.count}
+        entry.update(child.percentiles())
+        result[' '.join(values)] = entry
+    return result
+
+
+class CpuSampler:
+    """
+    CPU use of this process over a fixed window, sampled on a background thread.
+
+    Measuring from one caller to the next would make the figure depend on
+    who else asked in between, so the sampler takes its own readings every
+    interval seconds and reports the use over the last one. Scrapers should
+    prefer the process_cpu_seconds_total counter and compute the rate.
+
+    Args:
+        interval (float): Seconds in each window
+    """
+
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self.percent = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='kael-cpu', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        wall, cpu = time.monotonic(), time.process_time()
+        while True:
+            time.sleep(self.interval)
+            now, used = time.monotonic(), time.process_time()
+            self.percent = round(100.0 * (used - cpu) / (now - wall), 1)
+            wall, cpu = now, used
+
+
+CPU = CpuSampler()
+
+
+def process_stats():
+    """CPU use of this process over the last sampling window, and its resident memory."""
+    # Started on first use, so importing the module starts no thread
+    CPU.start()
+    return {
+        'cpu_percent': CPU.percent,
+        'cpu_window_s': CPU.interval,
+        'cpu_seconds': round(time.process_time(), 3),
+        'resident_bytes': _resident_bytes(),
+    }
+
+
+def _resident_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # No /proc: fall back to the peak, reported in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def instrument_flask(app):
+    """Record latency, status and in-flight counts for every Flask request."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.kael_started = time.perf_counter()
+        g.kael_route = request.url_rule.rule if request.url_rule else 'unmatched'
+        IN_FLIGHT.labels(g.kael_route).inc()
+
+    @app.after_request
+    def _record(response):
+        started = g.pop('kael_started', None)
+        if started is not None:
+            observe_request(g.kael_route, request.method, response.status_code, time.perf_counter() - started)
+            IN_FLIGHT.labels(g.kael_route).dec()
+        return response
+
+    @app.teardown_request
+    def _record_failure(exc):
+        # after_request is skipped when a handler raised
+        started = g.pop('kael_started', None)
+        if started is not None:
+            observe_request(g.kael_route, request.method, 500, time.perf_counter() - started)
+            IN_FLIGHT.labels(g.kael_route).dec()
+
+
+def latency_summary():
+    """Latency percentiles by route, intent, upstream and race winner, for /api/status."""
+    return {
+        'routes': summary(REQUEST_LATENCY),
+        'intents': summary(INTENT_LATENCY),
+        'upstreams': summary(UPSTREAM_LATENCY),
+        'races': summary(RACE_LATENCY),
+    }
+
+
+def server_collector(caches, speech=None, client=None, flight=None, admission=None, sessions=None):
+    """
+    Collector for the state a server module owns.
+
+    Args:
+        caches (dict): Cache name to TTLCache or PromptCache
+        speech (SpeechWorker): Speech queue, if text-to-speech is available
+        client (HttpClient): Outbound client whose pools to report
+        flight (SingleFlight): Coalescing group to report
+        admission (AdmissionControl): Rate limits and concurrency cap to report
+        sessions (SessionStore): Conversation sessions to report
+    """
+    def collect():
+        for name, cache in caches.items():
+            stats = cache.stats()
+            labels = {'cache': name}
+            yield 'kael_cache_hits_total', 'counter', 'Cache lookups answered from the cache', labels, stats['hits']
+            yield 'kael_cache_misses_total', 'counter', 'Cache lookups that missed', labels, stats['misses']
+            yield 'kael_cache_hit_ratio', 'gauge', 'Hits over lookups since start', labels, stats['hit_ratio']
+            yield 'kael_cache_entries', 'gauge', 'Entries held in memory', labels, stats['entries']
+            yield 'kael_cache_bytes', 'gauge', 'Approximate memory held by entries', labels, stats['bytes']
+            yield 'kael_cache_evictions_total', 'counter', 'Entries evicted to stay in budget', labels, stats['evictions']
+        if speech is not None:
+            stats = speech.stats()
+            yield 'kael_tts_queue_depth', 'gauge', 'Utterances waiting to be spoken', {}, stats['queue_depth']
+            yield 'kael_tts_speaking', 'gauge', 'Whether an utterance is being spoken', {}, stats['speaking']
+            for outcome in ('spoken', 'dropped', 'coalesced', 'interrupted', 'failed'):
+                yield 'kael_tts_utterances_total', 'counter', 'Utterances by outcome', \
+                    {'outcome': outcome}, stats[outcome]
+        if client is not None:
+            stats = client.stats()
+            for host, pool in stats['hosts'].items():
+                labels = {'host': host}
+                yield 'kael_upstream_pool_idle_connections', 'gauge', 'Idle keep-alive connections', \
+                    labels, pool['idle']
+                yield 'kael_upstream_connections_opened_total', 'counter', 'Connections opened', \
+                    labels, pool['connections_opened']
+            yield 'kael_upstream_retries_total', 'counter', 'Upstream retry attempts', {}, stats['retries']
+        if flight is not None:
+            stats = flight.stats()
+            yield 'kael_upstream_coalesced_total', 'counter', 'Calls that shared an identical in-flight call', \
+                {}, stats['coalesced_waiters']
+            yield 'kael_upstream_calls_in_flight', 'gauge', 'Distinct upstream calls in flight', \
+                {}, stats['in_flight']
+        if admission is not None:
+            stats = admission.stats()
+            for route, limit in stats['rate_limits']['routes'].items():
+                labels = {'route': route}
+                yield 'kael_admission_allowed_total', 'counter', 'Requests within the rate limit', \
+                    labels, limit['allowed']
+                yield 'kael_admission_rate_limited_total', 'counter', 'Requests refused with 429', \
+                    labels, limit['limited']
+            concurrency = stats['concurrency']
+            yield 'kael_admission_active', 'gauge', 'Controlled requests being handled', {}, concurrency['active']
+            yield 'kael_admission_waiting', 'gauge', 'Requests waiting for a slot', {}, concurrency['waiting']
+            yield 'kael_admission_queued_total', 'counter', 'Requests that had to wait for a slot', \
+                {}, concurrency['queued']
+            for reason in ('queue_full', 'timeout'):
+                yield 'kael_admission_shed_total', 'counter', 'Requests refused with 503', \
+                    {'reason': reason}, concurrency[f'shed_{reason}']
+        if sessions is not None:
+            stats = sessions.stats()
+            yield 'kael_sessions', 'gauge', 'Conversation sessions held', {}, stats['sessions']
+            yield 'kael_session_bytes', 'gauge', 'Approximate memory held by sessions', {}, stats['bytes']
+            yield 'kael_session_evictions_total', 'counter', 'Sessions dropped to stay in budget', \
+                {}, stats['evictions']
+        for name, stats in breaker_stats().items():
+            labels = {'upstream': name}
+            yield 'kael_upstream_breaker_state', 'gauge', 'Circuit breaker state: 0 closed, 1 open, 2 half-open', \
+                labels, BREAKER_STATES[stats['state']]
+            yield 'kael_upstream_short_circuited_total', 'counter', 'Calls refused while the breaker was open', \
+                labels, stats['short_circuited']
+            yield 'kael_upstream_breaker_opened_total', 'counter', 'Times the breaker opened', \
+                labels, stats['times_opened']
+        stats = logging_stats()
+        if stats is not None:
+            yield 'kael_log_queue_depth', 'gauge', 'Log records waiting to be written', {}, stats['queued']
+            yield 'kael_log_records_dropped_total', 'counter', 'Log records dropped on a full queue', \
+                {}, stats['dropped']
+            yield 'kael_log_records_suppressed_total', 'counter', 'Log records over the rate limit', \
+                {}, stats['suppressed']
+        # Standard Prometheus process metric names, so existing dashboards and
+        # rate() work; CPU is a counter and the scraper computes the rate
+        yield 'process_cpu_seconds_total', 'counter', 'Total user and system CPU time spent in seconds', \
+            {}, round(time.process_time(), 3)
+        yield 'process_resident_memory_bytes', 'gauge', 'Resident memory size in bytes', \
+            {}, _resident_bytes()
+    return collect
@@ -0,0 +1,381 @@
+"""
+News headlines ingested in the background and served from an in-memory index.
+
+A NewsSource returns the headlines it has now. fetch() may be an exchange
+(see kael_api.upstream) or return them directly. NewsFeed pulls from
+a source on a background thread every refresh_interval seconds. It merges
+new headlines into what it holds, dropping duplicates: two headlines are
+the same story when their titles match once normalized. It keeps the
+newest max_items, and after each refresh swaps in a NewsIndex holding the
+newest per_topic headlines of each topic and of all topics together.
+Answering "news about X" slices a tuple that is already sorted, so it costs
+the same however many headlines are held, and never waits on the source.
+
+Reads are stale-while-revalidate. A read that finds the headlines older
+than max_age is still answered from them, and wakes the worker to
+refresh at once, at most once every retry_interval seconds. With
+refresh_interval 0 the worker refreshes only when woken like this. A
+refresh that fails keeps the headlines already held.
+
+Sources:
+
+    NewsFile   A JSON Lines file of {"title", "topic"} objects, with
+               optional "published" (ISO 8601) and "url". It is read again
+               when it changes. Headlines without a published time count as
+               published when the file last changed, in file order, newest
+               first.
+    RssFeeds   RSS 2.0 feeds, one per topic.
+"""
+import datetime
+import email.utils
+import json
+import logging
+import os
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+
+from kael_api.cache import normalize_key
+from kael_api.upstream import UpstreamRequest, run_sync
+
+logger = logging.getLogger(__name__)
+
+# Topic of headlines that do not name one
+GENERAL = 'general'
+
+
+class NewsError(Exception):
+    """A source could not provide headlines."""
+
+
+class NewsItem:
+    """
+    One headline.
+
+    Args:
+        title (str): The headline
+        topic (str): Lowercase topic, such as "technology"
+        published (float): Unix time it was published
+        url (str): Link to the story, if any
+        source (str): Name of the source it came from
+    """
+
+    __slots__ = ('key', 'title', 'topic', 'published', 'url', 'source')
+
+    def __init__(self, title, topic=GENERAL, published=None, url=None, source=None):
+        self.title = title.strip()
+        self.key = normalize_key(self.title)
+        self.topic = (topic or GENERAL).strip().lower()
+        self.published = published if published is not None else time.time()
+        self.url = url
+        self.source = source
+
+    def to_dict(self):
+        return {
+            'title': self.title,
+            'topic': self.topic,
+            'published': datetime.datetime.fromtimestamp(self.published).isoformat(),
+            'url': self.url,
+            'source': self.source,
+        }
+
+
+def parse_published(text):
+    """Unix time of an ISO 8601 or RFC 2822 date, or None."""
+    if not text:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        pass
+    try:
+        return email.utils.parsedate_to_datetime(text).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class NewsSource:
+    """Where headlines come from."""
+
+    name = 'source'
+
+    def fetch(self):
+        """
+        The headlines the source has now.
+
+        Returns:
+            list: NewsItem objects
+
+        Raises:
+            NewsError: If the source cannot be read
+        """
+        raise NotImplementedError
+
+
+class NewsFile(NewsSource):
+    """Headlines from a JSON Lines file, read again when it changes."""
+
+    name = 'file'
+
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self._items = []
+
+    def fetch(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if mtime != self._mtime:
+                self._items = self._read(mtime)
+                self._mtime = mtime
+        except (OSError, ValueError) as e:
+            raise NewsError(f"Cannot read {self.path}: {e}")
+        return self._items
+
+    def _read(self, mtime):
+        items = []
+        with open(self.path, encoding='utf-8') as f:
+            for number, line in enumerate(f):
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                if not isinstance(entry, dict) or not isinstance(entry.get('title'), str):
+                    raise ValueError(f"line {number + 1} has no title")
+                published = parse_published(entry.get('published'))
+                items.append(NewsItem(entry['title'], entry.get('topic'),
+                                      published if published is not None else mtime - number,
+                                      entry.get('url'), self.name))
+        return items
+
+
+class RssFeeds(NewsSource):
+    """
+    Headlines from RSS 2.0 feeds.
+
+    Args:
+        feeds (list): (topic, URL) pairs
+    """
+
+    name = 'rss'
+
+    def __init__(self, feeds):
+        self.feeds = list(feeds)
+
+    @staticmethod
+    def parse(text):
+        """(topic, URL) pairs from "topic=URL,topic=URL" text."""
+        feeds = []
+        for part in text.split(','):
+            if part.strip():
+                topic, _, url = part.partition('=')
+                if not url:
+                    raise ValueError(f"News feed {part.strip()!r} is not topic=URL")
+                feeds.append((topic.strip().lower(), url.strip()))
+        return feeds
+
+    def fetch(self):
+        items = []
+        failed = []
+        for topic, url in self.feeds:
+            try:
+                response = yield UpstreamRequest('GET', url, name='news')
+                if response.status_code != 200:
+                    raise NewsError(f"status {response.status_code}")
+                root = ElementTree.fromstring(response.text)
+            except Exception as e:
+                # The other feeds still count; this one keeps what it had
+                logger.warning("News feed %s failed: %s", url, e)
+                failed.append(url)
+                continue
+            for entry in root.iter('item'):
+                title = entry.findtext('title')
+                if title and title.strip():
+                    items.append(NewsItem(title, topic, parse_published(entry.findtext('pubDate')),
+                                          entry.findtext('link'), self.name))
+        if failed and len(failed) == len(self.feeds):
+            raise NewsError(f"All {len(failed)} news feeds failed")
+        return items
+
+
+class NewsIndex:
+    """
+    The newest headlines by topic, built once per refresh and never changed.
+
+    Args:
+        items (iterable): NewsItem objects
+        per_topic (int): Headlines kept for each topic and for all together
+    """
+
+    __slots__ = ('by_topic', 'recent', 'count')
+
+    def __init__(self, items=(), per_topic=20):
+        newest = sorted(items, key=lambda item: item.published, reverse=True)
+        by_topic = {}
+        for item in newest:
+            headlines = by_topic.setdefault(item.topic, [])
+            if len(headlines) < per_topic:
+                headlines.append(item)
+        self.by_topic = {topic: tuple(headlines) for topic, headlines in by_topic.items()}
+        self.recent = tuple(newest[:per_topic])
+        self.count = len(newest)
+
+    def topic_for(self, text):
+        """
+        The indexed topic a request names, or None.
+
+        A word names a topic when it is the topic or, from four letters
+        on, the start of it, so "tech" names "technology".
+        """
+        for word in normalize_key(text or '').split():
+            for topic in self.by_topic:
+                if word == topic or (len(word) >= 4 and topic.startswith(word)):
+                    return topic
+        return None
+
+    def latest(self, topic=None, count=3):
+        """The count newest headlines of a topic, or of all topics for None or an unknown topic."""
+        return self.by_topic.get(topic, self.recent)[:count]
+
+
+class NewsFeed:
+    """
+    Headlines from a source, refreshed on a background thread and served from a NewsIndex.
+
+    Args:
+        source (NewsSource): Where headlines come from
+        client: HttpClient to drive the source with
+        refresh_interval (float): Seconds between refreshes; 0 refreshes
+            only when a read finds the headlines stale
+        max_age (float): Age in seconds past which a read asks for a
+            refresh; refresh_interval by default
+        retry_interval (float): Fewest seconds between refreshes asked for by reads
+        max_items (int): Most headlines held; the oldest go first
+        per_topic (int): Headlines indexed per topic
+    """
+
+    def __init__(self, source, client, refresh_interval=300.0, max_age=None, retry_interval=30.0,
+                 max_items=500, per_topic=20):
+        self.source = source
+        self.client = client
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age if max_age is not None else (refresh_interval or 300.0)
+        self.retry_interval = retry_interval
+        self.max_items = max_items
+        self.per_topic = per_topic
+        self.index = NewsIndex(per_topic=per_topic)
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.duplicates = 0
+        self.stale_reads = 0
+        self.refreshed_at = None
+        self._items = {}  # normalized title -> NewsItem, written only by refresh()
+        self._refreshed = None  # monotonic time of the last successful refresh
+        self._attempted = None
+        self._wake = threading.Event()
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Refresh on a background thread, the first time at once."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='kael-news', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self.refresh()
+            self._wake.wait(self.refresh_interval if self.refresh_interval > 0 else None)
+            self._wake.clear()
+
+    def refresh(self):
+        """
+        Fetch from the source and swap in a new index, in this thread.
+
+        Returns:
+            bool: Whether the source answered
+        """
+        with self._refresh_lock:
+            self._attempted = time.monotonic()
+            try:
+                fetched = run_sync(self.source.fetch(), self.client)
+            except Exception as e:
+                self.refresh_errors += 1
+                logger.warning("Keeping the current news headlines: %s", e)
+                return False
+            added = 0
+            for item in fetched:
+                held = self._items.get(item.key)
+                if held is None:
+                    self._items[item.key] = item
+                    added += 1
+                else:
+                    self.duplicates += 1
+                    # The same story again: keep its first publication time
+                    if item.published < held.published:
+                        self._items[item.key] = item
+            if len(self._items) > self.max_items:
+                newest = sorted(self._items.values(), key=lambda item: item.published, reverse=True)
+                self._items = {item.key: item for item in newest[:self.max_items]}
+            # Swapped in whole, so a read never sees half a refresh
+            self.index = NewsIndex(self._items.values(), self.per_topic)
+            self._refreshed = time.monotonic()
+            self.refreshed_at = datetime.datetime.now().isoformat()
+            self.refreshes += 1
+            if added:
+                logger.info("Ingested %s new headlines from %s (%s held)", added, self.source.name, len(self._items))
+            return True
+
+    def age(self):
+        """Seconds since the last successful refresh, or None before the first."""
+        return time.monotonic() - self._refreshed if self._refreshed is not None else None
+
+    def headlines(self, topic=None, count=3):
+        """
+        The newest headlines, as they are now; asks for a refresh if they are stale.
+
+        Args:
+            topic (str): Topic, as from NewsIndex.topic_for, or None for all
+            count (int): Most headlines returned
+
+        Returns:
+            tuple: NewsItem objects, newest first
+        """
+        index = self.index
+        age = self.age()
+        if age is None or age > self.max_age:
+            self.stale_reads += 1
+            self.revalidate()
+        return index.latest(topic, count)
+
+    def revalidate(self):
+        """Wake the worker to refresh now, unless it tried within retry_interval."""
+        if self._thread is None or self._wake.is_set():
+            return
+        if self._attempted is not None and time.monotonic() - self._attempted < self.retry_interval:
+            return
+        self._wake.set()
+
+    def stats(self):
+        index = self.index
+        age = self.age()
+        return {
+            'source': self.source.name,
+            'items': index.count,
+            'topics': {topic: len(items) for topic, items in index.by_topic.items()},
+            'refreshes': self.refreshes,
+            'refresh_errors': self.refresh_errors,
+            'duplicates': self.duplicates,
+            'stale_reads': self.stale_reads,
+            'refreshed_at': self.refreshed_at,
+            'age_s': round(age, 1) if age is not None else None,
+        }
+
+    def collect(self):
+        yield 'kael_news_items', 'gauge', 'Headlines held in the news index', {}, self.index.count
+        age = self.age()
+        if age is not None:
+            yield 'kael_news_age_seconds', 'gauge', 'Seconds since the news headlines were last refreshed', \
+                {}, round(age, 1)
+        yield 'kael_news_refresh_errors_total', 'counter', 'News refreshes that failed', {}, self.refresh_errors
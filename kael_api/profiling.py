@@ -0,0 +1,253 @@
+"""
+Sampled per-stage profiling of command handling, switched on at runtime.
+
+process_command and execute_command are divided into named spans (JSON
+parsing, intent matching, the intent handler, upstream HTTP, JSON
+encoding, logging, speech). While profiling is enabled, a sampled
+fraction of requests record how long each span took, excluding time spent
+in nested spans, and the totals are aggregated by span stack. dump()
+writes them as a collapsed-stack file, one "outer;inner;leaf microseconds"
+line per stack, which flamegraph.pl, speedscope and inferno read directly.
+
+While profiling is disabled, request() and span() return a shared no-op
+context manager after a single attribute or context variable check.
+
+Turn it on with POST /api/admin/profile, with SIGUSR2 (toggles, and dumps
+on the way off) or at startup from the environment:
+
+    KAEL_PROFILE       'true' to start enabled
+    KAEL_PROFILE_RATE  fraction of requests sampled (default 0.1)
+    KAEL_PROFILE_DIR   where dumps are written (default ./profiles)
+"""
+import contextvars
+import functools
+import logging
+import os
+import random
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('kael_profile_span', default=None)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """
+    A timed stage of a sampled request, linked to the span it is nested in.
+
+    The innermost open span is the context variable's value. Tasks copy the
+    context when they are created, so concurrent tasks (race candidates,
+    batch commands) each nest their own spans under the span that started
+    them instead of sharing one stack.
+    """
+
+    __slots__ = ('profiler', 'parent', 'path', 'started', 'children')
+
+    def __init__(self, profiler, parent, name):
+        self.profiler = profiler
+        self.parent = parent
+        self.path = f"{parent.path};{name}" if parent is not None else name
+        self.children = 0.0  # time in nested spans
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        _current.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        # Spans opened in an exchange generator can be closed late, when the
+        # generator is finalized; only a context still inside this span
+        # moves back out to its parent
+        frame = _current.get()
+        while frame is not None and frame is not self:
+            frame = frame.parent
+        if frame is self:
+            _current.set(self.parent)
+        # Concurrent children can add up to more than this span took
+        self.profiler.record(self.path, max(0.0, elapsed - self.children))
+        if self.parent is not None:
+            self.parent.children += elapsed
+        return False
+
+
+class Profiler:
+    """
+    Aggregates span timings of sampled requests.
+
+    Args:
+        sample_rate (float): Fraction of requests to trace while enabled
+        output_dir (str): Directory dump() writes collapsed-stack files to
+    """
+
+    def __init__(self, sample_rate=0.1, output_dir='profiles'):
+        self.enabled = False
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self._lock = threading.Lock()
+        self._stacks = {}
+        self.sampled = 0
+        self.dumps = 0
+        self.last_dump = None
+
+    @classmethod
+    def from_env(cls):
+        profiler = cls(sample_rate=float(os.getenv('KAEL_PROFILE_RATE', '0.1')),
+                       output_dir=os.getenv('KAEL_PROFILE_DIR', 'profiles'))
+        profiler.enabled = os.getenv('KAEL_PROFILE', 'false').lower() == 'true'
+        return profiler
+
+    def request(self, name):
+        """Root span for a request; traced only if profiling is on and it is sampled."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return NULL_SPAN
+        with self._lock:
+            self.sampled += 1
+        return _Span(self, None, name)
+
+    def span(self, name):
+        """Nested span inside the current request, a no-op if it is not traced."""
+        parent = _current.get()
+        if parent is None:
+            return NULL_SPAN
+        return _Span(parent.profiler, parent, name)
+
+    def profiled(self, name):
+        """Decorator making each call of the function a request() root span."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.request(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def record(self, path, seconds):
+        with self._lock:
+            self._stacks[path] = self._stacks.get(path, 0.0) + seconds
+
+    def configure(self, enabled=None, sample_rate=None):
+        """Switch profiling on or off and set the sampling rate; dumps when switched off."""
+        if sample_rate is not None:
+            if not 0.0 <= sample_rate <= 1.0:
+                raise ValueError('sample_rate must be between 0 and 1')
+            self.sample_rate = sample_rate
+        if enabled is not None and enabled != self.enabled:
+            self.enabled = enabled
+            logger.info("Profiling %s (sampling %.0f%% of requests)",
+                        'enabled' if enabled else 'disabled', self.sample_rate * 100)
+            if not enabled:
+                self.dump()
+        return self.state()
+
+    def apply(self, data):
+        """
+        Apply a POST /api/admin/profile body.
+
+        Args:
+            data (dict): Optional 'enabled' (bool), 'sample_rate' (0 to 1)
+                and 'dump' (bool, write the stacks gathered so far)
+
+        Returns:
+            dict: The resulting state(), with 'dumped' naming any file written
+
+        Raises:
+            ValueError: If a field has the wrong type or range
+        """
+        data = data or {}
+        enabled = data.get('enabled')
+        if enabled is not None and not isinstance(enabled, bool):
+            raise ValueError('enabled must be true or false')
+        sample_rate = data.get('sample_rate')
+        if sample_rate is not None:
+            try:
+                sample_rate = float(sample_rate)
+            except (TypeError, ValueError):
+                raise ValueError('sample_rate must be a number')
+        self.configure(enabled=enabled, sample_rate=sample_rate)
+        dumped = self.dump() if data.get('dump') else None
+        state = self.state()
+        state['dumped'] = dumped
+        return state
+
+    def dump(self):
+        """
+        Write the aggregated stacks to a collapsed-stack file and reset them.
+
+        Returns:
+            str: Path of the file written, or None if nothing was recorded
+        """
+        with self._lock:
+            stacks, self._stacks = self._stacks, {}
+        if not stacks:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.dumps += 1
+        path = os.path.join(self.output_dir,
+                            f"kael-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}-{self.dumps}.folded")
+        with open(path, 'w') as f:
+            for stack, seconds in sorted(stacks.items()):
+                f.write(f"{stack} {max(1, round(seconds * 1_000_000))}\n")
+        self.last_dump = path
+        logger.info("Wrote profile of %s stacks to %s", len(stacks), path)
+        return path
+
+    def state(self):
+        """Settings and counters for the admin endpoint."""
+        with self._lock:
+            stacks = len(self._stacks)
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'sampled_requests': self.sampled,
+            'pending_stacks': stacks,
+            'output_dir': os.path.abspath(self.output_dir),
+            'last_dump': self.last_dump,
+        }
+
+    def install_signal(self, signum=getattr(signal, 'SIGUSR2', None)):
+        """Toggle profiling on a signal (SIGUSR2 by default, where available)."""
+        if signum is None or threading.current_thread() is not threading.main_thread():
+            return False
+
+        toggled = threading.Event()
+
+        def toggle(signum, frame):
+            # Runs on the main thread, possibly in the middle of record()
+            # with the lock held: only flip the flag and leave the logging
+            # and the dump to the thread below
+            self.enabled = not self.enabled
+            toggled.set()
+
+        def react():
+            while True:
+                toggled.wait()
+                toggled.clear()
+                enabled = self.enabled
+                logger.info("Profiling %s by signal (sampling %.0f%% of requests)",
+                            'enabled' if enabled else 'disabled', self.sample_rate * 100)
+                if not enabled:
+                    self.dump()
+
+        threading.Thread(target=react, name='kael-profile-signal', daemon=True).start()
+        signal.signal(signum, toggle)
+        return True
+
+
+PROFILER = Profiler.from_env()
+span = PROFILER.span
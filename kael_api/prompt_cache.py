@@ -0,0 +1,207 @@
+"""
+Prompt-result cache in front of the Gemini API.
+
+Responses are keyed on the prompt together with the full generationConfig
+(temperature included), so a cached answer is only reused for an identical
+request. An optional normalized tier also matches prompts that differ only
+in case and whitespace. Entries live in a byte-bounded TTLCache and can be
+written through to a local SQLite file so the cache survives restarts.
+
+A miss in memory is looked up on disk, which also picks up answers other
+workers wrote. On an event loop that query would block every request, so
+the async serving mode calls load() instead: the disk tier is copied into
+memory once, lookups stay in memory, and writes go to disk from a
+background thread.
+"""
+import hashlib
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from kael_api.cache import TTLCache, normalize_key
+
+logger = logging.getLogger(__name__)
+
+
+def _digest(text, generation_config):
+    config = json.dumps(generation_config or {}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f"{config}\n{text}".encode('utf-8')).hexdigest()
+
+
+class PromptCache:
+    """
+    Exact and normalized-text cache of Gemini responses.
+
+    Args:
+        ttl (float): Seconds a response stays valid
+        max_bytes (int): Memory budget for the in-process tier
+        normalize (bool): Also match prompts equal after normalize_key
+        path (str): Optional SQLite file for persistence across restarts
+        max_disk_entries (int): Rows kept on disk before the oldest are pruned
+    """
+
+    def __init__(self, ttl=3600.0, max_bytes=4 * 1024 * 1024, normalize=False,
+                 path=None, max_disk_entries=5000):
+        self.ttl = ttl
+        self.normalize = normalize
+        self.max_disk_entries = max_disk_entries
+        self._memory = TTLCache(max_bytes=max_bytes, ttl=ttl)
+        self._disk = None
+        self._disk_lock = threading.Lock()
+        self._writes = 0
+        self._write_queue = None  # set by load(); disk writes then happen on a thread
+        self._read_disk = True
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.loaded = 0
+        self.normalized_hits = 0
+        self.bypassed = 0
+        if path:
+            self._open_disk(path)
+
+    def _open_disk(self, path):
+        try:
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS prompt_cache ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._disk.execute("DELETE FROM prompt_cache WHERE expires_at <= ?", (time.time(),))
+            self._disk.commit()
+            logger.info("Gemini prompt cache persisted to %s", path)
+        except sqlite3.Error as e:
+            logger.warning("Gemini prompt cache could not open %s, using memory only: %s", path, e)
+            self._disk = None
+
+    def _keys(self, prompt, generation_config):
+        keys = [_digest(prompt, generation_config)]
+        if self.normalize:
+            keys.append('n:' + _digest(normalize_key(prompt), generation_config))
+        return keys
+
+    def get(self, prompt, generation_config=None):
+        """Return the cached response for this exact request, or None."""
+        for tier, key in enumerate(self._keys(prompt, generation_config)):
+            value = self._memory.get(key)
+            if value is None and self._read_disk:
+                value = self._disk_get(key)
+            if value is not None:
+                if tier:
+                    self.normalized_hits += 1
+                self.hits += 1
+                return value
+        # One miss per lookup, however many tiers were tried
+        self.misses += 1
+        return None
+
+    def set(self, prompt, generation_config, response):
+        """Store a successful response under every enabled tier."""
+        for key in self._keys(prompt, generation_config):
+            self._memory.set(key, response)
+            self._disk_set(key, response)
+
+    def skip(self):
+        """Record a lookup bypassed by a caller asking for a fresh sample."""
+        self.bypassed += 1
+
+    def _disk_get(self, key):
+        if self._disk is None:
+            return None
+        with self._disk_lock:
+            row = self._disk.execute(
+                "SELECT response, expires_at FROM prompt_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        response, expires_at = row
+        remaining = expires_at - time.time()
+        if remaining <= 0:
+            return None
+        # Promote to memory for the rest of its lifetime
+        self._memory.set(key, response, ttl=remaining)
+        self.disk_hits += 1
+        return response
+
+    def load(self):
+        """
+        Copy the disk tier into memory and stop reading the disk on a miss.
+
+        Writes go to disk from a background thread from then on, so no call
+        touches SQLite on the caller's thread.
+
+        Returns:
+            int: Responses loaded
+        """
+        if self._disk is None or self._write_queue is not None:
+            return 0
+        now = time.time()
+        with self._disk_lock:
+            rows = self._disk.execute(
+                "SELECT key, response, expires_at FROM prompt_cache WHERE expires_at > ? "
+                "ORDER BY created_at ASC", (now,)
+            ).fetchall()
+        # Oldest first, so past the memory budget the newest are the ones kept
+        for key, response, expires_at in rows:
+            self._memory.set(key, response, ttl=expires_at - now)
+        self.loaded = len(rows)
+        self._read_disk = False
+        self._write_queue = queue.SimpleQueue()
+        threading.Thread(target=self._write_behind, name='kael-prompt-cache', daemon=True).start()
+        logger.info("Loaded %s Gemini prompt cache entries from disk", self.loaded)
+        return self.loaded
+
+    def _write_behind(self):
+        while True:
+            self._write(*self._write_queue.get())
+
+    def _disk_set(self, key, response):
+        if self._disk is None:
+            return
+        if self._write_queue is not None:
+            self._write_queue.put((key, response))
+        else:
+            self._write(key, response)
+
+    def _write(self, key, response):
+        now = time.time()
+        with self._disk_lock:
+            try:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO prompt_cache VALUES (?, ?, ?, ?)",
+                    (key, response, now + self.ttl, now)
+                )
+                self._writes += 1
+                if self._writes % 100 == 0:
+                    self._prune(now)
+                self._disk.commit()
+            except sqlite3.Error as e:
+                logger.warning("Gemini prompt cache write failed: %s", e)
+
+    def _prune(self, now):
+        self._disk.execute("DELETE FROM prompt_cache WHERE expires_at <= ?", (now,))
+        self._disk.execute(
+            "DELETE FROM prompt_cache WHERE key NOT IN "
+            "(SELECT key FROM prompt_cache ORDER BY created_at DESC LIMIT ?)",
+            (self.max_disk_entries,)
+        )
+
+    def stats(self):
+        """Counters for /api/status."""
+        stats = self._memory.stats()
+        lookups = self.hits + self.misses
+        stats.update({
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'normalized_hits': self.normalized_hits,
+            'disk_hits': self.disk_hits,
+            'loaded': self.loaded,
+            'bypassed': self.bypassed,
+            'persistent': self._disk is not None,
+        })
+        return stats
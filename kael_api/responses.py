@@ -0,0 +1,276 @@
+"""
+Catalogue of canned responses, loaded from a data file.
+
+Greetings, jokes, help text, simulated news and the like are kept in a
+JSON object mapping a key to one response or a list of variants:
+
+    {"greeting": ["Hello, sir.", "Greetings."],
+     "time": "The current time is {time}, sir."}
+
+Each file is compiled once into a tuple of variants per key, so answering
+a canned command picks an existing string instead of building lists and
+concatenating strings on every call. A response without slots is kept as
+a plain str and returned as is; one with slots becomes a Template, filled
+from the values the caller passes or, for {time} and {date}, computed
+only when the template uses them.
+
+Several files may be layered, later ones replacing keys of earlier ones,
+as the standalone server does for its offline wording. All of them are
+layered over BUILTIN_RESPONSES, one plain variant of each response the
+servers use, so a server started without its data files still answers.
+
+watch() checks the files for changes every check_interval seconds on a
+background thread and reloads them without a restart, so picking a
+response never touches the file system. A reload that fails to parse, or
+that drops a key the running server uses, is refused and the previous
+catalogue stays in use.
+"""
+import datetime
+import json
+import logging
+import os
+import random
+import string
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_FORMATTER = string.Formatter()
+
+
+class _Clock:
+    """The local time in a strftime format, formatted at most once a minute."""
+
+    __slots__ = ('fmt', '_minute', '_text')
+
+    def __init__(self, fmt):
+        self.fmt = fmt
+        self._minute = None
+        self._text = None
+
+    def __call__(self):
+        minute = int(time.time() // 60)
+        if minute != self._minute:
+            self._text = datetime.datetime.now().strftime(self.fmt)
+            self._minute = minute
+        return self._text
+
+
+# Slots filled in when a template uses them and the caller did not
+DYNAMIC_SLOTS = {
+    'time': _Clock("%I:%M %p"),
+    'date': _Clock("%A, %B %d, %Y"),
+}
+
+
+class _Values(dict):
+    """Slot values that compute a dynamic slot when it is looked up."""
+
+    __slots__ = ()
+
+    def __missing__(self, name):
+        if name in DYNAMIC_SLOTS:
+            return DYNAMIC_SLOTS[name]()
+        raise KeyError(f"No value for slot {{{name}}}")
+
+
+_NO_VALUES = _Values()
+
+# Used under the files, and alone when none of them can be found at startup
+BUILTIN_RESPONSES = {
+    "greeting": "Hello, sir. How may I assist you today?",
+    "identity": "I am KAEL, Knowledge and Artificially Enhanced Logic, your assistant.",
+    "joke": "Why did the AI go to art school? To improve its neural network!",
+    "help": "I can search the web, check the weather and the news, tell you the time and date, and open applications.",
+    "thanks": "You're welcome, sir.",
+    "exit": "Goodbye, sir. I'll be here when you need me.",
+    "system_status": "All systems are functioning within normal parameters, sir.",
+    "time": "The current time is {time}, sir.",
+    "date": "Today is {date}, sir.",
+    "type": "Typing now.",
+    "play_music": "Playing your music, sir.",
+    "volume_up": "Turning up the volume, sir.",
+    "volume_down": "Lowering the volume, sir.",
+    "unmatched": "I'm not sure I understand. Would you like me to search the web for that?",
+    "weather": "The weather in {location} is currently {condition} with a temperature of {temperature}°C. This is a simulated response.",
+    "weather.live": "The weather in {location} is currently {condition} with a temperature of {temperature}°C.",
+    "news": "Here are the latest {topic} headlines:\n\n{headlines}",
+    "news.empty": "I don't have any {topic} headlines yet, sir. Please ask again in a moment.",
+}
+
+
+class Template:
+    """
+    One response, with the names of the slots it needs.
+
+    Raises:
+        ValueError: If the text is not a valid format string or uses a slot
+            that is not a plain name
+    """
+
+    __slots__ = ('text', 'slots', 'dynamic')
+
+    def __init__(self, text):
+        if not isinstance(text, str):
+            raise ValueError(f"Responses must be strings, not {type(text).__name__}")
+        slots = []
+        for _, name, _, _ in _FORMATTER.parse(text):
+            if name is None:
+                continue
+            if not name.isidentifier():
+                raise ValueError(f"Bad slot {{{name}}} in {text[:40]!r}")
+            if name not in slots:
+                slots.append(name)
+        self.text = text
+        self.slots = tuple(slots)
+        self.dynamic = any(name in DYNAMIC_SLOTS for name in slots)
+
+    def render(self, values=None):
+        if not values:
+            return self.text.format_map(_NO_VALUES)
+        # The caller's values are used as they are unless a dynamic slot may be missing
+        return self.text.format_map(_Values(values) if self.dynamic else values)
+
+
+def compile_response(text):
+    """A response as a str if it has no slots, else as a Template."""
+    template = Template(text)
+    return template if template.slots else template.text
+
+
+def compile_catalogue(data):
+    """
+    Compile a parsed catalogue file.
+
+    Returns:
+        dict: Key to a tuple of str and Template
+
+    Raises:
+        ValueError: If the file is not an object of responses and lists of them
+    """
+    if not isinstance(data, dict):
+        raise ValueError("A response catalogue must be a JSON object")
+    entries = {}
+    for key, value in data.items():
+        variants = value if isinstance(value, list) else [value]
+        if not variants:
+            raise ValueError(f"No responses for {key!r}")
+        entries[key] = tuple(compile_response(text) for text in variants)
+    return entries
+
+
+class ResponseCatalogue:
+    """
+    Canned responses from one or more layered JSON files, reloaded when they change.
+
+    Args:
+        paths (list): Catalogue files; keys in later files replace earlier ones
+        check_interval (float): Seconds between the watcher's checks of
+            the files' modification times
+
+    Raises:
+        OSError, ValueError: If a file that exists cannot be loaded at startup
+    """
+
+    def __init__(self, paths, check_interval=2.0):
+        self.paths = tuple(paths)
+        self.check_interval = check_interval
+        self.reloads = 0
+        self.reload_errors = 0
+        self.loaded_at = None
+        self._entries = {}
+        self._mtimes = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _stat(self):
+        """Modification time of each file, None for a missing one."""
+        return tuple(os.stat(path).st_mtime_ns if os.path.exists(path) else None for path in self.paths)
+
+    def _load(self):
+        mtimes = self._stat()
+        entries = compile_catalogue(BUILTIN_RESPONSES)
+        for path, mtime in zip(self.paths, mtimes):
+            if mtime is None and not self._entries:
+                # At startup a missing file is skipped; later it keeps the previous catalogue
+                logger.warning("Response file %s not found; using the built-in responses instead", path)
+                continue
+            with open(path, encoding='utf-8') as f:
+                entries.update(compile_catalogue(json.load(f)))
+        missing = self._entries.keys() - entries.keys()
+        if missing:
+            raise ValueError(f"Reloaded catalogue lacks {', '.join(sorted(missing))}")
+        # Swapped in whole, so a pick never sees half a reload
+        self._entries = entries
+        self._mtimes = mtimes
+        self.loaded_at = datetime.datetime.now().isoformat()
+        logger.info("Loaded %s canned responses from %s", len(entries), ', '.join(self.paths))
+
+    def reload(self):
+        """
+        Load the files again.
+
+        Returns:
+            bool: Whether the new catalogue is in use
+        """
+        with self._lock:
+            try:
+                self._load()
+            except (OSError, ValueError) as e:
+                self.reload_errors += 1
+                logger.error("Keeping the previous response catalogue: %s", e)
+                # Try again once the files change, not on every check
+                self._mtimes = self._stat()
+                return False
+            self.reloads += 1
+            return True
+
+    def watch(self):
+        """Reload the files when they change, checking on a background thread."""
+        if self.check_interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._watch, name='kael-responses', daemon=True)
+        self._thread.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.check_interval)
+            if self._stat() != self._mtimes:
+                self.reload()
+
+    def pick(self, key, values=None):
+        """
+        A response for key, chosen at random among its variants.
+
+        Args:
+            key (str): Catalogue key
+            values (dict): Values for the response's slots
+        """
+        variants = self._entries[key]
+        # Indexing with random() allocates nothing, unlike random.choice
+        response = variants[int(random.random() * len(variants))]
+        return response if response.__class__ is str else response.render(values)
+
+    def sample(self, key, count, values=None):
+        """count different responses for key, in random order."""
+        variants = self._entries[key]
+        count = min(count, len(variants))
+        # Draws until count different ones came up: uniform like
+        # random.sample, and much cheaper for a few out of a short tuple
+        picked = []
+        while len(picked) < count:
+            index = int(random.random() * len(variants))
+            if index not in picked:
+                picked.append(index)
+        return [variants[index] if variants[index].__class__ is str else variants[index].render(values)
+                for index in picked]
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'reloads': self.reloads,
+            'reload_errors': self.reload_errors,
+            'loaded_at': self.loaded_at,
+        }
@@ -0,0 +1,232 @@
+"""
+Conversation history for multi-turn Gemini prompts.
+
+A client that sends a session ID (a "session" field in the JSON body or
+an X-Session-ID header) gets its recent turns included in the Gemini
+prompts built for it, so "how far away is it?" can follow "what is the
+Andromeda galaxy?". Without an ID a command is answered on its own, as
+before.
+
+Prompt size is bounded per session: turns are kept while they fit in
+context_tokens (estimated at CHARS_PER_TOKEN characters a token), and a
+long reply is cut to turn_tokens. Older turns are folded into a one-line
+summary of the topics asked about, which keeps the last summary_topics
+of them. Memory is bounded across sessions: idle sessions expire after
+ttl seconds, and past max_sessions or max_bytes the least recently used
+session is dropped. Every operation is O(1) in the number of sessions.
+"""
+import collections
+import os
+import re
+import threading
+import time
+
+CHARS_PER_TOKEN = 4
+
+# Memory held by a session and by a turn beyond their text, measured with
+# tracemalloc: a session's two deques, slots object, key and dict entry; a
+# turn's tuple and string headers
+SESSION_OVERHEAD = 1800
+TURN_OVERHEAD = 250
+
+_VALID_SESSION_ID = re.compile(r'^[A-Za-z0-9._:-]{8,64}$')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def estimate_tokens(text):
+    """Approximate Gemini token count of a text."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def session_id(data, headers):
+    """
+    The session ID a request carries, if it is well formed.
+
+    Args:
+        data (dict): The parsed JSON body, or None
+        headers: Request headers supporting .get()
+
+    Returns:
+        str: The session ID, or None
+    """
+    value = (data or {}).get('session') or headers.get('X-Session-ID') or headers.get('x-session-id')
+    if isinstance(value, str) and _VALID_SESSION_ID.match(value):
+        return value
+    return None
+
+
+def _clip(text, tokens):
+    """Text cut to about a number of tokens, on a word boundary."""
+    text = _WHITESPACE.sub(' ', text).strip()
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(' ', 1)[0] + '...'
+
+
+class Session:
+    """Recent turns of one conversation and a summary of older ones."""
+
+    __slots__ = ('turns', 'topics', 'tokens', 'bytes', 'last_used')
+
+    def __init__(self, now):
+        self.turns = collections.deque()  # (user, reply, tokens)
+        self.topics = collections.deque()  # earlier questions, shortened
+        self.tokens = 0
+        self.bytes = SESSION_OVERHEAD
+        self.last_used = now
+
+    def render(self):
+        """The conversation so far as prompt text."""
+        lines = []
+        if self.topics:
+            lines.append(f"(Earlier the user asked about: {'; '.join(self.topics)})")
+        for user, reply, _ in self.turns:
+            lines.append(f"User: {user}")
+            lines.append(f"KAEL: {reply}")
+        return '\n'.join(lines)
+
+
+class SessionStore:
+    """
+    Bounded store of conversation sessions.
+
+    Args:
+        max_sessions (int): Sessions kept; the least recently used go first
+        max_bytes (int): Approximate memory budget for all sessions
+        context_tokens (int): History included in a prompt, summary included
+        turn_tokens (int): Longest reply kept for a turn
+        summary_topics (int): Earlier questions listed in the summary
+        ttl (float): Seconds an idle session is kept
+        clock: Monotonic time source, replaceable for benchmarks
+    """
+
+    def __init__(self, max_sessions=5000, max_bytes=16 * 1024 * 1024, context_tokens=600,
+                 turn_tokens=200, summary_topics=8, ttl=1800.0, clock=time.monotonic):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.context_tokens = context_tokens
+        self.turn_tokens = turn_tokens
+        self.summary_topics = summary_topics
+        self.ttl = ttl
+        self._clock = clock
+        self._sessions = collections.OrderedDict()  # session ID -> Session, least recent first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.turns_recorded = 0
+        self.turns_summarized = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build a store from the KAEL_SESSION_* environment variables."""
+        return cls(
+            max_sessions=int(os.getenv('KAEL_SESSION_MAX', '5000')),
+            max_bytes=int(os.getenv('KAEL_SESSION_BYTES', str(16 * 1024 * 1024))),
+            context_tokens=int(os.getenv('KAEL_SESSION_CONTEXT_TOKENS', '600')),
+            turn_tokens=int(os.getenv('KAEL_SESSION_TURN_TOKENS', '200')),
+            ttl=float(os.getenv('KAEL_SESSION_TTL', '1800')),
+        )
+
+    def context(self, session_id):
+        """
+        The conversation so far for a prompt.
+
+        Returns:
+            str: Earlier turns as prompt text, or '' for no or an unknown session
+        """
+        if not session_id:
+            return ''
+        with self._lock:
+            session = self._touch(session_id)
+            return session.render() if session is not None else ''
+
+    def record(self, session_id, user, reply):
+        """Add a turn to a session, creating it if need be."""
+        if not session_id or not self.context_tokens:
+            return
+        user = _clip(user, self.turn_tokens)
+        reply = _clip(reply or '', self.turn_tokens)
+        tokens = estimate_tokens(user) + estimate_tokens(reply)
+        size = len(user) + len(reply) + TURN_OVERHEAD
+        with self._lock:
+            session = self._touch(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(self._clock())
+                self._bytes += session.bytes
+            session.turns.append((user, reply, tokens))
+            session.tokens += tokens
+            self._resize(session, size)
+            self.turns_recorded += 1
+            self._fit(session)
+            self._evict()
+
+    def _touch(self, session_id):
+        """The live session for an ID, marked most recently used, or None."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        now = self._clock()
+        if now - session.last_used > self.ttl:
+            del self._sessions[session_id]
+            self._bytes -= session.bytes
+            self.expirations += 1
+            return None
+        session.last_used = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _resize(self, session, delta):
+        session.bytes += delta
+        self._bytes += delta
+
+    def _fit(self, session):
+        """Fold the oldest turns into the summary until the history fits the budget."""
+        while len(session.turns) > 1 and session.tokens + self._summary_tokens(session) > self.context_tokens:
+            user, reply, tokens = session.turns.popleft()
+            session.tokens -= tokens
+            self._resize(session, -(len(user) + len(reply) + TURN_OVERHEAD))
+            topic = _clip(user, 12)
+            session.topics.append(topic)
+            self._resize(session, len(topic))
+            if len(session.topics) > self.summary_topics:
+                self._resize(session, -len(session.topics.popleft()))
+            self.turns_summarized += 1
+
+    @staticmethod
+    def _summary_tokens(session):
+        return sum(estimate_tokens(topic) for topic in session.topics) if session.topics else 0
+
+    def _evict(self):
+        # Expired sessions sit at the least recently used end
+        now = self._clock()
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            expired = now - session.last_used > self.ttl
+            if not expired and len(self._sessions) <= self.max_sessions and self._bytes <= self.max_bytes:
+                return
+            self._sessions.popitem(last=False)
+            self._bytes -= session.bytes
+            if expired:
+                self.expirations += 1
+            else:
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        """Counters for /api/status."""
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'bytes': self._bytes,
+                'max_sessions': self.max_sessions,
+                'max_bytes': self.max_bytes,
+                'context_tokens': self.context_tokens,
+                'turns_recorded': self.turns_recorded,
+                'turns_summarized': self.turns_summarized,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,153 @@
+"""
+Single-flight coalescing of identical in-flight upstream calls.
+
+When several requests need the same upstream answer at the same moment
+(a trending search, the dashboard's startup Gemini prompt), only the
+first caller for a key makes the call; the others wait for it and get the
+same result, or the same exception. Keys are dropped as soon as the call
+finishes, so this never serves stale data: it only merges calls that
+overlap in time. Caching across time is the job of kael_api.cache.
+
+SingleFlight is for threads (the Flask modes), AsyncSingleFlight for
+coroutines on one event loop (the ASGI mode).
+"""
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key across threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+
+    def do(self, key, fn):
+        """
+        Call fn(), unless a call for key is already running.
+
+        Args:
+            key: Hashable identity of the call, or None to never coalesce
+            fn: Zero-argument callable making the call
+
+        Returns:
+            The result of fn(), possibly from another thread's call
+
+        Raises:
+            Whatever fn() raised, in every caller that shared the call
+        """
+        if key is None:
+            return fn()
+
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                self.max_waiters = max(self.max_waiters, call.waiters)
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        """Counters for /api/status."""
+        with self._lock:
+            return {
+                'upstream_calls': self.leaders,
+                'coalesced_waiters': self.coalesced,
+                'max_waiters': self.max_waiters,
+                'in_flight': len(self._calls),
+            }
+
+
+class AsyncSingleFlight:
+    """Coalesces concurrent coroutine calls with the same key on one event loop."""
+
+    def __init__(self):
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+
+    async def do(self, key, fn):
+        """Async counterpart of SingleFlight.do; fn is a coroutine function."""
+        if key is None:
+            return await fn()
+
+        call = self._calls.get(key)
+        if call is not None:
+            call[1] += 1
+            self.coalesced += 1
+            self.max_waiters = max(self.max_waiters, call[1])
+            # A cancelled waiter must not cancel the shared call
+            return await asyncio.shield(call[0])
+
+        # The call runs as its own task so that a leader that gives up (a
+        # lost race, a client that went away) leaves it running for waiters
+        task = asyncio.ensure_future(fn())
+        call = self._calls[key] = [task, 0]
+        self.leaders += 1
+        task.add_done_callback(lambda done: self._finished(key, call, done))
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not call[1]:
+                self._finished(key, call, task)
+                task.cancel()
+            raise
+
+    def _finished(self, key, call, task):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if task.done() and not task.cancelled():
+            # Retrieve it so an error nobody waited for is not reported as unhandled
+            task.exception()
+
+    def stats(self):
+        """Counters for /api/status."""
+        return {
+            'upstream_calls': self.leaders,
+            'coalesced_waiters': self.coalesced,
+            'max_waiters': self.max_waiters,
+            'in_flight': len(self._calls),
+        }
+
+
+_default_flight = SingleFlight()
+
+
+def default_flight():
+    """The process-wide SingleFlight used by run_sync."""
+    return _default_flight
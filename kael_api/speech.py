@@ -0,0 +1,170 @@
+"""
+Background text-to-speech worker.
+
+pyttsx3's runAndWait() blocks until the whole utterance has been spoken, and
+its engine is not safe to drive from several request threads at once. The
+SpeechWorker owns the engine on a dedicated thread and is fed through a
+small bounded queue, so request handlers return as soon as the response
+text is ready.
+"""
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# What to do with a new utterance when the queue is full
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+COALESCE = 'coalesce'
+POLICIES = (DROP_OLDEST, DROP_NEWEST, COALESCE)
+
+
+class SpeechWorker:
+    """
+    Dedicated speech thread with a bounded queue.
+
+    Args:
+        engine_factory: Callable returning a configured pyttsx3 engine; it
+            is called on the worker thread, which then owns the engine
+        max_queue (int): Utterances allowed to wait behind the current one
+        policy (str): DROP_OLDEST, DROP_NEWEST or COALESCE when full
+        interrupt (bool): Cut off the current utterance and discard queued
+            ones whenever a new response is spoken
+    """
+
+    def __init__(self, engine_factory, max_queue=4, policy=DROP_OLDEST, interrupt=True):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown speech queue policy: {policy}")
+        self.max_queue = max(1, max_queue)
+        self.policy = policy
+        self.interrupt = interrupt
+        self._engine_factory = engine_factory
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._engine = None
+        self._speaking = False
+        self._stop_current = False
+        self._closed = False
+        self.spoken = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.interrupted = 0
+        self.failed = 0
+
+    def say(self, text):
+        """
+        Queue text to be spoken without waiting for it.
+
+        Returns:
+            bool: False if the text was dropped because the queue was full
+        """
+        with self._cond:
+            if self._closed:
+                return False
+            self._ensure_started()
+
+            if self.interrupt:
+                self.dropped += len(self._queue)
+                self._queue.clear()
+                if self._speaking:
+                    self._stop_current = True
+                    self.interrupted += 1
+
+            if len(self._queue) >= self.max_queue:
+                if self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                if self.policy == COALESCE:
+                    self._queue[-1] = f"{self._queue[-1]} {text}"
+                    self.coalesced += 1
+                    self._cond.notify()
+                    return True
+                self._queue.popleft()
+                self.dropped += 1
+
+            self._queue.append(text)
+            self._cond.notify()
+            return True
+
+    def stop_speaking(self):
+        """Interrupt the current utterance and discard everything queued."""
+        with self._cond:
+            self.dropped += len(self._queue)
+            self._queue.clear()
+            if self._speaking:
+                self._stop_current = True
+                self.interrupted += 1
+
+    def close(self, timeout=2.0):
+        """Stop the worker thread after the current utterance."""
+        with self._cond:
+            self._closed = True
+            self._queue.clear()
+            self._stop_current = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def depth(self):
+        return len(self._queue)
+
+    def stats(self):
+        """Counters for /api/status."""
+        with self._cond:
+            return {
+                'queue_depth': len(self._queue),
+                'max_queue': self.max_queue,
+                'policy': self.policy,
+                'speaking': self._speaking,
+                'spoken': self.spoken,
+                'dropped': self.dropped,
+                'coalesced': self.coalesced,
+                'interrupted': self.interrupted,
+                'failed': self.failed,
+            }
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='kael-speech', daemon=True)
+            self._thread.start()
+
+    def _on_word(self, name, location, length):
+        # pyttsx3 only supports stop() from inside its own callbacks
+        if self._stop_current:
+            self._engine.stop()
+
+    def _run(self):
+        try:
+            self._engine = self._engine_factory()
+            self._engine.connect('started-word', self._on_word)
+        except Exception as e:
+            logger.error("Text-to-speech engine failed to start: %s", e, exc_info=True)
+            with self._cond:
+                self._closed = True
+                self.failed += len(self._queue)
+                self._queue.clear()
+            return
+
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                text = self._queue.popleft()
+                self._speaking = True
+                self._stop_current = False
+
+            try:
+                self._engine.say(text)
+                self._engine.runAndWait()
+                self.spoken += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error("Text-to-speech error: %s", e)
+            finally:
+                with self._cond:
+                    self._speaking = False
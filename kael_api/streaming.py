@@ -0,0 +1,302 @@
+"""
+Streaming Gemini answers to the client.
+
+With streaming requested, /api/command and /api/gemini call Gemini's
+streamGenerateContent endpoint and relay each piece of text as soon as it
+arrives, instead of holding the response until all of it is back. The
+client asks for it with "stream": true in the JSON body, or an Accept
+header of text/event-stream or application/x-ndjson, and gets one of:
+
+    sse     text/event-stream, "chunk" events followed by one "done" event
+    ndjson  application/x-ndjson, one JSON object per line, each with an
+            "event" key of "chunk" or "done"
+
+Chunk events carry {"text": ...}. The done event carries the usual
+non-streaming response body plus first_chunk_ms (time to first token as
+seen by the server) and total_ms.
+
+A server module describes a streaming call as a GeminiStream; iter_text
+and aiter_text drive it with the blocking or the async client, so both
+serving modes share the request building, caching and error messages.
+Streams count towards the Gemini circuit breaker like any other call,
+judged on the response status and the time to the first line.
+"""
+import json
+import logging
+import time
+
+from kael_api.breaker import BreakerOpenError, breaker_for, failed_status
+from kael_api.metrics import observe_upstream
+
+logger = logging.getLogger(__name__)
+
+STREAM_MIMETYPES = {
+    'sse': 'text/event-stream',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Keep proxies from buffering the stream
+STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',
+}
+
+
+class UpstreamStatusError(Exception):
+    """Gemini answered a streaming request with a non-200 status."""
+
+    def __init__(self, status_code, body=''):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.body = body
+
+
+class EmptyStreamError(Exception):
+    """The stream finished without any text in it."""
+
+
+class GeminiStream:
+    """
+    A streaming Gemini call, or an answer that is already known.
+
+    Args:
+        request (UpstreamRequest): The streamGenerateContent request, or
+            None when text is already known (cache hit, Gemini disabled)
+        text (str): The complete answer when there is no request to make
+        on_complete: Called with the full text after a successful stream
+        on_error: Called with the exception when the stream fails before
+            any text arrived; returns the message to send instead
+    """
+
+    __slots__ = ('request', 'text', 'on_complete', 'on_error')
+
+    def __init__(self, request=None, text=None, on_complete=None, on_error=None):
+        self.request = request
+        self.text = text
+        self.on_complete = on_complete
+        self.on_error = on_error or (lambda e: str(e))
+
+    def add_done_callback(self, callback):
+        """Also call callback with the full text: now if it is known, else after a successful stream."""
+        if self.request is None:
+            callback(self.text)
+            return
+        on_complete = self.on_complete
+
+        def complete(text):
+            if on_complete is not None:
+                on_complete(text)
+            callback(text)
+
+        self.on_complete = complete
+
+
+def stream_url(api_url):
+    """The streamGenerateContent URL for a generateContent URL."""
+    return api_url.replace(':generateContent', ':streamGenerateContent')
+
+
+def stream_format(data, accept=''):
+    """
+    The streaming format a request asked for.
+
+    Args:
+        data (dict): The parsed JSON body
+        accept (str): The Accept header
+
+    Returns:
+        str: 'sse' or 'ndjson', or None for the normal JSON response
+    """
+    requested = (data or {}).get('stream')
+    if requested is False:
+        return None
+    if isinstance(requested, str) and requested.lower() in STREAM_MIMETYPES:
+        return requested.lower()
+    accept = (accept or '').lower()
+    if 'application/x-ndjson' in accept:
+        return 'ndjson'
+    if requested or 'text/event-stream' in accept:
+        return 'sse'
+    return None
+
+
+def gemini_text(line):
+    """Text carried by one line of Gemini's SSE stream, or None."""
+    if isinstance(line, bytes):
+        line = line.decode('utf-8', errors='replace')
+    line = line.strip()
+    if not line.startswith('data:'):
+        return None
+    try:
+        event = json.loads(line[5:])
+        parts = event['candidates'][0]['content']['parts']
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+    return ''.join(part.get('text', '') for part in parts) or None
+
+
+def iter_text(stream, client):
+    """
+    Yield the text of a GeminiStream as it arrives, using an HttpClient.
+
+    A failure before the first piece of text yields the stream's error
+    message instead; a failure part-way through ends the stream early.
+    """
+    if stream.request is None:
+        yield stream.text
+        return
+
+    request = stream.request
+    breaker = breaker_for(request.name)
+    try:
+        breaker.check()
+    except BreakerOpenError as e:
+        yield stream.on_error(e)
+        return
+
+    parts = []
+    started = time.perf_counter()
+    first_line = None
+    status = 'error'
+    try:
+        with client.stream(request.method, request.url, headers=request.headers,
+                           json=request.json) as response:
+            status = response.status_code
+            if response.status_code != 200:
+                raise UpstreamStatusError(response.status_code, response.text)
+            # chunk_size=None hands over data as it arrives instead of
+            # waiting to fill a 512 byte read
+            for line in response.iter_lines(chunk_size=None):
+                if first_line is None:
+                    first_line = time.perf_counter() - started
+                text = gemini_text(line)
+                if text:
+                    parts.append(text)
+                    yield text
+        if not parts:
+            raise EmptyStreamError()
+    except Exception as e:
+        if parts:
+            logger.error("Gemini stream interrupted after %s chunks: %s", len(parts), e)
+        else:
+            yield stream.on_error(e)
+        return
+    finally:
+        elapsed = time.perf_counter() - started
+        observe_upstream(request.name, status, elapsed)
+        breaker.record(status != 'error' and not failed_status(status),
+                       elapsed if first_line is None else first_line)
+
+    if stream.on_complete:
+        stream.on_complete(''.join(parts))
+
+
+async def aiter_text(stream, client):
+    """Async counterpart of iter_text, using an AsyncHttpClient."""
+    if stream.request is None:
+        yield stream.text
+        return
+
+    request = stream.request
+    breaker = breaker_for(request.name)
+    try:
+        breaker.check()
+    except BreakerOpenError as e:
+        yield stream.on_error(e)
+        return
+
+    parts = []
+    started = time.perf_counter()
+    first_line = None
+    status = 'error'
+    try:
+        async with client.stream(request.method, request.url, headers=request.headers,
+                                 json=request.json) as response:
+            status = response.status
+            if response.status != 200:
+                raise UpstreamStatusError(response.status, await response.text())
+            async for line in response.content:
+                if first_line is None:
+                    first_line = time.perf_counter() - started
+                text = gemini_text(line)
+                if text:
+                    parts.append(text)
+                    yield text
+        if not parts:
+            raise EmptyStreamError()
+    except Exception as e:
+        if parts:
+            logger.error("Gemini stream interrupted after %s chunks: %s", len(parts), e)
+        else:
+            yield stream.on_error(e)
+        return
+    finally:
+        elapsed = time.perf_counter() - started
+        observe_upstream(request.name, status, elapsed)
+        breaker.record(status != 'error' and not failed_status(status),
+                       elapsed if first_line is None else first_line)
+
+    if stream.on_complete:
+        stream.on_complete(''.join(parts))
+
+
+def encode_event(fmt, event, payload):
+    """Serialize one event in the given streaming format."""
+    if fmt == 'sse':
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode('utf-8')
+    return (json.dumps(dict(payload, event=event)) + "\n").encode('utf-8')
+
+
+class _Timing:
+    def __init__(self, started):
+        self.started = started if started is not None else time.perf_counter()
+        self.first = None
+
+    def chunk(self):
+        if self.first is None:
+            self.first = time.perf_counter()
+
+    def finish(self, payload):
+        now = time.perf_counter()
+        first = self.first if self.first is not None else now
+        payload['first_chunk_ms'] = round((first - self.started) * 1000, 2)
+        payload['total_ms'] = round((now - self.started) * 1000, 2)
+        logger.info("Streamed response: first chunk after %s ms, complete after %s ms",
+                    payload['first_chunk_ms'], payload['total_ms'])
+        return payload
+
+
+def stream_events(chunks, fmt, finish, started=None, fields=None):
+    """
+    Encode text chunks as a streaming response body.
+
+    Args:
+        chunks: Iterable of text pieces
+        fmt (str): 'sse' or 'ndjson'
+        finish: Called with the full text; returns the done event payload
+        started (float): time.perf_counter() when the request arrived
+        fields (dict): Added to every event, such as the id of a WebSocket command
+
+    Yields:
+        bytes: Encoded events
+    """
+    timing = _Timing(started)
+    fields = fields or {}
+    parts = []
+    for text in chunks:
+        timing.chunk()
+        parts.append(text)
+        yield encode_event(fmt, 'chunk', dict(fields, text=text))
+    yield encode_event(fmt, 'done', dict(timing.finish(finish(''.join(parts))), **fields))
+
+
+async def astream_events(chunks, fmt, finish, started=None, fields=None):
+    """Async counterpart of stream_events for an async iterable of chunks."""
+    timing = _Timing(started)
+    fields = fields or {}
+    parts = []
+    async for text in chunks:
+        timing.chunk()
+        parts.append(text)
+        yield encode_event(fmt, 'chunk', dict(fields, text=text))
+    yield encode_event(fmt, 'done', dict(timing.finish(finish(''.join(parts))), **fields))
@@ -0,0 +1,465 @@
+"""
+Transport-independent upstream calls.
+
+The code that talks to Gemini and DuckDuckGo is written as generator
+"exchanges": instead of sending HTTP itself, an exchange yields an
+UpstreamRequest and receives the response (or has the transport error
+thrown in) at the yield. The same exchange can then be driven by the
+blocking HttpClient under Flask with run_sync, or by the non-blocking
+AsyncHttpClient under the ASGI server with run_async, so the request
+building, response parsing and fallbacks live in one place.
+
+Responses are whatever the client returns (requests.Response or
+kael_api.http_client.BufferedResponse); exchanges only use status_code,
+text and json().
+
+Both drivers coalesce identical requests that are in flight at the same
+time (see kael_api.singleflight): GETs by URL, and any request an exchange
+gives an explicit key, such as a search keyed on its normalized query.
+
+Every call goes through the circuit breaker named after the request (see
+kael_api.breaker). While it is open the call is refused without network
+I/O and BreakerOpenError is thrown into the exchange, which falls back
+as it would for any other transport error.
+
+An exchange can also yield a Race of other exchanges. The driver runs
+them at once, on a thread pool or as tasks, and sends back a RaceResult
+for the first one whose answer is acceptable; the others are abandoned.
+Under run_async the losing tasks are cancelled, request and all. Under
+run_sync a loser makes no further requests, but one already on the wire
+is not interrupted: it holds its thread and connection until the reply
+comes or the race's budget runs out, whichever is first. Without that
+limit, abandoned calls would keep their threads busy until the read
+timeout and starve the race pool. configure_race_pool() sizes the pool, and race_pool_stats() reports
+how many candidates are waiting for a thread.
+"""
+import asyncio
+import hashlib
+import inspect
+import json as jsonlib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+from kael_api.breaker import breaker_for, failed_status
+from kael_api.metrics import REGISTRY, observe_race, observe_upstream
+from kael_api.profiling import span
+from kael_api.singleflight import default_flight
+
+
+class UpstreamRequest:
+    """
+    An outbound HTTP request yielded by an exchange.
+
+    Args:
+        method (str): HTTP method
+        url (str): Absolute URL
+        headers (dict): Optional request headers
+        json: Optional JSON body
+        key (str): Identity for coalescing concurrent identical requests;
+            GETs default to their URL, other methods are not coalesced
+            unless given a key
+        name (str): Upstream label for metrics, the host name by default
+    """
+
+    __slots__ = ('method', 'url', 'headers', 'json', 'key', 'name')
+
+    def __init__(self, method, url, headers=None, json=None, key=None, name=None):
+        self.method = method
+        self.url = url
+        self.headers = headers or {}
+        self.json = json
+        self.key = key
+        self.name = name or urlsplit(url).hostname or 'unknown'
+
+    @property
+    def coalesce_key(self):
+        if self.key is not None:
+            return self.key
+        if self.method == 'GET':
+            return f"GET {self.url}"
+        return None
+
+    def __repr__(self):
+        return f"UpstreamRequest({self.method!r}, {self.url.split('?')[0]!r})"
+
+
+class Race:
+    """
+    Several ways of answering the same question, yielded by an exchange.
+
+    Candidates run concurrently. The exchange gets a RaceResult back at the
+    yield as soon as one candidate's value is accepted, or once budget
+    seconds have passed or every candidate has finished without one.
+
+    Args:
+        candidates: (name, exchange or value) pairs; a plain value takes
+            part as an answer that is already known, and when accepted
+            the exchanges are not started at all
+        budget (float): Seconds to wait for an acceptable answer
+        accept: Called with a candidate's value, True if it may win;
+            by default any value other than None
+    """
+
+    __slots__ = ('candidates', 'budget', 'accept')
+
+    def __init__(self, candidates, budget, accept=None):
+        self.candidates = list(candidates)
+        self.budget = budget
+        self.accept = accept or (lambda value: value is not None)
+
+    def __repr__(self):
+        return f"Race({[name for name, _ in self.candidates]!r}, budget={self.budget})"
+
+
+class RaceResult:
+    """
+    Outcome of a Race.
+
+    Attributes:
+        winner (str): Name of the accepted candidate, or None
+        value: The accepted value, or None
+        results (dict): Values of every candidate that finished in time,
+            accepted or not, by name
+        elapsed (float): Seconds the race took
+    """
+
+    __slots__ = ('winner', 'value', 'results', 'elapsed')
+
+    def __init__(self, winner, value, results, elapsed):
+        self.winner = winner
+        self.value = value
+        self.results = results
+        self.elapsed = elapsed
+
+
+def _known_winner(race):
+    """
+    Values of the candidates that are already known, and the first of them
+    that is acceptable. If there is one, the exchanges are closed unstarted.
+    """
+    results = {}
+    for name, candidate in race.candidates:
+        if inspect.isgenerator(candidate):
+            continue
+        results[name] = candidate
+        if race.accept(candidate):
+            for _, other in race.candidates:
+                if inspect.isgenerator(other):
+                    other.close()
+            return name, results
+    return None, results
+
+
+def _finish_race(winner, value, results, started):
+    elapsed = time.perf_counter() - started
+    observe_race(winner, elapsed)
+    return RaceResult(winner, value, results, elapsed)
+
+
+def _cancellable(exchange, cancelled):
+    """Pass an exchange's requests through, closing it once cancelled is set."""
+    try:
+        request = next(exchange)
+        while True:
+            if cancelled.is_set():
+                exchange.close()
+                return None
+            try:
+                response = yield request
+            except Exception as e:
+                request = exchange.throw(e)
+            else:
+                request = exchange.send(response)
+    except StopIteration as done:
+        return done.value
+
+
+class RaceTimeout(Exception):
+    """A race candidate's request was cut off when the race's budget ran out."""
+
+
+class _RaceClient:
+    """A client whose requests give up at a race's deadline, so a losing candidate frees its thread."""
+
+    __slots__ = ('client', 'deadline')
+
+    def __init__(self, client, deadline):
+        self.client = client
+        self.deadline = deadline
+
+    def request(self, method, url, **kwargs):
+        timeout = getattr(self.client, 'timeout', None)
+        if timeout is None:
+            return self.client.request(method, url, **kwargs)
+        remaining = self.deadline - time.perf_counter()
+        if remaining <= 0:
+            raise RaceTimeout(f"race over before {method} {url.split('?')[0]}")
+        try:
+            return self.client.request(method, url, timeout=(min(timeout[0], remaining), min(timeout[1], remaining)),
+                                       **kwargs)
+        except Exception as e:
+            if time.perf_counter() >= self.deadline:
+                raise RaceTimeout(f"race over during {method} {url.split('?')[0]}") from e
+            raise
+
+
+_race_pool = None
+_race_pool_size = 32
+_race_pool_lock = threading.Lock()
+_race_counts = {'submitted': 0, 'queued': 0, 'running': 0, 'timeouts': 0}
+
+
+def configure_race_pool(max_workers):
+    """
+    Set how many threads race candidates in the Flask modes.
+
+    A server sizes it from its concurrency cap: every admitted question
+    may have a thread per candidate. Only takes effect before the first race.
+    """
+    global _race_pool_size
+    with _race_pool_lock:
+        if _race_pool is None:
+            _race_pool_size = max(1, int(max_workers))
+
+
+def _race_executor():
+    """Threads racing candidates in the Flask modes, created on first use."""
+    global _race_pool
+    if _race_pool is None:
+        with _race_pool_lock:
+            if _race_pool is None:
+                _race_pool = ThreadPoolExecutor(max_workers=_race_pool_size, thread_name_prefix='kael-race')
+    return _race_pool
+
+
+def _race_submit(candidate, client, flight, cancelled):
+    with _race_pool_lock:
+        _race_counts['submitted'] += 1
+        _race_counts['queued'] += 1
+    return _race_executor().submit(_race_candidate, candidate, client, flight, cancelled)
+
+
+def _race_candidate(candidate, client, flight, cancelled):
+    with _race_pool_lock:
+        _race_counts['queued'] -= 1
+        _race_counts['running'] += 1
+    try:
+        return run_sync(_cancellable(candidate, cancelled), client, flight)
+    except RaceTimeout:
+        with _race_pool_lock:
+            _race_counts['timeouts'] += 1
+        raise
+    finally:
+        with _race_pool_lock:
+            _race_counts['running'] -= 1
+
+
+def race_pool_stats():
+    """Race candidates waiting for a thread, running and cut off at the budget, for /api/status."""
+    with _race_pool_lock:
+        stats = dict(_race_counts)
+    stats['workers'] = _race_pool_size
+    return stats
+
+
+def _collect_race_pool():
+    stats = race_pool_stats()
+    yield 'kael_race_pool_workers', 'gauge', 'Threads racing speculative candidates', {}, stats['workers']
+    yield 'kael_race_pool_running', 'gauge', 'Race candidates running on a thread', {}, stats['running']
+    yield 'kael_race_pool_queued', 'gauge', 'Race candidates waiting for a free thread', {}, stats['queued']
+    yield 'kael_race_candidates_total', 'counter', 'Race candidates submitted', {}, stats['submitted']
+    yield 'kael_race_timeouts_total', 'counter', 'Race candidates cut off when the budget ran out', \
+        {}, stats['timeouts']
+
+
+REGISTRY.register_collector(_collect_race_pool)
+
+
+def _race_sync(race, client, flight):
+    started = time.perf_counter()
+    winner, results = _known_winner(race)
+    if winner is not None:
+        return _finish_race(winner, results[winner], results, started)
+
+    cancelled = threading.Event()
+    deadline = started + race.budget
+    candidate_client = _RaceClient(client, deadline)
+    pending = {
+        _race_submit(candidate, candidate_client, flight, cancelled): name
+        for name, candidate in race.candidates if inspect.isgenerator(candidate)
+    }
+    try:
+        while pending:
+            done, _ = wait(pending, timeout=max(0.0, deadline - time.perf_counter()),
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    value = future.result()
+                except Exception:
+                    continue
+                results[name] = value
+                if race.accept(value):
+                    return _finish_race(name, value, results, started)
+        return _finish_race(None, None, results, started)
+    finally:
+        # Losers stop at their next request; a call already on the wire
+        # finishes in the background, at the latest at the deadline, and
+        # its answer is dropped
+        cancelled.set()
+
+
+async def _race_async(race, client, flight):
+    started = time.perf_counter()
+    winner, results = _known_winner(race)
+    if winner is not None:
+        return _finish_race(winner, results[winner], results, started)
+
+    pending = {
+        asyncio.ensure_future(run_async(candidate, client, flight)): name
+        for name, candidate in race.candidates if inspect.isgenerator(candidate)
+    }
+    deadline = started + race.budget
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, timeout=max(0.0, deadline - time.perf_counter()),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                name = pending.pop(task)
+                if task.cancelled() or task.exception() is not None:
+                    continue
+                results[name] = task.result()
+                if race.accept(results[name]):
+                    return _finish_race(name, results[name], results, started)
+        return _finish_race(None, None, results, started)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def request_key(method, url, json=None):
+    """Key identifying a request by method, URL and canonical JSON body."""
+    body = jsonlib.dumps(json, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f"{method} {url}\n{body}".encode('utf-8')).hexdigest()
+
+
+def _send_sync(client, request):
+    breaker = breaker_for(request.name)
+    breaker.check()
+    started = time.perf_counter()
+    status = 'error'
+    try:
+        response = client.request(request.method, request.url, headers=request.headers, json=request.json)
+        status = response.status_code
+        return response
+    except RaceTimeout:
+        # Cut off by the race, which says nothing about the upstream's health
+        status = 'race_timeout'
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        observe_upstream(request.name, status, elapsed)
+        if status == 'race_timeout':
+            breaker.release()
+        else:
+            breaker.record(status != 'error' and not failed_status(status), elapsed)
+
+
+async def _send_async(client, request):
+    breaker = breaker_for(request.name)
+    breaker.check()
+    started = time.perf_counter()
+    status = 'error'
+    try:
+        response = await client.request(request.method, request.url, headers=request.headers, json=request.json)
+        status = response.status_code
+        return response
+    except asyncio.CancelledError:
+        # A lost race cancels its candidates, which says nothing about the
+        # upstream's health
+        status = 'cancelled'
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        observe_upstream(request.name, status, elapsed)
+        if status == 'cancelled':
+            breaker.release()
+        else:
+            breaker.record(status != 'error' and not failed_status(status), elapsed)
+
+
+def resolve(value):
+    """Inside an exchange, run value if it is itself an exchange."""
+    if inspect.isgenerator(value):
+        return (yield from value)
+    return value
+
+
+def run_sync(exchange, client, flight=None):
+    """
+    Drive an exchange to completion with a blocking client.
+
+    Args:
+        exchange: Generator yielding UpstreamRequest objects
+        client: HttpClient (or anything with a compatible request method)
+        flight (SingleFlight): Coalescing group, the process-wide one by default
+
+    Returns:
+        The exchange's return value
+    """
+    if not inspect.isgenerator(exchange):
+        return exchange
+    flight = flight or default_flight()
+    try:
+        request = next(exchange)
+        while True:
+            try:
+                if isinstance(request, Race):
+                    with span('race'):
+                        response = _race_sync(request, client, flight)
+                else:
+                    with span(f"upstream:{request.name}"):
+                        response = flight.do(request.coalesce_key, lambda: _send_sync(client, request))
+            except Exception as e:
+                request = exchange.throw(e)
+            else:
+                request = exchange.send(response)
+    except StopIteration as done:
+        return done.value
+
+
+async def run_async(exchange, client, flight=None):
+    """
+    Drive an exchange to completion with an AsyncHttpClient.
+
+    Requests are only coalesced when an AsyncSingleFlight is given, since
+    its waiters must share the caller's event loop. Cancelling the task
+    running an exchange (as a lost Race does) cancels its request too.
+    """
+    if not inspect.isgenerator(exchange):
+        return exchange
+    try:
+        request = next(exchange)
+        while True:
+            try:
+                if isinstance(request, Race):
+                    with span('race'):
+                        response = await _race_async(request, client, flight)
+                else:
+                    with span(f"upstream:{request.name}"):
+                        if flight is not None:
+                            response = await flight.do(request.coalesce_key, lambda: _send_async(client, request))
+                        else:
+                            response = await _send_async(client, request)
+            except Exception as e:
+                request = exchange.throw(e)
+            else:
+                request = exchange.send(response)
+    except StopIteration as done:
+        return done.value
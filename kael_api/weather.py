@@ -0,0 +1,345 @@
+"""
+Weather lookups behind a pluggable provider, with geocode and forecast caches.
+
+A WeatherProvider turns a place name into coordinates (geocode) and
+coordinates into current conditions (forecast). Either method may be an
+exchange (see kael_api.upstream) or return its answer directly, so a
+provider that calls an API works in both serving modes and one that
+does not, like the stub, costs no I/O.
+
+WeatherService answers "weather in X" with two caches in front of the
+provider:
+
+    geocode    normalized place name to (latitude, longitude, name).
+               Places do not move, so entries live for geocode_ttl
+               (30 days by default) within a byte budget; names the
+               provider does not know are remembered for unknown_ttl.
+    forecast   grid cell of grid degrees (0.25 by default, about 28 km
+               north to south) to (condition, temperature). Forecasts are
+               fetched for the cell's centre and kept for the provider's
+               forecast_ttl, so repeat questions and nearby places share
+               one upstream call.
+
+The service remembers the places asked about in the last recent_seconds.
+prefetch() fetches again the forecasts of those places that would expire
+before the next round, and start_prefetch() runs it on a background
+thread, so a question about a place asked recently is answered from memory.
+
+Providers, by WEATHER_PROVIDER name:
+
+    stub        Simulated weather without the network: a few known cities
+                plus made-up coordinates for other names, and conditions
+                that stay the same per grid cell for an hour. For tests,
+                benchmarks and the offline standalone server.
+    open-meteo  The Open-Meteo geocoding and forecast APIs (no API key).
+"""
+import collections
+import hashlib
+import logging
+import math
+import os
+import random
+import threading
+import time
+from urllib.parse import quote_plus
+
+from kael_api.cache import TTLCache, normalize_key
+from kael_api.upstream import UpstreamRequest, resolve, run_sync
+
+logger = logging.getLogger(__name__)
+
+# Cached geocode of a place the provider does not know
+UNKNOWN_PLACE = ()
+
+
+class WeatherError(Exception):
+    """The provider answered a request with something unusable."""
+
+
+class WeatherProvider:
+    """
+    Where weather comes from.
+
+    Attributes:
+        name (str): Provider name, also the upstream label for metrics
+        forecast_ttl (float): Seconds a forecast may be served from the cache
+        simulated (bool): Whether the weather is made up
+    """
+
+    name = 'provider'
+    forecast_ttl = 900.0
+    simulated = False
+
+    def geocode(self, location):
+        """
+        Coordinates of a place.
+
+        Returns:
+            tuple: (latitude, longitude, display name), or None if the
+            place is not known
+        """
+        raise NotImplementedError
+
+    def forecast(self, latitude, longitude):
+        """
+        Current conditions at a point.
+
+        Returns:
+            tuple: (condition, temperature in degrees Celsius)
+        """
+        raise NotImplementedError
+
+
+class StubProvider(WeatherProvider):
+    """Simulated weather that needs no network and repeats within the hour."""
+
+    name = 'stub'
+    forecast_ttl = 600.0
+    simulated = True
+
+    CONDITIONS = ("sunny", "partly cloudy", "cloudy", "rainy", "stormy", "snowy", "windy", "foggy")
+
+    PLACES = {
+        'new york': (40.7128, -74.0060, 'New York'),
+        'manhattan': (40.7831, -73.9712, 'Manhattan'),
+        'brooklyn': (40.6782, -73.9442, 'Brooklyn'),
+        'jersey city': (40.7178, -74.0431, 'Jersey City'),
+        'london': (51.5072, -0.1276, 'London'),
+        'westminster': (51.4975, -0.1357, 'Westminster'),
+        'paris': (48.8566, 2.3522, 'Paris'),
+        'berlin': (52.5200, 13.4050, 'Berlin'),
+        'tokyo': (35.6762, 139.6503, 'Tokyo'),
+        'san francisco': (37.7749, -122.4194, 'San Francisco'),
+        'oakland': (37.8044, -122.2712, 'Oakland'),
+        'berkeley': (37.8715, -122.2730, 'Berkeley'),
+        'seattle': (47.6062, -122.3321, 'Seattle'),
+        'chicago': (41.8781, -87.6298, 'Chicago'),
+        'sydney': (-33.8688, 151.2093, 'Sydney'),
+        'mumbai': (19.0760, 72.8777, 'Mumbai'),
+    }
+
+    def geocode(self, location):
+        key = normalize_key(location)
+        if not key:
+            return None
+        if key in self.PLACES:
+            return self.PLACES[key]
+        # Any other name gets stable made-up coordinates
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+        latitude = int.from_bytes(digest[:4], 'big') / 2 ** 32 * 130 - 60
+        longitude = int.from_bytes(digest[4:], 'big') / 2 ** 32 * 360 - 180
+        return round(latitude, 4), round(longitude, 4), location.strip()
+
+    def forecast(self, latitude, longitude):
+        rng = random.Random(f"{latitude:.2f},{longitude:.2f},{int(time.time() // 3600)}")
+        temperature = round(30 - abs(latitude) * 0.5 + rng.uniform(-6, 6))
+        return rng.choice(self.CONDITIONS), temperature
+
+
+# WMO weather interpretation codes used by Open-Meteo
+WMO_CONDITIONS = {
+    0: 'clear', 1: 'mostly clear', 2: 'partly cloudy', 3: 'overcast',
+    45: 'foggy', 48: 'foggy',
+    51: 'drizzly', 53: 'drizzly', 55: 'drizzly', 56: 'freezing drizzle', 57: 'freezing drizzle',
+    61: 'rainy', 63: 'rainy', 65: 'pouring', 66: 'freezing rain', 67: 'freezing rain',
+    71: 'snowy', 73: 'snowy', 75: 'heavy snow', 77: 'snowy',
+    80: 'showery', 81: 'showery', 82: 'heavy showers', 85: 'snow showers', 86: 'snow showers',
+    95: 'stormy', 96: 'stormy with hail', 99: 'stormy with hail',
+}
+
+
+class OpenMeteoProvider(WeatherProvider):
+    """Open-Meteo geocoding and current conditions; its models update every 15 minutes."""
+
+    name = 'open-meteo'
+    forecast_ttl = 900.0
+
+    GEOCODE_URL = 'https://geocoding-api.open-meteo.com/v1/search'
+    FORECAST_URL = 'https://api.open-meteo.com/v1/forecast'
+
+    def geocode(self, location):
+        response = yield UpstreamRequest('GET', f"{self.GEOCODE_URL}?name={quote_plus(location.strip())}&count=1",
+                                         name=self.name)
+        if response.status_code != 200:
+            raise WeatherError(f"geocoding answered {response.status_code}")
+        results = response.json().get('results') or []
+        if not results:
+            return None
+        place = results[0]
+        name = ', '.join(part for part in (place.get('name'), place.get('country')) if part)
+        return place['latitude'], place['longitude'], name or location.strip()
+
+    def forecast(self, latitude, longitude):
+        response = yield UpstreamRequest('GET', f"{self.FORECAST_URL}?latitude={latitude:.4f}&longitude={longitude:.4f}"
+                                                f"&current=temperature_2m,weather_code", name=self.name)
+        if response.status_code != 200:
+            raise WeatherError(f"forecast answered {response.status_code}")
+        try:
+            current = response.json()['current']
+            return WMO_CONDITIONS.get(current['weather_code'], 'unsettled'), round(current['temperature_2m'])
+        except (KeyError, TypeError, ValueError) as e:
+            raise WeatherError(f"unexpected forecast response: {e}")
+
+
+PROVIDERS = {
+    'stub': StubProvider,
+    'open-meteo': OpenMeteoProvider,
+}
+
+
+def provider_for(name):
+    """
+    The provider registered under name.
+
+    Raises:
+        ValueError: If there is no such provider
+    """
+    try:
+        return PROVIDERS[name.lower()]()
+    except KeyError:
+        raise ValueError(f"Unknown weather provider {name!r}; choose from {', '.join(sorted(PROVIDERS))}")
+
+
+class WeatherService:
+    """
+    Cached weather lookups for place names.
+
+    Args:
+        provider (WeatherProvider): Where geocodes and forecasts come from
+        grid (float): Size in degrees of the cells forecasts are cached by
+        geocode_ttl (float): Seconds a known place's coordinates are kept
+        unknown_ttl (float): Seconds an unknown place name is remembered
+        cache_bytes (int): Budget of each of the two caches
+        recent_seconds (float): How long a place asked about is kept fresh by prefetch()
+        max_recent (int): Most places prefetch() keeps fresh
+    """
+
+    def __init__(self, provider, grid=0.25, geocode_ttl=30 * 86400.0, unknown_ttl=3600.0,
+                 cache_bytes=256 * 1024, recent_seconds=3600.0, max_recent=64):
+        self.provider = provider
+        self.grid = grid
+        self.geocode_ttl = geocode_ttl
+        self.unknown_ttl = unknown_ttl
+        self.recent_seconds = recent_seconds
+        self.max_recent = max_recent
+        self.geocode_cache = TTLCache(max_bytes=cache_bytes, ttl=geocode_ttl)
+        self.forecast_cache = TTLCache(max_bytes=cache_bytes, ttl=provider.forecast_ttl)
+        self.upstream_calls = 0
+        self.prefetched = 0
+        self.prefetch_errors = 0
+        self._recent = collections.OrderedDict()  # cell -> last asked, monotonic
+        self._expires = {}  # cell -> when its cached forecast expires, monotonic
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @classmethod
+    def from_env(cls, provider):
+        """Build a service from the WEATHER_* environment variables."""
+        return cls(provider,
+                   grid=float(os.getenv('WEATHER_GRID_DEGREES', '0.25')),
+                   geocode_ttl=float(os.getenv('WEATHER_GEOCODE_TTL', str(30 * 86400))),
+                   cache_bytes=int(os.getenv('WEATHER_CACHE_BYTES', str(256 * 1024))),
+                   recent_seconds=float(os.getenv('WEATHER_RECENT_SECONDS', '3600')))
+
+    def cell(self, latitude, longitude):
+        """The grid cell holding a point."""
+        return math.floor(latitude / self.grid), math.floor(longitude / self.grid)
+
+    def lookup(self, location):
+        """
+        Current weather for a place name, as an exchange.
+
+        Returns:
+            dict: place, condition, temperature and simulated, or None if
+            the provider does not know the place
+        """
+        key = normalize_key(location)
+        place = self.geocode_cache.get(key)
+        if place is None:
+            self.upstream_calls += 1
+            place = (yield from resolve(self.provider.geocode(location))) or UNKNOWN_PLACE
+            self.geocode_cache.set(key, tuple(place), ttl=self.geocode_ttl if place else self.unknown_ttl)
+        if not place:
+            return None
+
+        latitude, longitude, name = place
+        cell = self.cell(latitude, longitude)
+        forecast = self.forecast_cache.get(cell)
+        if forecast is None:
+            forecast = yield from self._fetch(cell)
+        with self._lock:
+            self._recent[cell] = time.monotonic()
+            self._recent.move_to_end(cell)
+            while len(self._recent) > self.max_recent:
+                evicted, _ = self._recent.popitem(last=False)
+                self._expires.pop(evicted, None)
+        condition, temperature = forecast
+        return {'place': name, 'condition': condition, 'temperature': temperature,
+                'simulated': self.provider.simulated}
+
+    def _fetch(self, cell):
+        """Fetch and cache the forecast for the centre of a cell."""
+        self.upstream_calls += 1
+        latitude = round((cell[0] + 0.5) * self.grid, 4)
+        longitude = round((cell[1] + 0.5) * self.grid, 4)
+        condition, temperature = yield from resolve(self.provider.forecast(latitude, longitude))
+        forecast = (condition, temperature)
+        self.forecast_cache.set(cell, forecast)
+        with self._lock:
+            self._expires[cell] = time.monotonic() + self.provider.forecast_ttl
+        return forecast
+
+    def prefetch(self, client, horizon=0.0):
+        """
+        Fetch again the forecasts of recently asked cells that expire soon.
+
+        Args:
+            client: HttpClient to drive the provider with
+            horizon (float): Refresh forecasts expiring within this many seconds
+
+        Returns:
+            int: Forecasts fetched
+        """
+        now = time.monotonic()
+        with self._lock:
+            for cell in [cell for cell, asked in self._recent.items() if now - asked > self.recent_seconds]:
+                del self._recent[cell]
+                self._expires.pop(cell, None)
+            due = [cell for cell in self._recent if self._expires.get(cell, 0.0) - now <= horizon]
+        fetched = 0
+        for cell in due:
+            try:
+                run_sync(self._fetch(cell), client)
+                fetched += 1
+            except Exception as e:
+                self.prefetch_errors += 1
+                logger.warning("Weather prefetch for cell %s failed: %s", cell, e)
+        self.prefetched += fetched
+        return fetched
+
+    def start_prefetch(self, client, interval):
+        """Prefetch every interval seconds on a background thread; 0 or less does nothing."""
+        if interval <= 0 or self._thread is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                # Anything that would expire before the next round is fetched now
+                self.prefetch(client, horizon=interval)
+
+        self._thread = threading.Thread(target=run, name='kael-weather-prefetch', daemon=True)
+        self._thread.start()
+
+    def stats(self):
+        return {
+            'provider': self.provider.name,
+            'grid_degrees': self.grid,
+            'forecast_ttl': self.provider.forecast_ttl,
+            'recent_cells': len(self._recent),
+            'upstream_calls': self.upstream_calls,
+            'prefetched': self.prefetched,
+            'prefetch_errors': self.prefetch_errors,
+            'geocode_cache': self.geocode_cache.stats(),
+            'forecast_cache': self.forecast_cache.stats(),
+        }
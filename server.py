@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import os
 import sys
@@ -11,16 +11,56 @@ import requests
 import json
 import random
 import re
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import quote_plus
 from dotenv import load_dotenv
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+from kael_api.admin import admin_allowed
+from kael_api.admission import AdmissionControl, install_admission
+from kael_api.asgi import serve_asgi
+from kael_api.batch import BatchError, batch_payload, parse_batch, run_batch
+from kael_api.breaker import BreakerOpenError, breaker_for, breaker_stats, degraded
+from kael_api.cache import TTLCache, normalize_key
+from kael_api.channel import CHANNEL, install_channel
+from kael_api.health import HealthProber, Probe, model_url
+from kael_api.http_client import default_client
+from kael_api.intents import build_router
+from kael_api.knowledge import KnowledgeBase
+from kael_api.logs import configure_logging, install_request_ids, logging_stats
+from kael_api.metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, instrument_flask,
+                              latency_summary, observe_intent, process_stats, server_collector)
+from kael_api.news import GENERAL, NewsFeed, NewsFile, RssFeeds
+from kael_api.profiling import PROFILER, span
+from kael_api.prompt_cache import PromptCache
+from kael_api.responses import ResponseCatalogue
+from kael_api.sessions import SessionStore, session_id
+from kael_api.speech import SpeechWorker
+from kael_api.streaming import (STREAM_HEADERS, STREAM_MIMETYPES, EmptyStreamError, GeminiStream,
+                                UpstreamStatusError, iter_text, stream_events, stream_format, stream_url)
+from kael_api.singleflight import default_flight
+from kael_api.upstream import (Race, RaceTimeout, UpstreamRequest, configure_race_pool, race_pool_stats,
+                               request_key, resolve, run_sync)
+from kael_api.weather import WeatherService, provider_for
+
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
+# Logging: records are written from a background thread, as JSON lines
+# (KAEL_LOG_FORMAT=text for plain lines), messages are cut to
+# LOG_MAX_CHARS and each logger may emit LOG_RATE records per second
+LOG_LEVEL = os.getenv('KAEL_LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('KAEL_LOG_FORMAT', 'json')
+LOG_MAX_CHARS = int(os.getenv('KAEL_LOG_MAX_CHARS', '2000'))
+LOG_RATE = float(os.getenv('KAEL_LOG_RATE', '50'))
+LOG_BURST = int(os.getenv('KAEL_LOG_BURST', '100'))
+LOG_QUEUE_SIZE = int(os.getenv('KAEL_LOG_QUEUE_SIZE', '10000'))
+configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, max_chars=LOG_MAX_CHARS, rate=LOG_RATE, burst=LOG_BURST,
+                  queue_size=LOG_QUEUE_SIZE)
+
 # Add the parent directory to the path so we can import from kael
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -39,69 +79,281 @@ NEWS_ENABLED = os.getenv('ENABLE_NEWS', 'true').lower() == 'true'
 WEATHER_ENABLED = os.getenv('ENABLE_WEATHER', 'true').lower() == 'true'
 GEMINI_ENABLED = os.getenv('ENABLE_GEMINI', 'true').lower() == 'true'
 
+# Search result cache: answers live for SEARCH_CACHE_TTL seconds, misses and
+# errors for SEARCH_NEGATIVE_TTL, within a SEARCH_CACHE_BYTES memory budget
+SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', '300'))
+SEARCH_NEGATIVE_TTL = float(os.getenv('SEARCH_NEGATIVE_TTL', '30'))
+SEARCH_CACHE_BYTES = int(os.getenv('SEARCH_CACHE_BYTES', str(1024 * 1024)))
+
+# Weather: WEATHER_PROVIDER is 'stub' (simulated, no network) or 'open-meteo';
+# forecasts are cached per grid cell for the provider's TTL (see
+# kael_api.weather for the WEATHER_* cache settings), and those of places
+# asked about recently are fetched again every WEATHER_PREFETCH_INTERVAL
+# seconds before they expire (0 disables prefetching)
+WEATHER_PROVIDER = os.getenv('WEATHER_PROVIDER', 'stub')
+WEATHER_PREFETCH_INTERVAL = float(os.getenv('WEATHER_PREFETCH_INTERVAL', '60'))
+
 # Google Gemini API configuration
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
+GEMINI_API_URL = os.getenv('GEMINI_API_URL', "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent")
+GEMINI_STREAM_URL = stream_url(GEMINI_API_URL)
+
+# DuckDuckGo instant answer API (no API key needed)
+SEARCH_API_URL = os.getenv('SEARCH_API_URL', "https://api.duckduckgo.com/")
+
+# Gemini prompt cache: identical requests reuse a response for GEMINI_CACHE_TTL
+# seconds. GEMINI_CACHE_NORMALIZE also matches prompts differing only in case
+# and whitespace; GEMINI_CACHE_PATH persists the cache to a SQLite file.
+GEMINI_CACHE_TTL = float(os.getenv('GEMINI_CACHE_TTL', '3600'))
+GEMINI_CACHE_BYTES = int(os.getenv('GEMINI_CACHE_BYTES', str(4 * 1024 * 1024)))
+GEMINI_CACHE_NORMALIZE = os.getenv('GEMINI_CACHE_NORMALIZE', 'false').lower() == 'true'
+GEMINI_CACHE_PATH = os.getenv('GEMINI_CACHE_PATH', '')
+
+# Speculative answers: with SPECULATIVE_ANSWERS, questions go to the local
+# knowledge base, web search and Gemini at once, and the first good answer
+# within SPECULATIVE_BUDGET seconds is used
+SPECULATIVE_ANSWERS = os.getenv('SPECULATIVE_ANSWERS', 'false').lower() == 'true'
+SPECULATIVE_BUDGET = float(os.getenv('SPECULATIVE_BUDGET', '8'))
+
+# Local knowledge base (JSON Lines) answering searches the web could not
+KNOWLEDGE_PATH = os.getenv('KNOWLEDGE_PATH',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'knowledge.jsonl'))
+
+# Canned responses (greetings, jokes, help, simulated news), reloaded when
+# the file changes; checked every RESPONSES_CHECK_INTERVAL seconds, 0 to never reload
+RESPONSES_PATH = os.getenv('RESPONSES_PATH',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'responses.json'))
+RESPONSES_CHECK_INTERVAL = float(os.getenv('RESPONSES_CHECK_INTERVAL', '2'))
+
+# News: headlines are ingested on a background thread every
+# NEWS_REFRESH_INTERVAL seconds (0 to refresh only when a read finds them
+# stale) from NEWS_FEEDS, comma-separated topic=RSS URL pairs, or without
+# feeds from the NEWS_PATH file (JSON Lines); commands answer from memory
+NEWS_PATH = os.getenv('NEWS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'news.jsonl'))
+NEWS_FEEDS = os.getenv('NEWS_FEEDS', '')
+NEWS_REFRESH_INTERVAL = float(os.getenv('NEWS_REFRESH_INTERVAL', '300'))
+
+# Speech queue: TTS_QUEUE_POLICY is drop_oldest, drop_newest or coalesce when
+# TTS_QUEUE_SIZE utterances are waiting; TTS_INTERRUPT cuts off the previous
+# answer as soon as a new one is ready
+TTS_QUEUE_SIZE = int(os.getenv('TTS_QUEUE_SIZE', '4'))
+TTS_QUEUE_POLICY = os.getenv('TTS_QUEUE_POLICY', 'drop_oldest').lower()
+TTS_INTERRUPT = os.getenv('TTS_INTERRUPT', 'true').lower() == 'true'
+
+# Batch commands: POST /api/command/batch accepts up to BATCH_MAX_COMMANDS
+# commands and runs at most BATCH_MAX_PARALLEL of them at once
+BATCH_MAX_COMMANDS = int(os.getenv('BATCH_MAX_COMMANDS', '50'))
+BATCH_MAX_PARALLEL = int(os.getenv('BATCH_MAX_PARALLEL', '8'))
 
 # Check if Gemini API is properly configured
 if GEMINI_ENABLED and not GEMINI_API_KEY:
     logger.warning("Gemini API is enabled but no API key is provided. Set GEMINI_API_KEY in .env file.")
     GEMINI_ENABLED = False
 else:
-    logger.info(f"Gemini API {'enabled' if GEMINI_ENABLED else 'disabled'}")
+    logger.info("Gemini API %s", 'enabled' if GEMINI_ENABLED else 'disabled')
 
 app = Flask(__name__)
 # Enable CORS for all routes with more explicit configuration
 CORS(app, resources={r"/*": {"origins": "*", "allow_headers": ["Content-Type"], "methods": ["GET", "POST", "OPTIONS"]}})
 
+# Per-route latency, status and in-flight metrics for /api/metrics
+instrument_flask(app)
+
+# Request IDs for log records, echoed in X-Request-ID
+install_request_ids(app)
+
+# Per-client rate limits and a cap on concurrent expensive requests; excess
+# requests get 429 or 503 with Retry-After instead of queueing on threads
+admission = AdmissionControl.from_env()
+install_admission(app, admission)
+
+# Speculative answers race the knowledge base, web search and Gemini on
+# threads: one per source for each request admitted at once
+configure_race_pool(3 * (admission.slots.max_active or 32))
+
+# Shared keep-alive client for outbound calls to Gemini and DuckDuckGo
+http_client = default_client()
+
+# Circuit breakers for each upstream, listed in /api/status from the start
+UPSTREAMS = ('gemini', 'duckduckgo')
+for _upstream in UPSTREAMS:
+    breaker_for(_upstream)
+
+# Background probes of each upstream with cheap requests (Gemini's model
+# metadata costs no tokens), so /api/health never spends an upstream call
+health = HealthProber.from_env([
+    Probe('gemini', UpstreamRequest('GET', f"{model_url(GEMINI_API_URL)}?key={GEMINI_API_KEY}", name='gemini')
+          if GEMINI_ENABLED and GEMINI_API_KEY else None, reason='Gemini API key not configured'),
+    Probe('duckduckgo', UpstreamRequest('GET', f"{SEARCH_API_URL}?format=json", name='duckduckgo')
+          if SEARCH_ENABLED else None, reason='web search disabled'),
+])
+health.start()
+
+# Thread pool shared by batch requests
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_PARALLEL, thread_name_prefix='kael-batch')
+
+# Cache of search answers keyed on the normalized query
+search_cache = TTLCache(max_bytes=SEARCH_CACHE_BYTES, ttl=SEARCH_CACHE_TTL)
+
+# Cache of Gemini responses keyed on the prompt and generation config
+prompt_cache = PromptCache(ttl=GEMINI_CACHE_TTL, max_bytes=GEMINI_CACHE_BYTES,
+                           normalize=GEMINI_CACHE_NORMALIZE, path=GEMINI_CACHE_PATH or None)
+
+# Weather behind a provider, with geocodes and grid-cell forecasts cached
+weather = WeatherService.from_env(provider_for(WEATHER_PROVIDER))
+if WEATHER_ENABLED:
+    weather.start_prefetch(http_client, WEATHER_PREFETCH_INTERVAL)
+
+# Headlines ingested in the background and indexed by topic and recency
+news = NewsFeed(RssFeeds(RssFeeds.parse(NEWS_FEEDS)) if NEWS_FEEDS else NewsFile(NEWS_PATH), http_client,
+                refresh_interval=NEWS_REFRESH_INTERVAL)
+if NEWS_ENABLED:
+    news.start()
+
+# Indexed on a background thread so startup does not wait for it
+knowledge = KnowledgeBase(KNOWLEDGE_PATH)
+knowledge.warm()
+
+# Canned responses, compiled once and picked without building new strings
+responses = ResponseCatalogue([RESPONSES_PATH], check_interval=RESPONSES_CHECK_INTERVAL)
+responses.watch()
+
+# Recent turns of each client's conversation, for follow-up questions to Gemini
+sessions = SessionStore.from_env()
+
 # Gemini API function
-def ask_gemini(prompt, temperature=0.7):
+def ask_gemini(prompt, temperature=0.7, fresh=False):
     """
     Send a prompt to the Google Gemini API and get a response.
     
     Args:
         prompt (str): The prompt to send to Gemini
         temperature (float): Controls randomness in the response (0.0 to 1.0)
+        fresh (bool): Skip the prompt cache lookup to get a new sample
         
     Returns:
         str: The response from Gemini, or an error message if the request fails
     """
+    return run_sync(gemini_exchange(prompt, temperature, fresh), http_client)
+
+def gemini_exchange(prompt, temperature=0.7, fresh=False):
+    """ask_gemini as an upstream exchange, so either serving mode can drive it."""
+    text, _ = yield from gemini_lookup(prompt, temperature, fresh)
+    return text
+
+def gemini_lookup(prompt, temperature=0.7, fresh=False):
+    """gemini_exchange returning (text, ok), where ok is False for error messages."""
     if not GEMINI_ENABLED or not GEMINI_API_KEY:
-        return "Gemini API is not configured. Please set GEMINI_API_KEY in the .env file."
+        return "Gemini API is not configured. Please set GEMINI_API_KEY in the .env file.", False
     
-    try:
-        logger.info(f"Sending prompt to Gemini API: {prompt[:50]}...")
-        
-        headers = {
-            "Content-Type": "application/json",
-        }
+    generation_config = _generation_config(temperature)
+    
+    if fresh:
+        prompt_cache.skip()
+    else:
+        cached = prompt_cache.get(prompt, generation_config)
+        if cached is not None:
+            logger.info("Gemini prompt cache hit: %s...", prompt[:50])
+            return cached, True
+    
+    # A fresh sample must not be shared with other callers
+    text, ok = yield from _request_gemini(prompt, generation_config, coalesce=not fresh)
+    # Only real answers are cached; errors should be retried
+    if ok:
+        prompt_cache.set(prompt, generation_config, text)
+    return text, ok
+
+def gemini_stream(prompt, temperature=0.7, fresh=False):
+    """
+    ask_gemini as a GeminiStream, relaying the answer as it is generated.
+    
+    Args:
+        prompt (str): The prompt to send to Gemini
+        temperature (float): Controls randomness in the response (0.0 to 1.0)
+        fresh (bool): Skip the prompt cache lookup to get a new sample
         
-        data = {
-            "contents": [
-                {
-                    "parts": [
-                        {
-                            "text": prompt
-                        }
-                    ]
-                }
-            ],
-            "generationConfig": {
-                "temperature": temperature,
-                "maxOutputTokens": 800,
-                "topP": 0.95,
-                "topK": 40
+    Returns:
+        GeminiStream: Streaming request, or the cached answer as a single chunk
+    """
+    if not GEMINI_ENABLED or not GEMINI_API_KEY:
+        return GeminiStream(text="Gemini API is not configured. Please set GEMINI_API_KEY in the .env file.")
+    
+    generation_config = _generation_config(temperature)
+    
+    if fresh:
+        prompt_cache.skip()
+    else:
+        cached = prompt_cache.get(prompt, generation_config)
+        if cached is not None:
+            logger.info("Gemini prompt cache hit: %s...", prompt[:50])
+            return GeminiStream(text=cached)
+    
+    logger.info("Streaming prompt to Gemini API: %s...", prompt[:50])
+    url = f"{GEMINI_STREAM_URL}?alt=sse&key={GEMINI_API_KEY}"
+    return GeminiStream(
+        request=UpstreamRequest('POST', url, headers=_GEMINI_HEADERS,
+                                json=_gemini_body(prompt, generation_config), name='gemini'),
+        on_complete=lambda text: prompt_cache.set(prompt, generation_config, text),
+        on_error=_gemini_stream_error
+    )
+
+# Answer while the Gemini circuit breaker is open, see kael_api.breaker
+GEMINI_UNAVAILABLE = "Gemini is temporarily unavailable, so I can't answer that right now. Please try again in a few seconds."
+
+def _gemini_stream_error(e):
+    """Message sent in place of a Gemini stream that failed before any text."""
+    if isinstance(e, UpstreamStatusError):
+        logger.error("Gemini API error: %s - %s", e.status_code, e.body)
+        return f"I encountered an error while processing your request. Status code: {e.status_code}"
+    if isinstance(e, EmptyStreamError):
+        return "I received a response from Gemini, but couldn't extract the text. Please try again."
+    if isinstance(e, BreakerOpenError):
+        return GEMINI_UNAVAILABLE
+    logger.error("Error in Gemini API stream: %s", e, exc_info=True)
+    return f"I encountered an error while communicating with Gemini: {str(e)}"
+
+_GEMINI_HEADERS = {
+    "Content-Type": "application/json",
+}
+
+def _generation_config(temperature):
+    return {
+        "temperature": temperature,
+        "maxOutputTokens": 800,
+        "topP": 0.95,
+        "topK": 40
+    }
+
+def _gemini_body(prompt, generation_config):
+    return {
+        "contents": [
+            {
+                "parts": [
+                    {
+                        "text": prompt
+                    }
+                ]
             }
-        }
+        ],
+        "generationConfig": generation_config
+    }
+
+def _request_gemini(prompt, generation_config, coalesce=True):
+    """Call the Gemini API, returning the response text and whether it succeeded."""
+    try:
+        logger.info("Sending prompt to Gemini API: %s...", prompt[:50])
         
         # Add API key as a query parameter
         url = f"{GEMINI_API_URL}?key={GEMINI_API_KEY}"
         
-        response = requests.post(url, headers=headers, json=data)
+        data = _gemini_body(prompt, generation_config)
+        response = yield UpstreamRequest('POST', url, headers=_GEMINI_HEADERS, json=data,
+                                         key=request_key('POST', url, data) if coalesce else None,
+                                         name='gemini')
         
         if response.status_code != 200:
-            logger.error(f"Gemini API error: {response.status_code} - {response.text}")
-            return f"I encountered an error while processing your request. Status code: {response.status_code}"
+            logger.error("Gemini API error: %s - %s", response.status_code, response.text)
+            return f"I encountered an error while processing your request. Status code: {response.status_code}", False
         
         response_data = response.json()
         
@@ -111,34 +363,65 @@ def ask_gemini(prompt, temperature=0.7):
             if "content" in candidate and "parts" in candidate["content"]:
                 parts = candidate["content"]["parts"]
                 if len(parts) > 0 and "text" in parts[0]:
-                    return parts[0]["text"]
+                    return parts[0]["text"], True
         
-        return "I received a response from Gemini, but couldn't extract the text. Please try again."
+        return "I received a response from Gemini, but couldn't extract the text. Please try again.", False
     
+    except RaceTimeout:
+        # Cut off by a race; its caller counts it, and nothing is cached
+        raise
+    except BreakerOpenError:
+        return GEMINI_UNAVAILABLE, False
     except Exception as e:
-        logger.error(f"Error in Gemini API request: {str(e)}", exc_info=True)
-        return f"I encountered an error while communicating with Gemini: {str(e)}"
+        logger.error("Error in Gemini API request: %s", e, exc_info=True)
+        return f"I encountered an error while communicating with Gemini: {str(e)}", False
 
 # Web search and information retrieval functions
 def search_web(query):
-    """Search the web for information."""
+    """Search the web for information, answering repeated queries from the cache."""
+    return run_sync(search_exchange(query), http_client)
+
+def search_exchange(query):
+    """search_web as an upstream exchange, so either serving mode can drive it."""
+    result, _ = yield from search_lookup(query)
+    return result
+
+def search_lookup(query):
+    """search_exchange returning (text, found), where found is False for fallback answers."""
+    key = normalize_key(query)
+    cached = search_cache.get(key)
+    if cached is not None:
+        logger.info("Search cache hit for: %s", query)
+        return cached
+    
+    result, found = yield from _search_duckduckgo(query, key)
+    # Misses and errors are cached briefly so a retry soon asks again
+    search_cache.set(key, (result, found), ttl=SEARCH_CACHE_TTL if found else SEARCH_NEGATIVE_TTL)
+    return result, found
+
+def _search_duckduckgo(query, key):
+    """
+    Query DuckDuckGo, returning the answer text and whether anything was found.
+    
+    Concurrent searches with the same normalized key share one request.
+    """
     try:
-        logger.info(f"Searching web for: {query}")
+        logger.info("Searching web for: %s", query)
         
         # Use DuckDuckGo for search (no API key needed)
-        search_url = f"https://api.duckduckgo.com/?q={quote_plus(query)}&format=json"
-        response = requests.get(search_url, headers={
+        search_url = f"{SEARCH_API_URL}?q={quote_plus(query)}&format=json"
+        response = yield UpstreamRequest('GET', search_url, headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+        }, key=f"search:{key}", name='duckduckgo')
         
         if response.status_code != 200:
-            return f"I couldn't find information about {query}. The search service returned an error."
+            return f"I couldn't find information about {query}. The search service returned an error.", False
         
         data = response.json()
         
         # Extract the abstract text if available
         if data.get('Abstract'):
-            return data['Abstract']
+            return data['Abstract'], True
         
         # If no abstract, try to get information from related topics
         if data.get('RelatedTopics') and len(data['RelatedTopics']) > 0:
@@ -150,17 +433,26 @@ def search_web(query):
                     results.append(topic['Text'])
             
             if results:
-                return "Here's what I found: " + " ".join(results)
+                return "Here's what I found: " + " ".join(results), True
         
-        # If all else fails, suggest a web search
-        return f"I couldn't find specific information about {query}. Would you like me to open a web search?"
+        # If all else fails, try the local knowledge base, then suggest a web search
+        return knowledge.answer(query) or f"I couldn't find specific information about {query}. Would you like me to open a web search?", False
     
+    except RaceTimeout:
+        # Cut off by a race; its caller counts it, and nothing is cached
+        raise
+    except BreakerOpenError:
+        return knowledge.answer(query) or f"Web search is temporarily unavailable, so I can't look up {query} right now. Would you like me to open a web browser instead?", False
     except Exception as e:
-        logger.error(f"Error in web search: {str(e)}", exc_info=True)
-        return f"I encountered an error while searching for {query}. Would you like me to open a web browser instead?"
+        logger.error("Error in web search: %s", e, exc_info=True)
+        return knowledge.answer(query) or f"I encountered an error while searching for {query}. Would you like me to open a web browser instead?", False
 
 def get_weather(location=""):
     """Get weather information for a location."""
+    return run_sync(weather_exchange(location), http_client)
+
+def weather_exchange(location=""):
+    """get_weather as an upstream exchange, so either serving mode can drive it."""
     try:
         if not WEATHER_ENABLED:
             return "Weather information is currently disabled. Would you like me to enable this feature?"
@@ -168,314 +460,443 @@ def get_weather(location=""):
         if not location:
             return "I need a location to check the weather. For example, 'weather in New York'."
         
-        # For demo purposes, we'll return a simulated weather response
-        # In a real application, you would use a weather API like OpenWeatherMap
-        weather_conditions = ["sunny", "partly cloudy", "cloudy", "rainy", "stormy", "snowy", "windy", "foggy"]
-        temperatures = range(0, 35)  # 0 to 35 degrees Celsius
-        
-        condition = random.choice(weather_conditions)
-        temperature = random.choice(temperatures)
-        
-        return f"The weather in {location} is currently {condition} with a temperature of {temperature}°C. " + \
-               f"This is a simulated response. To get real weather data, you would need to integrate with a weather API."
+        report = yield from weather.lookup(location)
+        if report is None:
+            return f"I couldn't find a place called {location}."
+        return responses.pick('weather' if report['simulated'] else 'weather.live', {
+            'location': report['place'],
+            'condition': report['condition'],
+            'temperature': report['temperature'],
+        })
     
+    except BreakerOpenError:
+        return f"The weather service is temporarily unavailable, so I can't check the weather for {location} right now."
     except Exception as e:
-        logger.error(f"Error in weather: {str(e)}", exc_info=True)
+        logger.error("Error in weather: %s", e, exc_info=True)
         return f"I encountered an error while checking the weather for {location}."
 
 def get_news(topic=""):
     """Get latest news headlines."""
+    text, _ = news_lookup(topic)
+    return text
+
+def news_lookup(topic=""):
+    """get_news returning (text, headlines), answered from the news index without waiting on a source."""
     try:
         if not NEWS_ENABLED:
-            return "News retrieval is currently disabled. Would you like me to enable this feature?"
-        
-        # For demo purposes, we'll return simulated news
-        # In a real application, you would use a news API like NewsAPI
-        
-        general_news = [
-            "Scientists discover new renewable energy source that could revolutionize power generation.",
-            "Global tech companies announce collaboration on AI safety standards.",
-            "New study suggests regular exercise may improve cognitive function more than previously thought.",
-            "Space agency announces plans for the next lunar mission with international partners.",
-            "Breakthrough in quantum computing achieved by university researchers."
-        ]
-        
-        tech_news = [
-            "New smartphone with revolutionary battery technology unveiled today.",
-            "Major software company releases significant update to its operating system.",
-            "Artificial intelligence system beats human experts in complex problem-solving competition.",
-            "Tech startup receives record funding for innovative augmented reality platform.",
-            "New cybersecurity threat identified, experts recommend immediate system updates."
-        ]
-        
-        science_news = [
-            "Researchers identify potential new treatment for common neurological disorder.",
-            "New species of deep-sea creatures discovered in ocean exploration mission.",
-            "Climate scientists report unexpected changes in global weather patterns.",
-            "Astronomers observe unusual stellar phenomenon never before documented.",
-            "Breakthrough in renewable materials could reduce plastic waste significantly."
-        ]
-        
-        if "tech" in topic.lower():
-            news_items = tech_news
-            topic_name = "technology"
-        elif "science" in topic.lower():
-            news_items = science_news
-            topic_name = "science"
-        else:
-            news_items = general_news
-            topic_name = "general"
-        
-        # Select 3 random news items
-        selected_news = random.sample(news_items, min(3, len(news_items)))
-        
-        news_text = f"Here are the latest {topic_name} headlines:\n\n"
-        for i, item in enumerate(selected_news, 1):
-            news_text += f"{i}. {item}\n"
-        
-        news_text += "\nThis is simulated news. To get real news updates, you would need to integrate with a news API."
-        return news_text
+            return "News retrieval is currently disabled. Would you like me to enable this feature?", ()
+        
+        # A topic the index does not know gets general news
+        topic_name = news.index.topic_for(topic) or GENERAL
+        items = news.headlines(topic_name, 3)
+        if not items:
+            return responses.pick('news.empty', {'topic': topic_name}), items
+        
+        # The newest headlines, numbered
+        return responses.pick('news', {
+            'topic': topic_name,
+            'headlines': '\n'.join([f"{i}. {item.title}" for i, item in enumerate(items, 1)]),
+        }), items
     
     except Exception as e:
-        logger.error(f"Error in news: {str(e)}", exc_info=True)
-        return f"I encountered an error while retrieving news about {topic if topic else 'current events'}."
+        logger.error("Error in news: %s", e, exc_info=True)
+        return f"I encountered an error while retrieving news about {topic if topic else 'current events'}.", ()
 
-# Initialize text-to-speech engine if available
-if has_tts:
+# Text-to-speech engine settings, applied on the speech worker thread
+def create_tts_engine():
     engine = pyttsx3.init()
     engine.setProperty('rate', 170)
     voices = engine.getProperty('voices')
     if len(voices) > 1:
         engine.setProperty('voice', voices[1].id)  # British female if available
+    return engine
+
+# Speech runs on its own thread so responses are not held until spoken
+if has_tts:
+    speech = SpeechWorker(create_tts_engine, max_queue=TTS_QUEUE_SIZE,
+                          policy=TTS_QUEUE_POLICY, interrupt=TTS_INTERRUPT)
+
+# Scrape-time metrics from the caches, speech queue, connection pools, admission control and sessions
+REGISTRY.register_collector(server_collector(
+    {'search': search_cache, 'gemini': prompt_cache,
+     'weather_geocode': weather.geocode_cache, 'weather_forecast': weather.forecast_cache},
+    speech=speech if has_tts else None, client=http_client, flight=default_flight(),
+    admission=admission, sessions=sessions))
+REGISTRY.register_collector(health.collect)
+REGISTRY.register_collector(news.collect)
 
 def speak(text):
     print("KAEL:", text)
     if has_tts:
-        engine.say(text)
-        engine.runAndWait()
+        speech.say(text)
     return text
 
-def execute_command(command):
-    # Basic system commands
-    if "open" in command:
-        app = command.replace("open", "").strip()
-        response = f"Opening {app}"
-        threading.Thread(target=lambda: os.system(f"start {app}")).start()
-    
-    # Web search commands
-    elif any(x in command for x in ["search for", "search", "look up", "find information", "tell me about"]):
-        # Extract the search query
-        for prefix in ["search for", "search", "look up", "find information about", "find information on", "tell me about"]:
-            if prefix in command:
-                query = command.replace(prefix, "").strip()
-                break
-        else:
-            query = command.replace("find", "").strip()
-        
-        # If it's a simple web search request, open the browser
-        if any(x in command for x in ["search the web", "in browser", "open browser"]):
-            response = f"Searching Google for {query}"
-            threading.Thread(target=lambda: webbrowser.open(f"https://www.google.com/search?q={query}")).start()
-        # Otherwise, try to answer directly
-        else:
-            response = search_web(query)
-    
-    # Weather information
-    elif "weather" in command:
-        # Extract location from command
-        location_match = re.search(r"weather (?:in|for|at) ([\w\s]+)", command)
-        if location_match:
-            location = location_match.group(1).strip()
-            response = get_weather(location)
-        else:
-            response = "I need a location to check the weather. For example, try asking 'What's the weather in New York?'"
-    
-    # News information
-    elif "news" in command:
-        # Extract topic from command
-        topic_match = re.search(r"news (?:about|on|regarding) ([\w\s]+)", command)
-        if topic_match:
-            topic = topic_match.group(1).strip()
-            response = get_news(topic)
-        else:
-            response = get_news()  # Get general news
-    
-    # System control commands
-    elif "type" in command:
-        message = command.replace("type", "").strip()
-        response = "Typing now."
-        # We can't use pyautogui here as it would type in the server process
-    
-    elif "play music" in command or "play song" in command:
-        response = "Playing your music. Enjoy the rhythm, sir."
-        # This would need to be configured with actual music paths
-    
-    elif "volume up" in command or "louder" in command:
-        response = "Turning up the volume to your preferred level, sir."
-        # This would need OS-specific volume control
-    
-    elif "volume down" in command or "quieter" in command:
-        response = "Lowering the volume for you, sir."
-        # This would need OS-specific volume control
-    
-    # Time and date commands
-    elif "time" in command:
-        now = datetime.datetime.now().strftime("%I:%M %p")
-        response = f"The current time is {now}, sir."
-    
-    elif "date" in command or "day" in command:
-        now = datetime.datetime.now().strftime("%A, %B %d, %Y")
-        response = f"Today is {now}, sir."
-    
-    # Greeting commands
-    elif "hello" in command or "hi" in command or "hey" in command or "greetings" in command:
-        greetings = [
-            "Hello, sir. How may I assist you today?",
-            "Greetings. I am at your service.",
-            "Hello. All systems are operational and ready for your commands.",
-            "Good day, sir. How can I be of assistance?"
-        ]
-        response = random.choice(greetings)
-    
-    # Identity commands
-    elif "who are you" in command or "your name" in command or "introduce yourself" in command:
-        response = "I am KAEL, Knowledge and Artificially Enhanced Logic. I was designed to assist you with a variety of tasks, much like my inspiration, J.A.R.V.I.S. I can search the web, check the weather, get news updates, and perform various system functions."
-    
-    # Entertainment commands
-    elif "joke" in command or "funny" in command:
-        jokes = [
-            "Why did the AI go to art school? To improve its neural network!",
-            "I would tell you a joke about artificial intelligence, but I'm afraid you wouldn't get it.",
-            "Why don't scientists trust atoms? Because they make up everything!",
-            "What do you call an AI that sings? Artificial Harmonies!",
-            "Why was the computer cold? It left its Windows open.",
-            "What's a computer's favorite snack? Microchips.",
-            "Why did the computer go to the doctor? Because it had a virus!",
-            "How many programmers does it take to change a light bulb? None, that's a hardware problem."
-        ]
-        response = random.choice(jokes)
-    
-    # Help commands
-    elif "help" in command or "what can you do" in command:
-        response = "I can assist with various tasks, sir. I can:\n\n" + \
-                  "1. Search the web for information\n" + \
-                  "2. Check the weather in any location\n" + \
-                  "3. Get the latest news headlines\n" + \
-                  "4. Tell you the time and date\n" + \
-                  "5. Open applications\n" + \
-                  "6. Tell jokes\n" + \
-                  "7. Control system functions\n\n" + \
-                  "Just ask me what you need, and I'll do my best to assist you."
-    
-    # Gratitude responses
-    elif "thank" in command:
-        thanks_responses = [
-            "You're welcome, sir. Always a pleasure to be of service.",
-            "Happy to assist, sir. That's what I'm here for.",
-            "No need for thanks, sir. Serving you is my primary function.",
-            "Of course, sir. Is there anything else you require?"
-        ]
-        response = random.choice(thanks_responses)
-    
-    # Exit commands
-    elif "exit" in command or "quit" in command or "goodbye" in command or "bye" in command:
-        exit_responses = [
-            "Goodbye, sir. I'll be here when you need me.",
-            "Entering standby mode. Call me when you need assistance.",
-            "I'll be here monitoring systems while you're away, sir.",
-            "Until next time, sir."
-        ]
-        response = random.choice(exit_responses)
+# Intent handlers, keyed by intent name from kael_api.intents.INTENTS
+COMMAND_HANDLERS = {}
+
+def command_handler(intent):
+    """Register a function as the handler for an intent."""
+    def register(func):
+        COMMAND_HANDLERS[intent] = func
+        return func
+    return register
+
+# Basic system commands
+@command_handler('open')
+def handle_open(command, slots):
+    app = slots['remainder']
+    threading.Thread(target=lambda: os.system(f"start {app}")).start()
+    return f"Opening {app}"
+
+# Web search commands
+@command_handler('search')
+def handle_search(command, slots):
+    query = slots['remainder']
     
-    # System status commands
-    elif "system" in command or "status" in command:
-        response = "All systems are functioning within normal parameters, sir. CPU usage is optimal, memory allocation is stable, and all subsystems are online. Internet connectivity is active, and I am able to access web services."
+    # If it's a simple web search request, open the browser
+    if any(x in command for x in ["search the web", "in browser", "open browser"]):
+        threading.Thread(target=lambda: webbrowser.open(f"https://www.google.com/search?q={query}")).start()
+        return f"Searching Google for {query}"
+    # Otherwise, try to answer directly
+    return (yield from search_exchange(query))
+
+# Weather information
+@command_handler('weather')
+def handle_weather(command, slots):
+    if 'location' in slots:
+        return weather_exchange(slots['location'])
+    return "I need a location to check the weather. For example, try asking 'What's the weather in New York?'"
+
+# News information
+@command_handler('news')
+def handle_news(command, slots):
+    return get_news(slots.get('topic', ''))  # General news when no topic is given
+
+# System control commands
+@command_handler('type')
+def handle_type(command, slots):
+    # We can't use pyautogui here as it would type in the server process
+    return responses.pick('type')
+
+@command_handler('play_music')
+def handle_play_music(command, slots):
+    # This would need to be configured with actual music paths
+    return responses.pick('play_music')
+
+@command_handler('volume_up')
+def handle_volume_up(command, slots):
+    # This would need OS-specific volume control
+    return responses.pick('volume_up')
+
+@command_handler('volume_down')
+def handle_volume_down(command, slots):
+    # This would need OS-specific volume control
+    return responses.pick('volume_down')
+
+# Time and date commands
+@command_handler('time')
+def handle_time(command, slots):
+    return responses.pick('time')
+
+@command_handler('date')
+def handle_date(command, slots):
+    return responses.pick('date')
+
+# Greeting commands
+@command_handler('greeting')
+def handle_greeting(command, slots):
+    return responses.pick('greeting')
+
+# Identity commands
+@command_handler('identity')
+def handle_identity(command, slots):
+    return responses.pick('identity')
+
+# Entertainment commands
+@command_handler('joke')
+def handle_joke(command, slots):
+    return responses.pick('joke')
+
+# Help commands
+@command_handler('help')
+def handle_help(command, slots):
+    return responses.pick('help')
+
+# Gratitude responses
+@command_handler('thanks')
+def handle_thanks(command, slots):
+    return responses.pick('thanks')
+
+# Exit commands
+@command_handler('exit')
+def handle_exit(command, slots):
+    return responses.pick('exit')
+
+# System status commands
+@command_handler('system_status')
+def handle_system_status(command, slots):
+    return responses.pick('system_status')
+
+def is_question(command):
+    return command.startswith(("what", "who", "how", "why", "when", "where")) or "?" in command
+
+def gemini_prompt(command, history=''):
+    """
+    The Gemini prompt for an unmatched command, or None if Gemini should not answer it.
     
-    # Use Gemini for complex queries or unknown commands
-    else:
-        # Check if it's a question or complex query
-        is_question = command.startswith(("what", "who", "how", "why", "when", "where")) or "?" in command
-        
-        # If Gemini is enabled, use it for complex queries
-        if GEMINI_ENABLED and (is_question or len(command.split()) > 3):
-            # Create a prompt for Gemini
-            prompt = f"""You are KAEL (Knowledge and Artificially Enhanced Logic), an AI assistant inspired by J.A.R.V.I.S.
-            
+    Args:
+        command (str): The user's command
+        history (str): The conversation so far, from SessionStore.context
+    """
+    # If Gemini is enabled, use it for complex queries
+    if GEMINI_ENABLED and (is_question(command) or len(command.split()) > 3):
+        conversation = f"\nThe conversation so far, for context:\n{history}\n" if history else ''
+        return f"""You are KAEL (Knowledge and Artificially Enhanced Logic), an AI assistant inspired by J.A.R.V.I.S.
+{conversation}
 Please respond to the following user query in a helpful, concise, and slightly formal manner:
 
 "{command}"
 
 Keep your response under 150 words and maintain a slightly technical, assistant-like tone.
 """
-            response = ask_gemini(prompt)
-            
-            # Add a prefix to indicate this came from Gemini
-            if not response.startswith("I encountered an error"):
-                response = f"{response}"
-        
-        # Fall back to web search for questions if Gemini is not available
-        elif is_question:
-            response = search_web(command)
-        
-        # Default fallback responses
-        else:
-            default_responses = [
-                "I'm not sure I understand. Would you like me to search the web for information about this?",
-                "I don't have that information in my database. Would you like me to look it up online?",
-                "I'm still learning, sir. Would you like me to search for that on the internet?",
-                "I don't have a specific response for that. Would you like me to search the web for you?"
-            ]
-            response = random.choice(default_responses)
+    return None
+
+# Use Gemini for complex queries or unknown commands
+def handle_unmatched(command, history=''):
+    if SPECULATIVE_ANSWERS and is_question(command):
+        return (yield from speculative_answer(command, history))
+    
+    prompt = gemini_prompt(command, history)
+    if prompt:
+        return (yield from gemini_exchange(prompt))
     
-    return speak(response)
+    # Fall back to web search for questions if Gemini is not available
+    if is_question(command):
+        return (yield from search_exchange(command))
+    
+    # Default fallback responses
+    return responses.pick('unmatched')
+
+def _good_answer(lookup):
+    """Text of a (text, ok) lookup if ok, else None, so a Race only accepts real answers."""
+    text, ok = yield from lookup
+    return text if ok else None
+
+def speculative_answer(command, history=''):
+    """
+    Answer a question from whichever source has a good answer first.
+    
+    The local knowledge base answers at once when it can, and then nothing
+    else is asked. Otherwise web search and Gemini run concurrently; the
+    first real answer within SPECULATIVE_BUDGET seconds wins and the other
+    call is abandoned. Only Gemini sees the conversation history.
+    """
+    candidates = [('knowledge', knowledge.answer(command)), ('search', _good_answer(search_lookup(command)))]
+    prompt = gemini_prompt(command, history)
+    if prompt:
+        candidates.append(('gemini', _good_answer(gemini_lookup(prompt))))
+    race = yield Race(candidates, SPECULATIVE_BUDGET)
+    logger.info("Speculative answer from %s in %.1f ms", race.winner or 'no source', race.elapsed * 1000)
+    if race.winner is None:
+        return "I couldn't find a good answer to that quickly. Would you like me to search the web for it?"
+    return race.value
+
+# Compiled once at import time from the handlers registered above
+COMMAND_ROUTER = build_router(COMMAND_HANDLERS)
+
+def command_exchange(command, session=None):
+    """
+    Route a command to its handler, yielding any upstream calls it makes.
+    
+    With a session ID, Gemini sees the session's earlier turns and the
+    command and its response are added to them.
+    """
+    with span('match_intent'):
+        match = COMMAND_ROUTER.match(command)
+    intent = match.intent if match else 'unmatched'
+    started = time.perf_counter()
+    try:
+        with span(f"intent:{intent}"):
+            if match:
+                response = COMMAND_HANDLERS[match.intent](command, match.slots)
+            else:
+                response = handle_unmatched(command, sessions.context(session))
+            response = yield from resolve(response)
+        sessions.record(session, command, response)
+        return response
+    finally:
+        observe_intent(intent, time.perf_counter() - started)
+
+def execute_command(command, session=None):
+    with span('execute_command'):
+        response = run_sync(command_exchange(command, session), http_client)
+        with span('tts'):
+            return speak(response)
+
+def command_stream(command, session=None):
+    """A GeminiStream for a command Gemini answers, or None if it is answered another way."""
+    if COMMAND_ROUTER.match(command) or (SPECULATIVE_ANSWERS and is_question(command)):
+        return None
+    prompt = gemini_prompt(command, sessions.context(session))
+    if not prompt:
+        return None
+    stream = gemini_stream(prompt)
+    if session:
+        stream.add_done_callback(lambda text: sessions.record(session, command, text))
+    return stream
+
+def command_done(command, response):
+    """Final payload of a command, speaking the response."""
+    return {
+        'command': command,
+        'response': speak(response),
+        'timestamp': datetime.datetime.now().isoformat()
+    }
+
+def streaming_response(events, fmt):
+    return Response(stream_with_context(events), mimetype=STREAM_MIMETYPES[fmt], headers=STREAM_HEADERS)
 
 @app.route('/api/command', methods=['POST'])
+@PROFILER.profiled('process_command')
 def process_command():
+    started = time.perf_counter()
     try:
         logger.info("Received command request")
-        data = request.json
+        with span('parse_json'):
+            data = request.json
         if not data:
             logger.warning("No JSON data in request")
             return jsonify({'error': 'No JSON data provided'}), 400
             
         command = data.get('command', '').lower()
-        logger.info(f"Processing command: {command}")
+        with span('logging'):
+            logger.info("Processing command: %s", command)
         
         if not command:
             logger.warning("Empty command received")
             return jsonify({'error': 'No command provided'}), 400
         
-        response = execute_command(command)
-        logger.info(f"Command processed, response: {response}")
-        
-        return jsonify({
-            'command': command,
-            'response': response,
-            'timestamp': datetime.datetime.now().isoformat()
-        })
+        session = session_id(data, request.headers)
+        fmt = stream_format(data, request.headers.get('Accept', ''))
+        if fmt:
+            # Only Gemini answers arrive in pieces; anything else is one chunk
+            stream = command_stream(command, session)
+            chunks = iter_text(stream, http_client) if stream else \
+                [run_sync(command_exchange(command, session), http_client)]
+            return streaming_response(
+                stream_events(chunks, fmt, lambda text: command_done(command, text), started), fmt)
+        
+        response = execute_command(command, session)
+        with span('logging'):
+            logger.info("Command processed, response: %s", response)
+        
+        with span('json_encode'):
+            return jsonify({
+                'command': command,
+                'response': response,
+                'timestamp': datetime.datetime.now().isoformat()
+            })
     except Exception as e:
-        logger.error(f"Error processing command: {str(e)}", exc_info=True)
+        logger.error("Error processing command: %s", e, exc_info=True)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+@app.route('/api/command/batch', methods=['POST'])
+def process_command_batch():
+    """
+    Run a list of commands concurrently and return their results in order.
+    
+    Responses are not spoken; a batch is for automation, not conversation.
+    """
+    started = time.perf_counter()
+    try:
+        commands, parallelism = parse_batch(request.json, BATCH_MAX_COMMANDS, BATCH_MAX_PARALLEL)
+        logger.info("Processing batch of %s commands, %s at a time", len(commands), parallelism)
+        
+        results = run_batch(commands, lambda command: run_sync(command_exchange(command), http_client),
+                            batch_executor, parallelism)
+        return jsonify(batch_payload(results, started))
+    except BatchError as e:
+        logger.warning("Rejected batch request: %s", e)
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error("Error processing batch: %s", e, exc_info=True)
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+def news_payload(topic=""):
+    """Body of GET /api/news, shared by both serving modes."""
+    result, items = news_lookup(topic)
+    return {
+        'topic': topic,
+        'result': result,
+        'headlines': [item.to_dict() for item in items],
+        'refreshed_at': news.refreshed_at,
+        'timestamp': datetime.datetime.now().isoformat()
+    }
+
+def status_payload():
+    """Body of GET /api/status, shared by both serving modes."""
+    return {
+        'status': 'online',
+        'version': '1.0.0',
+        'tts_available': has_tts,
+        'tts_queue': speech.stats() if has_tts else None,
+        'upstream_pools': http_client.stats(),
+        'search_cache': search_cache.stats(),
+        'gemini_cache': prompt_cache.stats(),
+        'weather': weather.stats(),
+        'news': news.stats(),
+        'knowledge_base': knowledge.stats(),
+        'responses': responses.stats(),
+        'sessions': sessions.stats(),
+        'channel': CHANNEL.stats(),
+        'upstream_coalescing': default_flight().stats(),
+        'race_pool': race_pool_stats(),
+        'upstreams': breaker_stats(),
+        'health': health.payload(),
+        'degraded': degraded(),
+        'admission': admission.stats(),
+        'latency': latency_summary(),
+        'process': process_stats(),
+        'logging': logging_stats(),
+        'timestamp': datetime.datetime.now().isoformat()
+    }
+
 @app.route('/api/status', methods=['GET'])
 def get_status():
     try:
         logger.info("Status check requested")
-        return jsonify({
-            'status': 'online',
-            'version': '1.0.0',
-            'tts_available': has_tts,
-            'timestamp': datetime.datetime.now().isoformat()
-        })
+        return jsonify(status_payload())
     except Exception as e:
-        logger.error(f"Error in status check: {str(e)}", exc_info=True)
+        logger.error("Error in status check: %s", e, exc_info=True)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+# Prometheus text-format metrics
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+# Runtime switch for sampled profiling, see kael_api.profiling
+@app.route('/api/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    if not admin_allowed(request.remote_addr, request.headers.get('X-Admin-Token')):
+        return jsonify({'error': 'Forbidden'}), 403
+    if request.method == 'GET':
+        return jsonify(PROFILER.state())
+    try:
+        return jsonify(PROFILER.apply(request.get_json(silent=True)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
 # Add a simple test endpoint
 @app.route('/api/test', methods=['GET'])
 def test_endpoint():
     return jsonify({'status': 'ok', 'message': 'KAEL API is working'})
 
+# Upstream health from the background prober, never calling an upstream
+@app.route('/api/health', methods=['GET'])
+def health_endpoint():
+    return jsonify(health.payload())
+
 # Direct web search endpoint
 @app.route('/api/search', methods=['GET'])
 def api_search():
@@ -491,7 +912,7 @@ def api_search():
             'timestamp': datetime.datetime.now().isoformat()
         })
     except Exception as e:
-        logger.error(f"Error in search API: {str(e)}", exc_info=True)
+        logger.error("Error in search API: %s", e, exc_info=True)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 # Weather endpoint
@@ -506,27 +927,22 @@ def api_weather():
             'timestamp': datetime.datetime.now().isoformat()
         })
     except Exception as e:
-        logger.error(f"Error in weather API: {str(e)}", exc_info=True)
+        logger.error("Error in weather API: %s", e, exc_info=True)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 # News endpoint
 @app.route('/api/news', methods=['GET'])
 def api_news():
     try:
-        topic = request.args.get('topic', '')
-        result = get_news(topic)
-        return jsonify({
-            'topic': topic,
-            'result': result,
-            'timestamp': datetime.datetime.now().isoformat()
-        })
+        return jsonify(news_payload(request.args.get('topic', '')))
     except Exception as e:
-        logger.error(f"Error in news API: {str(e)}", exc_info=True)
+        logger.error("Error in news API: %s", e, exc_info=True)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 # Gemini API endpoint
 @app.route('/api/gemini', methods=['POST'])
 def api_gemini():
+    started = time.perf_counter()
     try:
         if not GEMINI_ENABLED:
             return jsonify({'error': 'Gemini API is not enabled'}), 400
@@ -534,27 +950,52 @@ def api_gemini():
         data = request.json
         prompt = data.get('prompt', '')
         temperature = data.get('temperature', 0.7)
+        fresh = bool(data.get('fresh', False))
         
         if not prompt:
             return jsonify({'error': 'No prompt provided'}), 400
+        
+        fmt = stream_format(data, request.headers.get('Accept', ''))
+        if fmt:
+            return streaming_response(stream_events(
+                iter_text(gemini_stream(prompt, temperature, fresh), http_client), fmt,
+                lambda text: {'prompt': prompt, 'result': text, 'timestamp': datetime.datetime.now().isoformat()},
+                started), fmt)
             
-        result = ask_gemini(prompt, temperature)
+        result = ask_gemini(prompt, temperature, fresh=fresh)
         return jsonify({
             'prompt': prompt,
             'result': result,
             'timestamp': datetime.datetime.now().isoformat()
         })
     except Exception as e:
-        logger.error(f"Error in Gemini API: {str(e)}", exc_info=True)
+        logger.error("Error in Gemini API: %s", e, exc_info=True)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 # Add CORS preflight handling
 @app.route('/api/command', methods=['OPTIONS'])
+@app.route('/api/command/batch', methods=['OPTIONS'])
 def handle_options():
     return '', 204
 
+# WebSocket command channel for the dashboard, see kael_api.channel
+install_channel(app, sys.modules[__name__])
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="KAEL API server")
+    parser.add_argument('--async', dest='async_mode', action='store_true',
+                        help="serve with the asyncio (ASGI) server and non-blocking upstream calls")
+    args = parser.parse_args()
+    
     print("Starting KAEL API server...")
-    logger.info("Starting KAEL API server on http://127.0.0.1:5000")
+    logger.info("Starting KAEL API server on http://127.0.0.1:5000 (%s mode)",
+                'async' if args.async_mode else 'threaded')
+    # SIGUSR2 toggles sampled profiling
+    PROFILER.install_signal()
     # Use 0.0.0.0 to make the server accessible from other devices on the network
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    if args.async_mode:
+        serve_asgi(sys.modules[__name__], host='0.0.0.0', port=5000)
+    else:
+        logger.warning("Flask development server with debug mode on; for production use "
+                       "'python -m kael_api.launcher server:app'")
+        app.run(host='0.0.0.0', port=5000, debug=True)
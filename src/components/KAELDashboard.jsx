@@ -1,5 +1,5 @@
 // KAEL UI Dashboard - Futuristic Sci-Fi Layout
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Card, CardContent } from "./ui/card";
 import { motion } from "framer-motion";
 
@@ -26,12 +26,31 @@ const SendIcon = () => (
   </svg>
 );
 
+// One conversation per browser tab, so KAEL can answer follow-up questions
+const SESSION_ID = (() => {
+  try {
+    let id = window.sessionStorage.getItem('kael-session');
+    if (!id) {
+      id = `kael-${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+      window.sessionStorage.setItem('kael-session', id);
+    }
+    return id;
+  } catch (error) {
+    return undefined;
+  }
+})();
+
+// Command channel heartbeat: a ping this often, and a reconnect when
+// nothing has been heard for two intervals
+const HEARTBEAT_MS = 15000;
+
 export default function KAELDashboard() {
   const [listening, setListening] = useState(false);
   const [transcript, setTranscript] = useState('');
   const [response, setResponse] = useState('');
-  const [cpuUsage, setCpuUsage] = useState(24);
-  const [latency, setLatency] = useState(32);
+  const [cpuUsage, setCpuUsage] = useState(null);
+  const [latency, setLatency] = useState(null);
+  const [degradedUpstreams, setDegradedUpstreams] = useState([]);
   const [internetConnected, setInternetConnected] = useState(true);
   const [searchResults, setSearchResults] = useState('');
   const [geminiEnabled, setGeminiEnabled] = useState(false);
@@ -48,10 +67,188 @@ export default function KAELDashboard() {
     const timestamp = `${now.getHours().toString().padStart(2, '0')}:${now.getMinutes().toString().padStart(2, '0')}`;
     const newLog = `${timestamp} – ${message}`;
     setLogs(prevLogs => [newLog, ...prevLogs.slice(0, 5)]);
-    
-    // Simulate changing system metrics
-    setCpuUsage(Math.floor(Math.random() * 30) + 15);
-    setLatency(Math.floor(Math.random() * 40) + 20);
+  };
+
+  // Open command channel (WebSocket), its commands awaiting an answer,
+  // and when the server was last heard from on it
+  const socketRef = useRef(null);
+  const pendingRef = useRef(new Map());
+  const lastHeardRef = useRef(0);
+  const commandCountRef = useRef(0);
+
+  // Gemini indicator from the server's last background probe of Gemini
+  const applyGeminiHealth = (gemini) => {
+    const status = gemini?.status;
+    setGeminiEnabled(status === 'up');
+    if (status === 'up') {
+      setGeminiStatus('Connected');
+    } else if (status === 'down') {
+      setGeminiStatus('Unavailable');
+    } else if (status === 'unknown') {
+      setGeminiStatus('Checking...');
+    } else {
+      setGeminiStatus('Disabled');
+    }
+    return status === 'up';
+  };
+
+  // Server CPU, command latency (median over recent commands) and the
+  // upstreams whose circuit breaker is not closed, from /api/status
+  const applyStatus = (data) => {
+    if (data.health) {
+      applyGeminiHealth(data.health.upstreams?.gemini);
+    }
+    // cpu_percent is null until the server's first sampling window ends
+    if (data.process && data.process.cpu_percent !== null) {
+      setCpuUsage(Math.round(data.process.cpu_percent));
+    }
+    const routes = data.latency?.routes || {};
+    const commandLatency = routes['/api/command WS'] || routes['/api/command POST'];
+    if (commandLatency && commandLatency.p50_ms !== null) {
+      setLatency(Math.round(commandLatency.p50_ms));
+    }
+    if (data.upstreams) {
+      setDegradedUpstreams(Object.entries(data.upstreams)
+        .filter(([, breaker]) => breaker.state !== 'closed')
+        .map(([name]) => name));
+    }
+  };
+
+  const refreshMetrics = async () => {
+    // The command channel pushes status while it is open
+    if (socketRef.current) return;
+    try {
+      const response = await fetch('http://localhost:5000/api/status');
+      if (!response.ok) return;
+      applyStatus(await response.json());
+    } catch (error) {
+      // Leave the last known values while the backend is unreachable
+    }
+  };
+
+  useEffect(() => {
+    refreshMetrics();
+    const timer = setInterval(refreshMetrics, 5000);
+    return () => clearInterval(timer);
+  }, []);
+
+  // Messages on the command channel: status pushes, and the streamed
+  // chunks and final payload (or error) of each command, by id
+  const handleChannelMessage = (message) => {
+    const pending = message.id ? pendingRef.current.get(message.id) : null;
+    if (message.event === 'status') {
+      applyStatus(message);
+    } else if (message.event === 'chunk' && pending) {
+      pending.text += message.text;
+      setResponse(pending.text);
+    } else if ((message.event === 'done' || message.event === 'error') && pending) {
+      pendingRef.current.delete(message.id);
+      pending.resolve(message);
+    }
+  };
+
+  // Keep one WebSocket to the backend, reconnecting with backoff; commands
+  // go over HTTP while it is down
+  useEffect(() => {
+    let socket = null;
+    let retryTimer = null;
+    let retryDelay = 1000;
+    let stopped = false;
+
+    const connect = () => {
+      socket = new WebSocket('ws://localhost:5000/api/ws');
+      socket.onopen = () => {
+        retryDelay = 1000;
+        lastHeardRef.current = Date.now();
+        socketRef.current = socket;
+        setInternetConnected(true);
+        addLog('Command channel connected');
+      };
+      socket.onmessage = (event) => {
+        lastHeardRef.current = Date.now();
+        handleChannelMessage(JSON.parse(event.data));
+      };
+      socket.onclose = () => {
+        if (socketRef.current === socket) {
+          socketRef.current = null;
+        }
+        pendingRef.current.forEach((pending) => pending.reject(new Error('Command channel closed')));
+        pendingRef.current.clear();
+        if (!stopped) {
+          retryTimer = setTimeout(connect, retryDelay);
+          retryDelay = Math.min(retryDelay * 2, 30000);
+        }
+      };
+      socket.onerror = () => socket.close();
+    };
+
+    connect();
+    const heartbeat = setInterval(() => {
+      const current = socketRef.current;
+      if (!current) return;
+      if (Date.now() - lastHeardRef.current > HEARTBEAT_MS * 2) {
+        // Nothing back from the last pings: drop the connection and reconnect
+        current.close();
+        return;
+      }
+      current.send(JSON.stringify({ type: 'ping', ts: Date.now() }));
+    }, HEARTBEAT_MS);
+
+    return () => {
+      stopped = true;
+      clearInterval(heartbeat);
+      clearTimeout(retryTimer);
+      if (socket) socket.close();
+    };
+  }, []);
+
+  // Send a command on the open channel; resolves with its done or error event
+  const sendOverChannel = (command) => new Promise((resolve, reject) => {
+    commandCountRef.current += 1;
+    const id = `c${commandCountRef.current}`;
+    pendingRef.current.set(id, { text: '', resolve, reject });
+    socketRef.current.send(JSON.stringify({ type: 'command', id, command, session: SESSION_ID }));
+  });
+
+  // Rate limited or shedding load: the backend is up, just busy
+  const showBusy = (status, retryAfter) => {
+    const busyResponse = `I'm handling a lot of requests right now. Please try again in ${retryAfter} seconds.`;
+    setResponse(busyResponse);
+    addLog(`Server busy (${status}), retry in ${retryAfter}s`);
+  };
+
+  // Read a streamed (Server-Sent Events) command response, showing the
+  // text as it arrives; resolves with the payload of the final event
+  const readCommandStream = async (response) => {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+    let done = null;
+
+    while (true) {
+      const { value, done: finished } = await reader.read();
+      if (finished) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const block = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        const event = block.match(/^event: (.*)$/m)?.[1];
+        const data = block.match(/^data: (.*)$/m)?.[1];
+        if (!data) continue;
+
+        const payload = JSON.parse(data);
+        if (event === 'chunk') {
+          text += payload.text;
+          setResponse(text);
+        } else if (event === 'done') {
+          done = payload;
+        }
+      }
+    }
+    return done || { response: text };
   };
 
   // Check internet connection
@@ -69,34 +266,14 @@ export default function KAELDashboard() {
   // Check Gemini API status
   const checkGeminiStatus = async () => {
     try {
-      // Simple test prompt to check if Gemini is working
-      const response = await fetch('http://localhost:5000/api/gemini', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({ 
-          prompt: "Respond with 'GEMINI_ONLINE' if you can read this message.",
-          temperature: 0.1
-        }),
-      });
-      
-      if (response.ok) {
-        const data = await response.json();
-        if (data.result && data.result.includes('GEMINI_ONLINE')) {
-          setGeminiEnabled(true);
-          setGeminiStatus('Connected');
-          return true;
-        } else {
-          setGeminiEnabled(true);
-          setGeminiStatus('Connected');
-          return true;
-        }
-      } else {
-        setGeminiEnabled(false);
-        setGeminiStatus('Disabled');
-        return false;
+      // The server probes Gemini in the background; this reads its last
+      // result and costs no Gemini call
+      const response = await fetch('http://localhost:5000/api/health');
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
       }
+      const data = await response.json();
+      return applyGeminiHealth(data.upstreams?.gemini);
     } catch (error) {
       console.error('Error checking Gemini status:', error);
       setGeminiEnabled(false);
@@ -132,40 +309,63 @@ export default function KAELDashboard() {
     try {
       console.log("Sending command to backend:", command);
       
-      // Check internet connection first
-      const isConnected = await checkInternetConnection();
-      if (!isConnected) {
-        throw new Error("No connection to KAEL backend");
-      }
-      
-      // Try to connect to the backend API
-      // First attempt with localhost:5000
-      let response;
-      try {
-        response = await fetch('http://localhost:5000/api/command', {
-          method: 'POST',
-          headers: {
-            'Content-Type': 'application/json',
-          },
-          body: JSON.stringify({ command }),
-        });
-      } catch (fetchError) {
-        console.log("Failed to connect to localhost:5000, trying 127.0.0.1:5000");
-        // If localhost fails, try with 127.0.0.1
-        response = await fetch('http://127.0.0.1:5000/api/command', {
-          method: 'POST',
-          headers: {
-            'Content-Type': 'application/json',
-          },
-          body: JSON.stringify({ command }),
-        });
-      }
-      
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
+      let data;
+      if (socketRef.current) {
+        // One message on the open command channel: no connectivity check
+        // and no new connection
+        data = await sendOverChannel(command);
+        if (data.status === 429 || data.status === 503) {
+          showBusy(data.status, data.retry_after || 1);
+          return;
+        }
+        if (data.event === 'error') {
+          throw new Error(data.error);
+        }
+      } else {
+        // Check internet connection first
+        const isConnected = await checkInternetConnection();
+        if (!isConnected) {
+          throw new Error("No connection to KAEL backend");
+        }
+
+        // Try to connect to the backend API
+        // First attempt with localhost:5000
+        // Ask for a streamed response so Gemini answers appear as they are generated
+        let response;
+        try {
+          response = await fetch('http://localhost:5000/api/command', {
+            method: 'POST',
+            headers: {
+              'Content-Type': 'application/json',
+              'Accept': 'text/event-stream',
+            },
+            body: JSON.stringify({ command, stream: true, session: SESSION_ID }),
+          });
+        } catch (fetchError) {
+          console.log("Failed to connect to localhost:5000, trying 127.0.0.1:5000");
+          // If localhost fails, try with 127.0.0.1
+          response = await fetch('http://127.0.0.1:5000/api/command', {
+            method: 'POST',
+            headers: {
+              'Content-Type': 'application/json',
+              'Accept': 'text/event-stream',
+            },
+            body: JSON.stringify({ command, stream: true, session: SESSION_ID }),
+          });
+        }
+
+        if (response.status === 429 || response.status === 503) {
+          showBusy(response.status, response.headers.get('Retry-After') || (await response.json()).retry_after || 1);
+          return;
+        }
+
+        if (!response.ok) {
+          throw new Error(`HTTP error! status: ${response.status}`);
+        }
+
+        const isStream = (response.headers.get('Content-Type') || '').includes('text/event-stream');
+        data = isStream ? await readCommandStream(response) : await response.json();
       }
-      
-      const data = await response.json();
       const kaelResponse = data.response;
       
       console.log("Received response from backend:", kaelResponse);
@@ -437,7 +637,17 @@ export default function KAELDashboard() {
         </div>
         <div className="flex items-center gap-2 bg-[#0A0F1C]/80 backdrop-blur-sm border border-[#00C6FF]/30 rounded-full px-3 py-1 text-xs">
           <span>CPU: </span>
-          <span className="text-[#00C6FF]">{cpuUsage}%</span>
+          <span className="text-[#00C6FF]">{cpuUsage === null ? '--' : `${cpuUsage}%`}</span>
+        </div>
+        <div className="flex items-center gap-2 bg-[#0A0F1C]/80 backdrop-blur-sm border border-[#00C6FF]/30 rounded-full px-3 py-1 text-xs">
+          <span>Latency: </span>
+          <span className="text-[#00C6FF]">{latency === null ? '--' : `${latency} ms`}</span>
+        </div>
+        <div className="flex items-center gap-2 bg-[#0A0F1C]/80 backdrop-blur-sm border border-[#00C6FF]/30 rounded-full px-3 py-1 text-xs">
+          <span>Services: </span>
+          <span className={degradedUpstreams.length ? "text-yellow-400" : "text-green-400"}>
+            {degradedUpstreams.length ? `Degraded (${degradedUpstreams.join(', ')})` : 'Normal'}
+          </span>
         </div>
       </div>
       
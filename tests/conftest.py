@@ -0,0 +1,71 @@
+"""
+Shared fixtures: a local stub upstream that counts its hits.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubUpstream:
+    """
+    A keep-alive HTTP/1.1 server on a free local port.
+
+    Answers come from the responses list in order, the last one repeating:
+    each is (status, payload) and is sent after delay seconds.
+
+    Attributes:
+        url (str): Base URL of the server
+        hits (int): Requests received
+    """
+
+    def __init__(self):
+        self.responses = [(200, {'ok': True})]
+        self.delay = 0.0
+        self.hits = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with stub._lock:
+                    index = min(stub.hits, len(stub.responses) - 1)
+                    stub.hits += 1
+                status, payload = stub.responses[index]
+                time.sleep(stub.delay)
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_POST = do_GET
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def upstream():
+    stub = StubUpstream()
+    yield stub
+    stub.close()
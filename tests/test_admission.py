@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+from kael_api import admission
+from kael_api.admission import ConcurrencyLimiter, RateLimiter, parse_limits
+
+ROUTE = 'POST /api/command'
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """The limiters' monotonic clock, advanced by hand."""
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_parse_limits():
+    assert parse_limits('POST  /api/command=5/20, GET /api/search=2') == {
+        'POST /api/command': (5.0, 20),
+        'GET /api/search': (2.0, 2),
+    }
+    assert parse_limits('off') == {}
+    with pytest.raises(ValueError):
+        parse_limits('POST /api/command')
+
+
+def test_a_client_past_its_burst_is_refused_until_a_token_is_back(clock):
+    limiter = RateLimiter({ROUTE: (2.0, 3)})
+
+    assert [limiter.check('10.0.0.1', ROUTE) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.check('10.0.0.1', ROUTE) == pytest.approx(0.5)
+    # Other clients and unlimited routes are not affected
+    assert limiter.check('10.0.0.2', ROUTE) == 0.0
+    assert limiter.check('10.0.0.1', 'GET /api/status') == 0.0
+
+    clock[0] += 0.5
+    assert limiter.check('10.0.0.1', ROUTE) == 0.0
+    assert limiter.check('10.0.0.1', ROUTE) > 0
+    stats = limiter.stats()['routes'][ROUTE]
+    assert (stats['allowed'], stats['limited']) == (5, 2)
+
+
+def test_least_recently_seen_clients_are_dropped(clock):
+    limiter = RateLimiter({ROUTE: (1.0, 1)}, max_clients=2)
+    for client in ('a', 'b', 'c'):
+        limiter.check(client, ROUTE)
+
+    assert limiter.stats()['clients'] == 2
+    assert limiter.stats()['evicted'] == 1
+    # a starts again with a full bucket; c is still limited
+    assert limiter.check('a', ROUTE) == 0.0
+    assert limiter.check('c', ROUTE) > 0
+
+
+def queue_one(limiter):
+    """Start a thread acquiring a slot and return once it is waiting."""
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(limiter.acquire()))
+    waiter.start()
+    deadline = time.monotonic() + 1.0
+    while limiter.waiting == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return waiter, results
+
+
+def test_requests_over_the_cap_queue_then_are_shed():
+    limiter = ConcurrencyLimiter(max_active=1, max_queue=1, timeout=0.2)
+    assert limiter.acquire()
+
+    waiter, results = queue_one(limiter)
+
+    # The queue is full, so a third request is refused at once
+    assert not limiter.acquire()
+    waiter.join()
+
+    # and the queued one gave up when its wait ran out
+    assert results == [False]
+    stats = limiter.stats()
+    assert (stats['active'], stats['shed_queue_full'], stats['shed_timeout']) == (1, 1, 1)
+    assert limiter.retry_after() >= 1.0
+
+
+def test_a_released_slot_goes_to_the_waiting_request():
+    limiter = ConcurrencyLimiter(max_active=1, max_queue=1, timeout=5.0)
+    assert limiter.acquire()
+
+    waiter, results = queue_one(limiter)
+    limiter.release(0.1)
+    waiter.join(timeout=2)
+
+    assert results == [True]
+    assert limiter.stats()['active'] == 1
+    assert limiter.stats()['queued'] == 1
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from kael_api.batch import BatchError, parse_batch, run_batch, run_batch_async
+
+
+@pytest.mark.parametrize('data, message', [
+    (None, 'No JSON data provided'),
+    ({'commands': []}, 'No commands provided'),
+    ({'commands': 'hello'}, 'No commands provided'),
+    ({'commands': ['hello'] * 11}, 'Too many commands: 11 (limit 10)'),
+    ({'commands': ['hello'], 'max_parallel': 0}, 'max_parallel must be a positive integer'),
+    ({'commands': ['hello'], 'max_parallel': True}, 'max_parallel must be a positive integer'),
+])
+def test_malformed_batches_are_refused(data, message):
+    with pytest.raises(BatchError) as refused:
+        parse_batch(data, max_commands=10, max_parallel=4)
+    assert str(refused.value) == message
+
+
+def test_parallelism_is_capped_by_the_server():
+    assert parse_batch({'commands': ['a', 'b']}, 10, 4) == (['a', 'b'], 4)
+    assert parse_batch({'commands': ['a'], 'max_parallel': 2}, 10, 4)[1] == 2
+    assert parse_batch({'commands': ['a'], 'max_parallel': 50}, 10, 4)[1] == 4
+
+
+class Tracker:
+    """An execute callable that records how many calls overlap."""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, command):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        # Shorter commands take longer, so they finish out of input order
+        time.sleep(0.02 + 0.05 / (1 + len(command)))
+        with self._lock:
+            self.active -= 1
+        if command == 'boom':
+            raise RuntimeError('upstream down')
+        return command.upper()
+
+
+COMMANDS = ['Hello', 'time', 'boom', '', 'what is python', 'joke']
+
+
+def check_results(results):
+    assert [result['index'] for result in results] == list(range(len(COMMANDS)))
+    assert [result['status'] for result in results] == ['ok', 'ok', 'error', 'error', 'ok', 'ok']
+    assert results[0]['response'] == 'HELLO'
+    assert results[2]['error'] == 'Server error: upstream down'
+    assert results[3]['error'] == 'No command provided'
+    assert results[4]['response'] == 'WHAT IS PYTHON'
+
+
+def test_results_keep_input_order_and_respect_the_cap():
+    execute = Tracker()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = run_batch(COMMANDS, execute, executor, max_parallel=2)
+
+    check_results(results)
+    assert execute.peak == 2
+
+
+def test_async_results_keep_input_order_and_respect_the_cap():
+    tracker = Tracker()
+
+    async def execute(command):
+        await asyncio.sleep(0)
+        return await asyncio.to_thread(tracker, command)
+
+    results = asyncio.run(run_batch_async(COMMANDS, execute, max_parallel=2))
+
+    check_results(results)
+    assert tracker.peak == 2
@@ -0,0 +1,33 @@
+from kael_api import breaker
+from kael_api.breaker import CLOSED, OPEN, CircuitBreaker
+
+
+def new_breaker(name):
+    return CircuitBreaker(name, **breaker._settings(name))
+
+
+def test_slow_gemini_answers_do_not_open_the_breaker(monkeypatch):
+    monkeypatch.delenv('KAEL_BREAKER_SLOW_CALL', raising=False)
+    monkeypatch.delenv('KAEL_BREAKER_SLOW_CALL_GEMINI', raising=False)
+    gemini = new_breaker('gemini')
+    for _ in range(10):
+        assert gemini.allow()
+        gemini.record(True, 25.0)
+    assert gemini.state == CLOSED
+    assert gemini.stats()['failures'] == 0
+
+
+def test_slow_search_calls_open_the_breaker(monkeypatch):
+    monkeypatch.delenv('KAEL_BREAKER_SLOW_CALL', raising=False)
+    monkeypatch.delenv('KAEL_BREAKER_SLOW_CALL_DUCKDUCKGO', raising=False)
+    search = new_breaker('duckduckgo')
+    for _ in range(5):
+        search.record(True, 6.0)
+    assert search.state == OPEN
+
+
+def test_slow_call_threshold_per_upstream_from_the_environment(monkeypatch):
+    monkeypatch.setenv('KAEL_BREAKER_SLOW_CALL', '3')
+    monkeypatch.setenv('KAEL_BREAKER_SLOW_CALL_OPEN_METEO', '0')
+    assert new_breaker('open-meteo').slow_call_seconds == 0
+    assert new_breaker('gemini').slow_call_seconds == 3
@@ -0,0 +1,63 @@
+from kael_api.cache import TTLCache, normalize_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_their_ttl():
+    clock = FakeClock()
+    cache = TTLCache(ttl=10, clock=clock)
+    cache.set('python', 'default ttl')
+    cache.set('rust', 'short ttl', ttl=2)
+
+    clock.now += 5
+    assert cache.get('python') == 'default ttl'
+    assert cache.get('rust') is None
+
+    clock.now += 5
+    assert cache.get('python') is None
+    stats = cache.stats()
+    assert stats['expirations'] == 2
+    assert stats['entries'] == 0
+    assert stats['bytes'] == 0
+
+
+def test_least_recently_used_entry_is_evicted_past_the_budget():
+    cache = TTLCache(max_bytes=30)
+    cache.set('a', 'x' * 9)
+    cache.set('b', 'x' * 9)
+    cache.set('c', 'x' * 9)
+    # Reading a makes b the least recently used
+    assert cache.get('a') is not None
+
+    cache.set('d', 'x' * 9)
+
+    assert cache.get('b') is None
+    assert all(cache.get(key) is not None for key in 'acd')
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['bytes'] <= 30
+
+
+def test_an_oversized_entry_is_not_cached():
+    cache = TTLCache(max_bytes=20)
+    cache.set('small', 'x')
+    cache.set('big', 'x' * 100)
+
+    assert cache.get('big') is None
+    assert cache.get('small') == 'x'
+    assert cache.stats()['evictions'] == 0
+
+
+def test_hits_and_misses_are_counted():
+    cache = TTLCache()
+    cache.set(normalize_key('What is  Python?'), 'a language')
+
+    assert cache.get(normalize_key('what is python')) == 'a language'
+    assert cache.get('missing') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_ratio']) == (1, 1, 0.5)
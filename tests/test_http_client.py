@@ -0,0 +1,69 @@
+import pytest
+
+from kael_api import http_client
+from kael_api.http_client import MAX_BACKOFF, HttpClient
+
+REQUESTS = 20
+
+
+def test_keep_alive_avoids_handshakes(upstream):
+    client = HttpClient(retries=0, pool_size=2)
+    for _ in range(REQUESTS):
+        response = client.get(f"{upstream.url}/search")
+        assert response.status_code == 200
+        response.json()
+
+    host = client.stats()['hosts'][upstream.url]
+    assert upstream.hits == REQUESTS
+    assert host['connections_opened'] == 1
+    assert host['handshakes_avoided'] >= REQUESTS - 1
+    client.close()
+
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    """The (low, high) bounds of each jittered backoff, without sleeping."""
+    bounds = []
+
+    def uniform(low, high):
+        bounds.append((low, high))
+        return high
+
+    monkeypatch.setattr(http_client.random, 'uniform', uniform)
+    monkeypatch.setattr(http_client.time, 'sleep', lambda seconds: None)
+    return bounds
+
+
+def test_retries_503_then_succeeds(upstream, backoffs):
+    upstream.responses = [(503, {'error': 'busy'}), (200, {'ok': True})]
+    client = HttpClient(retries=2, backoff=0.1)
+
+    response = client.get(f"{upstream.url}/search")
+
+    assert response.status_code == 200
+    assert upstream.hits == 2
+    assert backoffs == [(0, 0.1)]
+    assert client.stats()['retries'] == 1
+    assert client.stats()['failures'] == 0
+
+
+def test_backoff_doubles_up_to_the_cap_then_gives_up(upstream, backoffs):
+    upstream.responses = [(503, {'error': 'busy'})]
+    client = HttpClient(retries=4, backoff=1.5)
+
+    response = client.get(f"{upstream.url}/search")
+
+    # The last throttled response is returned, not raised
+    assert response.status_code == 503
+    assert upstream.hits == 5
+    assert backoffs == [(0, 1.5), (0, 3.0), (0, MAX_BACKOFF), (0, MAX_BACKOFF)]
+    assert client.stats()['retries'] == 4
+
+
+def test_non_retryable_status_is_returned_at_once(upstream, backoffs):
+    upstream.responses = [(404, {'error': 'missing'})]
+    client = HttpClient(retries=2)
+
+    assert client.get(f"{upstream.url}/search").status_code == 404
+    assert upstream.hits == 1
+    assert backoffs == []
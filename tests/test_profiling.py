@@ -0,0 +1,61 @@
+import asyncio
+import os
+import signal
+import time
+
+import pytest
+
+from kael_api.profiling import Profiler
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGUSR2'), reason='needs SIGUSR2')
+def test_signal_during_record_does_not_deadlock(tmp_path):
+    profiler = Profiler(sample_rate=1.0, output_dir=str(tmp_path))
+    previous = signal.getsignal(signal.SIGUSR2)
+    try:
+        assert profiler.install_signal(signal.SIGUSR2)
+        profiler.configure(enabled=True)
+        profiler.record('command;intent', 0.001)
+
+        # As if the signal arrived while record() held the lock
+        with profiler._lock:
+            os.kill(os.getpid(), signal.SIGUSR2)
+            time.sleep(0.05)
+            assert profiler.enabled is False
+
+        # The dump happens off the handler, once the lock is free
+        deadline = time.monotonic() + 2
+        while profiler.last_dump is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert profiler.last_dump is not None
+        with open(profiler.last_dump) as f:
+            assert f.read() == 'command;intent 1000\n'
+    finally:
+        signal.signal(signal.SIGUSR2, previous)
+
+
+def test_concurrent_tasks_nest_their_spans_under_the_span_that_started_them():
+    profiler = Profiler(sample_rate=1.0)
+    profiler.configure(enabled=True)
+
+    async def candidate(name):
+        with profiler.span(f"candidate:{name}"):
+            await asyncio.sleep(0.02)
+            with profiler.span('upstream'):
+                await asyncio.sleep(0.02)
+
+    async def command():
+        with profiler.request('command'):
+            with profiler.span('race'):
+                await asyncio.gather(candidate('search'), candidate('gemini'))
+            with profiler.span('encode'):
+                pass
+
+    asyncio.run(command())
+
+    assert set(profiler._stacks) == {
+        'command', 'command;race', 'command;encode',
+        'command;race;candidate:search', 'command;race;candidate:search;upstream',
+        'command;race;candidate:gemini', 'command;race;candidate:gemini;upstream',
+    }
+    assert all(seconds >= 0 for seconds in profiler._stacks.values())
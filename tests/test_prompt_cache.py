@@ -0,0 +1,94 @@
+import time
+
+from kael_api.prompt_cache import PromptCache
+
+CONFIG = {'temperature': 0.7, 'maxOutputTokens': 800}
+
+
+def test_an_answer_is_reused_only_for_the_same_config():
+    cache = PromptCache()
+    cache.set('What is Python?', CONFIG, 'A language')
+
+    assert cache.get('What is Python?', CONFIG) == 'A language'
+    assert cache.get('What is Python?', dict(CONFIG, temperature=0.2)) is None
+    assert cache.get('what is python?', CONFIG) is None
+
+
+def test_the_normalized_tier_matches_case_and_whitespace():
+    cache = PromptCache(normalize=True)
+    cache.set('What is Python?', CONFIG, 'A language')
+
+    assert cache.get('  what is   PYTHON ', CONFIG) == 'A language'
+    assert cache.stats()['normalized_hits'] == 1
+
+
+def test_answers_expire():
+    cache = PromptCache(ttl=0.05)
+    cache.set('What is Python?', CONFIG, 'A language')
+
+    time.sleep(0.1)
+
+    assert cache.get('What is Python?', CONFIG) is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_memory_is_bounded():
+    cache = PromptCache(max_bytes=1000)
+    for i in range(20):
+        cache.set(f"Question {i}", CONFIG, 'x' * 100)
+
+    stats = cache.stats()
+    assert stats['bytes'] <= 1000
+    assert stats['evictions'] > 0
+    assert cache.get('Question 0', CONFIG) is None
+    assert cache.get('Question 19', CONFIG) == 'x' * 100
+
+
+def test_answers_survive_a_restart_on_disk(tmp_path):
+    path = str(tmp_path / 'prompts.sqlite3')
+    PromptCache(path=path).set('What is Python?', CONFIG, 'A language')
+
+    restarted = PromptCache(path=path)
+
+    assert restarted.get('What is Python?', CONFIG) == 'A language'
+    assert restarted.stats()['disk_hits'] == 1
+    # and it is promoted to memory
+    assert restarted.get('What is Python?', CONFIG) == 'A language'
+    assert restarted.stats()['disk_hits'] == 1
+
+
+def test_expired_answers_on_disk_are_not_served(tmp_path):
+    path = str(tmp_path / 'prompts.sqlite3')
+    PromptCache(ttl=0.05, path=path).set('What is Python?', CONFIG, 'A language')
+
+    time.sleep(0.1)
+
+    assert PromptCache(ttl=0.05, path=path).get('What is Python?', CONFIG) is None
+
+
+def test_a_lookup_counts_one_miss_across_tiers():
+    cache = PromptCache(normalize=True)
+    cache.set('What is Python?', CONFIG, 'A language')
+
+    assert cache.get('What is Rust?', CONFIG) is None
+    assert cache.get('what is python', CONFIG) == 'A language'
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_ratio']) == (1, 1, 0.5)
+
+
+def test_load_serves_from_memory_and_writes_in_the_background(tmp_path):
+    path = str(tmp_path / 'prompts.sqlite3')
+    PromptCache(path=path).set('What is Python?', CONFIG, 'A language')
+    cache = PromptCache(path=path)
+
+    assert cache.load() == 1
+    assert cache.get('What is Python?', CONFIG) == 'A language'
+    assert cache.stats()['disk_hits'] == 0
+
+    cache.set('What is Rust?', CONFIG, 'Another language')
+    assert cache.get('What is Rust?', CONFIG) == 'Another language'
+    deadline = time.monotonic() + 2.0
+    while PromptCache(path=path).get('What is Rust?', CONFIG) is None:
+        assert time.monotonic() < deadline, 'the write never reached the disk'
+        time.sleep(0.01)
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+from kael_api.breaker import breaker_for
+from kael_api.http_client import AsyncHttpClient, HttpClient
+from kael_api.singleflight import SingleFlight
+from kael_api.upstream import Race, UpstreamRequest, race_pool_stats, run_async, run_sync
+
+BUDGET = 0.3
+
+
+def slow_source(url, name='test-race-slow'):
+    response = yield UpstreamRequest('GET', f"{url}/slow", name=name)
+    return response.json()
+
+
+def unacceptable():
+    return None
+    yield
+
+
+def answered():
+    return 'an answer'
+    yield
+
+
+def question(url):
+    race = yield Race([('fast', unacceptable()), ('slow', slow_source(url))], BUDGET)
+    return race
+
+
+def fast_wins(url):
+    race = yield Race([('fast', answered()), ('slow', slow_source(url, 'test-race-async-slow'))], BUDGET)
+    return race
+
+
+def test_a_losing_candidate_frees_its_thread_at_the_budget(upstream):
+    upstream.delay = 2.0
+    client = HttpClient(retries=0, read_timeout=30)
+    before = race_pool_stats()
+
+    started = time.perf_counter()
+    race = run_sync(question(upstream.url), client, SingleFlight())
+    assert race.winner is None
+    assert time.perf_counter() - started < BUDGET + 0.5
+
+    # The slow call is cut off at the budget rather than the 30 s read timeout
+    deadline = time.monotonic() + 1.0
+    while race_pool_stats()['running'] > before['running'] and time.monotonic() < deadline:
+        time.sleep(0.02)
+    stats = race_pool_stats()
+    assert stats['running'] == before['running']
+    assert stats['queued'] == 0
+    assert stats['timeouts'] == before['timeouts'] + 1
+
+    # and the cut-off is not held against the upstream
+    assert breaker_for('test-race-slow').stats()['failures'] == 0
+
+
+def test_a_cancelled_async_loser_is_not_a_breaker_failure(upstream):
+    upstream.delay = 2.0
+
+    async def ask():
+        client = AsyncHttpClient(retries=0, read_timeout=30)
+        try:
+            return await run_async(fast_wins(upstream.url), client)
+        finally:
+            await client.close()
+
+    started = time.perf_counter()
+    race = asyncio.run(ask())
+    assert race.winner == 'fast'
+    assert time.perf_counter() - started < BUDGET + 0.5
+    assert breaker_for('test-race-async-slow').stats()['failures'] == 0
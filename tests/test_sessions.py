@@ -0,0 +1,87 @@
+from kael_api.sessions import SessionStore, estimate_tokens, session_id
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_session_ids_must_be_well_formed():
+    assert session_id({'session': 'abc12345'}, {}) == 'abc12345'
+    assert session_id(None, {'X-Session-ID': 'tab-0001'}) == 'tab-0001'
+    assert session_id({'session': 'short'}, {}) is None
+    assert session_id({'session': 'no spaces here'}, {}) is None
+
+
+def test_turns_are_included_in_order():
+    store = SessionStore()
+    store.record('session1', 'What is the Andromeda galaxy?', 'A spiral galaxy.')
+    store.record('session1', 'How far away is it?', 'About 2.5 million light years.')
+
+    assert store.context('session1') == (
+        "User: What is the Andromeda galaxy?\nKAEL: A spiral galaxy.\n"
+        "User: How far away is it?\nKAEL: About 2.5 million light years."
+    )
+    assert store.context('other-session') == ''
+    assert store.context(None) == ''
+
+
+def test_older_turns_are_folded_into_a_summary():
+    store = SessionStore(context_tokens=60, turn_tokens=20, summary_topics=2)
+    for i in range(6):
+        store.record('session1', f"Question number {i}", 'An answer that takes up some room ' * 2)
+
+    context = store.context('session1')
+    assert context.startswith('(Earlier the user asked about: Question number 2; Question number 3)')
+    assert 'User: Question number 5' in context
+    assert 'User: Question number 1' not in context
+    assert estimate_tokens(context) <= 60 + 10
+    assert store.stats()['turns_summarized'] >= 3
+
+
+def test_long_replies_are_clipped():
+    store = SessionStore(turn_tokens=10)
+    store.record('session1', 'Tell me a story', 'word ' * 100)
+
+    reply = store.context('session1').split('KAEL: ')[1]
+    assert reply.endswith('...')
+    assert len(reply) <= 10 * 4 + 3
+
+
+def test_least_recently_used_sessions_are_evicted():
+    store = SessionStore(max_sessions=2)
+    store.record('session1', 'hello', 'hi')
+    store.record('session2', 'hello', 'hi')
+    store.context('session1')
+    store.record('session3', 'hello', 'hi')
+
+    assert len(store) == 2
+    assert store.context('session2') == ''
+    assert store.context('session1') != ''
+    assert store.stats()['evictions'] == 1
+
+
+def test_memory_budget_evicts_sessions():
+    store = SessionStore(max_bytes=10000)
+    for i in range(20):
+        store.record(f"session{i:02}", 'hello', 'hi')
+
+    stats = store.stats()
+    assert stats['bytes'] <= 10000
+    assert stats['sessions'] < 20
+    assert store.context('session19') != ''
+
+
+def test_idle_sessions_expire():
+    clock = FakeClock()
+    store = SessionStore(ttl=60, clock=clock)
+    store.record('session1', 'hello', 'hi')
+
+    clock.now += 30
+    assert store.context('session1') != ''
+    clock.now += 61
+    assert store.context('session1') == ''
+    assert store.stats()['expirations'] == 1
@@ -0,0 +1,93 @@
+import threading
+import time
+
+from kael_api.http_client import HttpClient
+from kael_api.singleflight import SingleFlight
+from kael_api.upstream import UpstreamRequest, run_sync
+
+CLIENTS = 20
+
+
+def burst(count, target):
+    """Run target(i) on count threads released together; returns results and errors by index."""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+    errors = [None] * count
+
+    def run(i):
+        barrier.wait()
+        try:
+            results[i] = target(i)
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return results, errors
+
+
+def search(url, query):
+    response = yield UpstreamRequest('GET', f"{url}/search?q={query}", key=f"search:{query.lower()}",
+                                     name='duckduckgo')
+    return response.json()
+
+
+def test_identical_requests_reach_the_upstream_once(upstream):
+    upstream.responses = [(200, {'Abstract': 'An answer'})]
+    upstream.delay = 0.3
+    client = HttpClient(retries=0, pool_size=CLIENTS)
+    flight = SingleFlight()
+
+    def ask(i):
+        # Varying case, as clients send it; the key is normalized
+        return run_sync(search(upstream.url, 'Python' if i % 2 else 'python'), client, flight)
+
+    results, errors = burst(CLIENTS, ask)
+
+    assert errors == [None] * CLIENTS
+    assert results == [{'Abstract': 'An answer'}] * CLIENTS
+    assert upstream.hits == 1
+    stats = flight.stats()
+    assert stats['upstream_calls'] == 1
+    assert stats['coalesced_waiters'] == CLIENTS - 1
+    assert stats['in_flight'] == 0
+
+
+def test_an_upstream_error_reaches_every_waiter():
+    flight = SingleFlight()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        time.sleep(0.3)
+        raise ConnectionError('upstream down')
+
+    results, errors = burst(CLIENTS, lambda i: flight.do('search:python', failing))
+
+    assert len(calls) == 1
+    assert all(isinstance(error, ConnectionError) for error in errors)
+    assert len({id(error) for error in errors}) == 1
+    assert flight.stats()['coalesced_waiters'] == CLIENTS - 1
+
+    # The key is released, so the next call goes upstream again
+    assert flight.do('search:python', lambda: 'recovered') == 'recovered'
+    assert len(calls) == 1
+
+
+def test_different_keys_are_not_coalesced():
+    flight = SingleFlight()
+    calls = []
+
+    def call(i):
+        calls.append(i)
+        time.sleep(0.1)
+        return i
+
+    results, _ = burst(4, lambda i: flight.do(f"key{i}", lambda: call(i)))
+
+    assert sorted(calls) == results == [0, 1, 2, 3]
+    assert flight.stats()['coalesced_waiters'] == 0
+
@@ -0,0 +1,95 @@
+from kael_api.http_client import HttpClient
+from kael_api.upstream import run_sync
+from kael_api.weather import OpenMeteoProvider, StubProvider, WeatherService
+
+
+class CountingProvider(StubProvider):
+    """The stub provider, counting its calls and not knowing 'atlantis'."""
+
+    def __init__(self):
+        self.geocodes = []
+        self.forecasts = []
+
+    def geocode(self, location):
+        self.geocodes.append(location)
+        if location.strip().lower() == 'atlantis':
+            return None
+        return super().geocode(location)
+
+    def forecast(self, latitude, longitude):
+        self.forecasts.append((latitude, longitude))
+        return super().forecast(latitude, longitude)
+
+
+def lookup(service, location, client=None):
+    return run_sync(service.lookup(location), client)
+
+
+def test_places_in_one_grid_cell_share_a_forecast():
+    provider = CountingProvider()
+    service = WeatherService(provider)
+    # New York and Jersey City fall in the same 0.25 degree cell
+    assert service.cell(40.7128, -74.0060) == service.cell(40.7178, -74.0431)
+
+    new_york = lookup(service, 'New York')
+    jersey_city = lookup(service, 'Jersey City')
+    lookup(service, 'new  york')
+
+    assert new_york['place'] == 'New York' and jersey_city['place'] == 'Jersey City'
+    assert (new_york['condition'], new_york['temperature']) == (jersey_city['condition'], jersey_city['temperature'])
+    assert new_york['simulated']
+    # Fetched once, for the centre of the cell
+    assert provider.forecasts == [(40.625, -74.125)]
+    # and each place geocoded once, whatever its spelling
+    assert provider.geocodes == ['New York', 'Jersey City']
+    assert service.upstream_calls == 3
+
+
+def test_a_neighbouring_cell_has_its_own_forecast():
+    provider = CountingProvider()
+    service = WeatherService(provider)
+
+    lookup(service, 'New York')
+    lookup(service, 'Manhattan')
+
+    assert len(provider.forecasts) == 2
+
+
+def test_unknown_places_are_remembered():
+    provider = CountingProvider()
+    service = WeatherService(provider)
+
+    assert lookup(service, 'Atlantis') is None
+    assert lookup(service, 'atlantis') is None
+    assert provider.geocodes == ['Atlantis']
+    assert provider.forecasts == []
+
+
+def test_prefetch_refreshes_forecasts_about_to_expire():
+    provider = CountingProvider()
+    service = WeatherService(provider)
+    lookup(service, 'London')
+
+    assert service.prefetch(None, horizon=0) == 0
+    assert service.prefetch(None, horizon=provider.forecast_ttl) == 1
+    assert len(provider.forecasts) == 2
+
+
+def test_open_meteo_calls_go_through_the_caches(upstream):
+    upstream.responses = [
+        (200, {'results': [{'name': 'London', 'country': 'United Kingdom',
+                            'latitude': 51.5085, 'longitude': -0.1257}]}),
+        (200, {'current': {'temperature_2m': 14.6, 'weather_code': 3}}),
+    ]
+    provider = OpenMeteoProvider()
+    provider.GEOCODE_URL = f"{upstream.url}/v1/search"
+    provider.FORECAST_URL = f"{upstream.url}/v1/forecast"
+    service = WeatherService(provider)
+    client = HttpClient(retries=0)
+
+    first = lookup(service, 'London', client)
+    second = lookup(service, 'london', client)
+
+    assert first == second == {'place': 'London, United Kingdom', 'condition': 'overcast',
+                               'temperature': 15, 'simulated': False}
+    assert upstream.hits == 2